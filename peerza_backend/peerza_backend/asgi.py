@@ -3,6 +3,10 @@ ASGI config for peerza_backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Besides the Django app it mounts the server-push event stream
+(users.events.event_stream_app) at /api/events/, so run the project under an
+ASGI server (e.g. ``uvicorn peerza_backend.asgi:application``) to get push.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -13,4 +17,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'peerza_backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from users.events import event_stream_app  # noqa: E402  (needs apps loaded)
+
+EVENTS_PATH = '/api/events/'
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == EVENTS_PATH:
+        return await event_stream_app(scope, receive, send)
+    return await django_application(scope, receive, send)
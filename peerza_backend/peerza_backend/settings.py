@@ -48,6 +48,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware', # <--- ADD THIS AT THE TOP
+    'users.metrics.MetricsMiddleware',
+    'users.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,6 +57,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'users.presence.PresenceMiddleware',
 ]
 
 ROOT_URLCONF = 'peerza_backend.urls'
@@ -84,6 +87,14 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Wait instead of failing while another connection holds the write
+            # lock (users/booking.py takes it at BEGIN for its transaction).
+            'timeout': 20,
+        },
+        # On-disk test DB: the shared-cache in-memory one fails concurrent
+        # writers with "table is locked" instead of waiting (see booking tests).
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -133,9 +144,101 @@ AUTH_USER_MODEL = 'users.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        'users.authentication.CachedJWTAuthentication',
+    ),
+    # users/renderers.py: orjson-backed JSON plus application/msgpack. Both
+    # libraries are optional; without them DRF's JSON is used and msgpack is
+    # not offered.
+    'DEFAULT_RENDERER_CLASSES': (
+        'users.renderers.ORJSONRenderer',
+        'users.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'users.renderers.ORJSONParser',
+        'users.renderers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+    'DEFAULT_CONTENT_NEGOTIATION_CLASS': 'users.renderers.ContentNegotiation',
+}
+
+# Per-view metrics at GET /metrics (users/metrics.py). Counts, latency and
+# sizes cover every request; DB/serialize/render timing and N+1 detection a sample.
+PEERZA_METRICS_SAMPLE_RATE = 0.1
+PEERZA_METRICS_REPEAT_THRESHOLD = 10  # same SQL shape more often than this in one request
+# Set to require "Authorization: Bearer <token>" on /metrics. Unset, only staff
+# sessions and local requests may read it; behind a proxy on the same host every
+# request looks local, so set a token there.
+PEERZA_METRICS_TOKEN = None
+
+# Response compression (users/compression.py): brotli when the optional
+# `brotli` package is installed, gzip otherwise; smaller bodies go out as is.
+PEERZA_COMPRESSION_MIN_BYTES = 1024
+
+# JWT user cache (users/authentication.py): rows kept per process, checked
+# against a per-user version in PEERZA_AUTH_CACHE (shared by all processes
+# when that alias points at Redis/Memcached). With the per-process default,
+# other workers see a deactivation or permission change only once their
+# entry expires: PEERZA_AUTH_CACHE_TTL bounds that delay (`check --deploy`
+# warns, users.W001).
+PEERZA_AUTH_CACHE = 'default'
+PEERZA_AUTH_CACHE_SIZE = 10000  # users per process
+PEERZA_AUTH_CACHE_TTL = 30  # seconds; also the bound for changes made with QuerySet.update()
+
+# POST /api/batch/ (users/batch.py): threads running a batch's reads concurrently.
+PEERZA_BATCH_WORKERS = 4
+
+# Server-push events (/api/events/, see users/events.py).
+# Swap the broker for a stand-in (e.g. users.events.RecordingBroker) in tests.
+PEERZA_EVENT_BROKER = 'users.events.InProcessBroker'
+PEERZA_EVENT_HEARTBEAT = 15  # seconds between keep-alive comments
+
+# In-memory call ringing state (users/signaling.py); per process, like the broker.
+PEERZA_CALL_REGISTRY = 'users.signaling.InProcessCallRegistry'
+
+# Online presence (users/presence.py). Use a shared cache backend (Redis,
+# Memcached) for the 'presence' alias when running more than one process.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'presence': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'peerza-presence',
+    },
+    # Cached GET views (users/viewcache.py). Per process like the others;
+    # use a shared backend so invalidations reach every process.
+    'views': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'peerza-views',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
 }
+PEERZA_PRESENCE_CACHE = 'presence'
+PEERZA_PRESENCE_FLUSH_INTERVAL = 60  # max one last_active UPDATE per user per minute
+
+PEERZA_VIEW_CACHE = 'views'
+PEERZA_VIEW_CACHE_TIMEOUT = 300  # seconds; entries are normally dropped by tag invalidation first
+
+# sync/ change-feed heads (users/changes.py); shared backend for multi-process.
+PEERZA_SYNC_CACHE = 'default'
+
+# Notifications are queued and bulk-inserted off the request path
+# (users/outbox.py); users.outbox.InlineOutbox flushes in the request thread.
+PEERZA_NOTIFICATION_OUTBOX = 'users.outbox.BackgroundOutbox'
+
+# Swap-partner refreshes after a skill change (users/matchmaking.py) run on a
+# background thread after commit; 'inline' runs them in the committing thread.
+PEERZA_MATCH_REFRESH = 'background'
+
+# Per-policy overrides for `manage.py apply_retention` (users/retention.py),
+# e.g. {'notification': {'ttl_days': 14, 'keep_last': 100}}.
+PEERZA_RETENTION = {}
+
+# Read chat messages older than this move to compressed segments
+# (`manage.py archive_messages`, users/message_archive.py).
+PEERZA_MESSAGE_ARCHIVE_DAYS = 90
 
 # Media Configuration
 import os
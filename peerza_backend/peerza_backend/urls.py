@@ -3,10 +3,14 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from users.metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     # This points to the file you showed me earlier
     path('api/', include('users.urls')), 
+    # Prometheus scrape target (users/metrics.py)
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 # Serve media files (Profile Pictures) in development
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, Skill, UserSkill, Meeting, Notification, Message, FriendRequest, Friendship , Availability
+from .models import User, Skill, UserSkill, Meeting, Notification, Message, FriendRequest, Friendship , Availability, Conversation
 
 
 # 1. Register the Custom User
@@ -11,6 +11,7 @@ admin.site.register(Skill)
 admin.site.register(UserSkill)
 admin.site.register(Meeting)
 admin.site.register(Message)
+admin.site.register(Conversation)
 
 
 # 3. ✅ Register Notifications with custom admin view
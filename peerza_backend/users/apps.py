@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        from . import authentication, changes, search, viewcache
+        authentication.connect()
+        changes.connect()
+        search.connect()
+        viewcache.connect()
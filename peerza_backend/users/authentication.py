@@ -0,0 +1,193 @@
+"""
+JWT authentication without the per-request User query.
+
+simplejwt's JWTAuthentication loads the User row for every request, which
+for the polling endpoints is most of their database work. CachedJWTAuthentication
+validates the token the same way but resolves the user through UserCache, a
+bounded per-process LRU of user rows with a TTL
+(settings.PEERZA_AUTH_CACHE_SIZE / PEERZA_AUTH_CACHE_TTL).
+
+Each entry is tagged with the user's version, a counter kept in a shared
+cache (settings.PEERZA_AUTH_CACHE, the default alias) and bumped whenever
+the User is saved or deleted. A lookup costs one cache get; an entry whose version no longer matches is reloaded from the
+database, so a profile PATCH, change_password or the Stripe is_pro flip is
+seen by every process on the next request. The version is bumped both when
+the row is saved and again on commit, so a reader that loaded the old row
+in between cannot keep it. A lost version key counts as a new version,
+never as a match.
+
+QuerySet.update() sends no signals: call invalidate() after updating users
+that way, unless the columns are not needed by permission checks (as with
+presence's last_active).
+
+The version only reaches every process when PEERZA_AUTH_CACHE is a shared
+backend. With a per-process one (LocMemCache, the default alias) a save is
+seen by the process that made it, and the other workers keep serving the
+old row - an account deactivated a moment ago included - until the entry's
+TTL runs out. PEERZA_AUTH_CACHE_TTL therefore defaults to 30 seconds, and
+`manage.py check --deploy` warns (users.W001) about a per-process alias.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import User
+
+
+def _version_cache():
+    return caches[getattr(settings, "PEERZA_AUTH_CACHE", "default")]
+
+
+def _version_key(user_id):
+    return f"auth:version:{user_id}"
+
+
+class UserCache:
+    """user id -> User, valid while the shared version matches and for at most `ttl` seconds."""
+
+    def __init__(self, size=10000, ttl=30):
+        self.size = size
+        self.ttl = ttl
+        self.hits = self.misses = 0
+        self._entries = OrderedDict()  # str(user_id) -> (version, expires, field values)
+        self._lock = threading.Lock()
+        self._fields = [f.attname for f in User._meta.concrete_fields]
+        self._db = User.objects.db
+
+    def version(self, user_id):
+        cache, key = _version_cache(), _version_key(user_id)
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, time.time_ns(), timeout=None)
+            version = cache.get(key)
+        return version
+
+    def get(self, user_id):
+        """The User with this id (a fresh instance per call), or None when there is none."""
+        key = str(user_id)
+        version = self.version(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                # callers may modify request.user: never hand out the cached instance
+                return User.from_db(self._db, self._fields, entry[2])
+            self.misses += 1
+
+        values = User.objects.filter(id=user_id).values_list(*self._fields).first()
+        if values is None:
+            return None
+        with self._lock:
+            self._entries[key] = (version, time.monotonic() + self.ttl, values)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return User.from_db(self._db, self._fields, values)
+
+    def invalidate(self, user_id):
+        """Drop the user everywhere: bump the shared version, forget the local entry."""
+        cache, key = _version_cache(), _version_key(user_id)
+        try:
+            cache.incr(key)
+        except ValueError:  # no version yet (or evicted): any fresh one differs from the cached
+            cache.set(key, time.time_ns(), timeout=None)
+        with self._lock:
+            self._entries.pop(str(user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_users = None
+
+
+def get_user_cache():
+    global _users
+    if _users is None:
+        _users = UserCache(
+            size=getattr(settings, "PEERZA_AUTH_CACHE_SIZE", 10000),
+            ttl=getattr(settings, "PEERZA_AUTH_CACHE_TTL", 30),
+        )
+    return _users
+
+
+@receiver(setting_changed)
+def _reset_user_cache(setting, **kwargs):
+    global _users
+    if setting in ("PEERZA_AUTH_CACHE", "PEERZA_AUTH_CACHE_SIZE", "PEERZA_AUTH_CACHE_TTL"):
+        _users = None
+
+
+PER_PROCESS_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_shared_version_cache(app_configs, **kwargs):
+    alias = getattr(settings, "PEERZA_AUTH_CACHE", "default")
+    backend = settings.CACHES.get(alias, {}).get("BACKEND")
+    if backend not in PER_PROCESS_BACKENDS:
+        return []
+    ttl = getattr(settings, "PEERZA_AUTH_CACHE_TTL", 30)
+    return [checks.Warning(
+        f"PEERZA_AUTH_CACHE ({alias!r}) is a per-process cache: with several workers, a deactivated or changed "
+        f"user stays authenticated in the other workers for up to PEERZA_AUTH_CACHE_TTL ({ttl}s).",
+        hint="Point PEERZA_AUTH_CACHE at a shared backend such as Redis or Memcached.",
+        id="users.W001",
+    )]
+
+
+def invalidate(user_id):
+    """Forget `user_id` now and again once the current transaction commits."""
+    get_user_cache().invalidate(user_id)
+    transaction.on_commit(lambda: get_user_cache().invalidate(user_id))
+
+
+def _on_user_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate(instance.pk)
+
+
+def connect():
+    post_save.connect(_on_user_change, sender=User, dispatch_uid="auth-cache-save")
+    post_delete.connect(_on_user_change, sender=User, dispatch_uid="auth-cache-delete")
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication with the user resolved through UserCache; same checks and errors."""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        user = get_user_cache().get(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
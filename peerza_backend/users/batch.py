@@ -0,0 +1,176 @@
+"""
+Request batching: many API calls in one round trip (POST /api/batch/).
+
+    {"requests": [{"method": "GET", "path": "/api/profile/"},
+                  {"method": "GET", "path": "/api/notifications/?shape=normalized"},
+                  {"method": "POST", "path": "/api/chats/7/read/", "body": {}}]}
+    -> {"responses": [{"status": 200, "body": {...}}, ...]}   (same order)
+
+Each sub-request is resolved against the URLconf and dispatched straight to
+its DRF view as the batch's already authenticated user (DRF's forced
+authentication), so tokens are checked once per batch and no middleware
+runs again. Only the users app's DRF views can be batched: not the
+long-poll call/wait/, the token endpoints or batch/ itself.
+
+Reads (GET/HEAD) run concurrently on a small thread pool
+(settings.PEERZA_BATCH_WORKERS); every write is a barrier that runs alone,
+in order, so "mark read, then list" behaves like two sequential calls.
+Inside a transaction (e.g. ATOMIC_REQUESTS, or tests) everything runs in
+the calling thread, since other threads' connections cannot see it.
+"""
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.core.signals import setting_changed
+from django.db import close_old_connections, connection
+from django.dispatch import receiver
+from django.http import Http404
+from django.urls import Resolver404, resolve
+from rest_framework.views import APIView
+
+MAX_REQUESTS = 20
+READ_METHODS = ("GET", "HEAD")
+METHODS = READ_METHODS + ("POST", "PUT", "PATCH", "DELETE")
+
+logger = logging.getLogger(__name__)
+
+
+class BatchError(ValueError):
+    """The batch itself is malformed (400 for the whole request)."""
+
+
+def parse(data):
+    """[(method, path, query, body)] from the request payload, or BatchError."""
+    specs = data.get("requests") if isinstance(data, dict) else None
+    if not isinstance(specs, list) or not specs:
+        raise BatchError("'requests' must be a non-empty list")
+    if len(specs) > MAX_REQUESTS:
+        raise BatchError(f"At most {MAX_REQUESTS} requests per batch")
+    out = []
+    for spec in specs:
+        if not isinstance(spec, dict) or not isinstance(spec.get("path"), str):
+            raise BatchError("Each request needs a 'path'")
+        method = str(spec.get("method", "GET")).upper()
+        if method not in METHODS:
+            raise BatchError(f"Unsupported method {method}")
+        url = urlsplit(spec["path"])
+        out.append((method, url.path, url.query, spec.get("body")))
+    return out
+
+
+def _view(path):
+    """The resolver match for a batchable view, or None."""
+    try:
+        match = resolve(path)
+    except (Resolver404, Http404):
+        return None
+    cls = getattr(match.func, "cls", None)
+    if cls is None or not issubclass(cls, APIView) or match.url_name == "batch":
+        return None
+    if not match.func.__module__.startswith("users."):
+        return None
+    return match
+
+
+def _sub_request(parent, method, path, query, body):
+    payload = b"" if body is None or method in READ_METHODS else json.dumps(body).encode()
+    environ = {
+        key: value for key, value in parent.META.items()
+        if key.startswith("HTTP_") or key in ("REMOTE_ADDR", "SERVER_NAME", "SERVER_PORT", "wsgi.url_scheme")
+    }
+    environ.update({
+        "REQUEST_METHOD": method, "PATH_INFO": path, "SCRIPT_NAME": "", "QUERY_STRING": query,
+        "CONTENT_TYPE": "application/json", "CONTENT_LENGTH": str(len(payload)),
+        "wsgi.input": BytesIO(payload),
+    })
+    environ.setdefault("wsgi.url_scheme", parent.scheme)
+    environ.setdefault("SERVER_NAME", parent.get_host().split(":")[0])
+    environ.setdefault("SERVER_PORT", parent.get_port())
+    request = WSGIRequest(environ)
+    # picked up by rest_framework.request.Request: no second authentication
+    request._force_auth_user = parent.user
+    request._force_auth_token = parent.auth
+    return request
+
+
+def _body(response):
+    if hasattr(response, "data"):
+        return response.data
+    if not response.content:
+        return None
+    if response.get("Content-Type", "").startswith("application/json"):
+        return json.loads(response.content)
+    return response.content.decode(response.charset or "utf-8", "replace")
+
+
+def dispatch(parent, method, path, query, body):
+    """{"status", "body"} for one sub-request."""
+    match = _view(path)
+    if match is None:
+        return {"status": 404, "body": {"detail": "Not found or not batchable."}}
+    try:
+        response = match.func(_sub_request(parent, method, path, query, body), *match.args, **match.kwargs)
+    except Exception:  # one broken call must not fail its neighbours
+        logger.exception("Batched %s %s failed", method, path)
+        return {"status": 500, "body": {"detail": "Server error."}}
+    if response.streaming:
+        return {"status": 400, "body": {"detail": "Streaming responses cannot be batched."}}
+    return {"status": response.status_code, "body": _body(response)}
+
+
+def _dispatch_in_worker(*args):
+    try:
+        return dispatch(*args)
+    finally:
+        close_old_connections()  # the worker's connection, as at the end of a request
+
+
+_pool = None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(
+            max_workers=getattr(settings, "PEERZA_BATCH_WORKERS", 4), thread_name_prefix="batch"
+        )
+    return _pool
+
+
+@receiver(setting_changed)
+def _reset_pool(setting, **kwargs):
+    global _pool
+    if setting == "PEERZA_BATCH_WORKERS" and _pool is not None:
+        _pool.shutdown(wait=False)
+        _pool = None
+
+
+def run(parent, specs):
+    """Responses for `specs` (from parse()), in order."""
+    inline = connection.in_atomic_block or getattr(settings, "PEERZA_BATCH_WORKERS", 4) <= 1
+    results = [None] * len(specs)
+    reads = []  # indexes of the current run of reads
+
+    def drain():
+        if len(reads) == 1 or inline:
+            for i in reads:
+                results[i] = dispatch(parent, *specs[i])
+        else:
+            futures = [(i, _get_pool().submit(_dispatch_in_worker, parent, *specs[i])) for i in reads]
+            for i, future in futures:
+                results[i] = future.result()
+        reads.clear()
+
+    for i, spec in enumerate(specs):
+        if spec[0] in READ_METHODS:
+            reads.append(i)
+            continue
+        drain()
+        results[i] = dispatch(parent, *spec)
+    drain()
+    return results
@@ -0,0 +1,113 @@
+"""
+Conflict-checked meeting booking.
+
+A booking locks the calendars of the two participants (their User rows,
+SELECT ... FOR UPDATE, always in id order so two bookings cannot deadlock),
+checks both for an overlapping ACCEPTED/PENDING meeting through the
+(participant, status, start, end) indexes, and inserts the meeting - all in
+one transaction. On databases with row locks (PostgreSQL, MySQL) only
+bookings that share a participant wait on each other.
+
+SQLite has no row locks and ignores FOR UPDATE. There the booking
+transaction is opened with BEGIN IMMEDIATE, which takes the database-wide
+write lock up front: every booking waits on every other booking and on
+every other write until it commits (readers are not blocked, and other
+transactions keep the default DEFERRED mode). That is a SQLite limitation -
+any write serializes the whole database - and the transaction is kept to
+one lookup and one insert. A deferred check-then-insert would not be
+cheaper: the upgrade from the read to the write lock fails with "database
+is locked" instead of waiting when another booking got there first.
+"""
+from contextlib import ExitStack, contextmanager
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from .models import Meeting, User
+from .scheduling import HELD_STATUSES, MAX_MEETING_LENGTH
+
+
+class BookingConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "This time overlaps another meeting of the host or guest."
+    default_code = "booking_conflict"
+
+
+def parse_when(value):
+    """Accept datetimes or ISO strings; naive values are read in the current timezone."""
+    if value in (None, ""):
+        return None
+    when = value if hasattr(value, "tzinfo") else parse_datetime(str(value))
+    if when is None:
+        raise ValidationError({"detail": f"Invalid datetime: {value!r}"})
+    if timezone.is_naive(when):
+        when = timezone.make_aware(when)
+    return when
+
+
+@contextmanager
+def _immediate_atomic():
+    """atomic(), but an outermost SQLite transaction begins IMMEDIATE."""
+    if connection.vendor != "sqlite" or connection.in_atomic_block:
+        with transaction.atomic():
+            yield
+        return
+    connection.ensure_connection()
+    with ExitStack() as stack:
+        mode, connection.transaction_mode = connection.transaction_mode, "IMMEDIATE"
+        try:
+            stack.enter_context(transaction.atomic())
+        finally:
+            connection.transaction_mode = mode
+        yield
+
+
+@contextmanager
+def locked_calendars(*user_ids):
+    with _immediate_atomic():
+        list(
+            User.objects.select_for_update()
+            .filter(id__in=sorted(set(user_ids)))
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        yield
+
+
+def conflicts(user_ids, start, end, exclude_id=None):
+    qs = Meeting.objects.filter(
+        Q(host_id__in=user_ids) | Q(guest_id__in=user_ids),
+        status__in=HELD_STATUSES,
+        start_datetime__gte=start - MAX_MEETING_LENGTH,
+        start_datetime__lt=end,
+        end_datetime__gt=start,
+    )
+    if exclude_id is not None:
+        qs = qs.exclude(id=exclude_id)
+    return qs
+
+
+def ensure_free(user_ids, start, end):
+    """Raise BookingConflict if any participant is busy in [start, end)."""
+    if end is None:
+        return  # open-ended requests (instant calls) hold no interval
+    if end <= start:
+        raise ValidationError({"detail": "end_datetime must be after start_datetime"})
+    if conflicts(user_ids, start, end).exists():
+        raise BookingConflict()
+
+
+def book(host, guest, start, end, **fields):
+    """Create a PENDING meeting if both calendars are free, atomically."""
+    start, end = parse_when(start), parse_when(end)
+    if start is None:
+        raise ValidationError({"detail": "start_datetime is required"})
+    with locked_calendars(host.id, guest.id):
+        ensure_free([host.id, guest.id], start, end)
+        return Meeting.objects.create(
+            host=host, guest=guest, start_datetime=start, end_datetime=end, status="PENDING", **fields
+        )
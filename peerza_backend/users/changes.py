@@ -0,0 +1,212 @@
+"""
+Per-user change feed behind GET sync/?since=<cursor>.
+
+Whenever a Notification, Meeting, FriendRequest, Friendship or Message row
+is saved or deleted, a ChangeLog row (kind, object id) is written for every
+user it concerns. Conversation summaries are maintained with bulk UPDATEs,
+so the chat views call conversation_changed(), which logs a "conversation"
+change keyed by the peer's id on both sides. ChangeLog ids
+are monotonic, so a client's cursor is simply the last id it has seen.
+
+sync/ returns the current state of every object touched after the cursor
+(objects that no longer exist are listed under "deleted"). The newest id
+per user (the "head") is cached in settings.PEERZA_SYNC_CACHE and dropped
+whenever that user gets a new entry, so a client that is up to date is
+answered - 304 when it sends the ETag back - without touching the
+database. Use a shared cache backend when running several processes.
+
+The log is trimmed by the "changelog" retention policy (retention.py). Entries
+up to horizon() may be gone, so a cursor older than that is answered with
+"resync": true and a fresh cursor; the client reloads its lists instead of
+applying a delta with holes in it.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+
+from . import inbox
+from .models import ChangeLog, Conversation, FriendRequest, Friendship, Meeting, Message, Notification
+from .serializers import (
+    ConversationSerializer,
+    FriendRequestSerializer,
+    FriendshipSerializer,
+    MeetingSerializer,
+    MessageSerializer,
+    NotificationSerializer,
+)
+
+MAX_CHANGES = 500  # log entries per sync page
+HEAD_TTL = 60      # bounds staleness if a head read races a write
+
+
+def _cache():
+    return caches[getattr(settings, "PEERZA_SYNC_CACHE", "default")]
+
+
+def _head_key(user_id):
+    return f"sync:head:{user_id}"
+
+
+HORIZON_KEY = "sync:horizon"
+
+
+# =============================================================
+# WRITING
+# =============================================================
+
+def _write(entries):
+    """Insert (user_id, kind, object_id) entries; heads are dropped once they commit."""
+    ChangeLog.objects.bulk_create([ChangeLog(user_id=u, kind=k, object_id=o) for u, k, o in entries])
+    user_ids = {u for u, _, _ in entries}
+    transaction.on_commit(lambda: _cache().delete_many([_head_key(u) for u in user_ids]))
+
+
+def record(user_ids, kind, object_ids):
+    _write([(u, kind, o) for u in set(user_ids) for o in object_ids])
+
+
+def record_pairs(kind, pairs):
+    """Log `kind` for (user_id, object_id) pairs, e.g. rows from one bulk_create."""
+    _write([(u, kind, o) for u, o in pairs])
+
+
+def conversation_changed(user_id, peer_id):
+    _write([(user_id, "conversation", peer_id), (peer_id, "conversation", user_id)])
+
+
+# model -> (kind, users the row concerns)
+TRACKED = {
+    Notification: ("notification", lambda o: [o.user_id]),
+    Meeting: ("meeting", lambda o: [o.host_id, o.guest_id]),
+    FriendRequest: ("friend_request", lambda o: [o.from_user_id, o.to_user_id]),
+    Friendship: ("friendship", lambda o: [o.user_id]),
+    Message: ("message", lambda o: [o.sender_id, o.receiver_id]),
+}
+
+
+def _on_change(sender, instance, raw=False, **kwargs):
+    if raw:  # loaddata
+        return
+    kind, users = TRACKED[sender]
+    record(users(instance), kind, [instance.id])
+
+
+def connect():
+    for model in TRACKED:
+        post_save.connect(_on_change, sender=model, dispatch_uid=f"changes-save-{model.__name__}")
+        post_delete.connect(_on_change, sender=model, dispatch_uid=f"changes-delete-{model.__name__}")
+
+
+# =============================================================
+# READING
+# =============================================================
+
+def head(user_id):
+    """The user's newest ChangeLog id (0 when there is none), cached."""
+    cache = _cache()
+    value = cache.get(_head_key(user_id))
+    if value is None:
+        value = (
+            ChangeLog.objects.filter(user_id=user_id).order_by("-id").values_list("id", flat=True).first() or 0
+        )
+        cache.add(_head_key(user_id), value, timeout=HEAD_TTL)
+    return value
+
+
+def horizon():
+    """The newest ChangeLog id retention may have removed (0 when none), cached."""
+    cache = _cache()
+    value = cache.get(HORIZON_KEY)
+    if value is None:
+        oldest = ChangeLog.objects.order_by("id").values_list("id", flat=True).first()
+        value = oldest - 1 if oldest else 0
+        cache.add(HORIZON_KEY, value, timeout=HEAD_TTL)
+    return value
+
+
+def forget_horizon():
+    """Called after ChangeLog rows were purged."""
+    _cache().delete(HORIZON_KEY)
+
+
+def since(user_id, cursor, limit=MAX_CHANGES):
+    """(new_cursor, has_more, {kind: [object ids]}) for entries after `cursor`."""
+    rows = list(
+        ChangeLog.objects.filter(user_id=user_id, id__gt=cursor)
+        .order_by("id").values_list("id", "kind", "object_id")[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    touched = defaultdict(dict)  # ordered, de-duplicated
+    for _, kind, object_id in rows:
+        touched[kind][object_id] = None
+    return (rows[-1][0] if rows else cursor), has_more, {k: list(v) for k, v in touched.items()}
+
+
+def _notifications(me, ids):
+    objs = list(Notification.objects.filter(user_id=me, id__in=ids).select_related("actor"))
+    return objs, NotificationSerializer(objs, many=True).data
+
+
+def _meetings(me, ids):
+    objs = list(Meeting.objects.filter(Q(host_id=me) | Q(guest_id=me), id__in=ids).select_related("host"))
+    return objs, MeetingSerializer(objs, many=True).data
+
+
+def _friend_requests(me, ids):
+    objs = list(
+        FriendRequest.objects.filter(Q(from_user_id=me) | Q(to_user_id=me), id__in=ids)
+        .select_related("from_user", "to_user")
+    )
+    return objs, FriendRequestSerializer(objs, many=True).data
+
+
+def _friendships(me, ids):
+    objs = list(Friendship.objects.filter(user_id=me, id__in=ids).select_related("friend"))
+    return objs, FriendshipSerializer(objs, many=True).data
+
+
+def _messages(me, ids):
+    objs = list(
+        Message.objects.filter(Q(sender_id=me) | Q(receiver_id=me), id__in=ids)
+        .select_related("sender", "receiver").order_by("id")
+    )
+    marks = inbox.read_marks({(m.receiver_id, m.sender_id) for m in objs})
+    return objs, MessageSerializer(objs, many=True, context={"read_marks": marks}).data
+
+
+def _conversations(me, peer_ids):
+    objs = list(
+        Conversation.objects.filter(owner_id=me, peer_id__in=peer_ids)
+        .select_related("peer", "last_message__sender", "last_message__receiver")
+    )
+    context = {"read_marks": inbox.inbox_read_marks(me, objs)}
+    return objs, ConversationSerializer(objs, many=True, context=context).data
+
+
+# kind -> (loader, the id the log stores for an object)
+LOADERS = {
+    "notification": (_notifications, lambda o: o.id),
+    "meeting": (_meetings, lambda o: o.id),
+    "friend_request": (_friend_requests, lambda o: o.id),
+    "friendship": (_friendships, lambda o: o.id),
+    "message": (_messages, lambda o: o.id),
+    "conversation": (_conversations, lambda o: o.peer_id),
+}
+
+
+def load(user_id, touched):
+    """Current state of the touched objects: (changes, deleted), both keyed by kind."""
+    changes, deleted = {}, {}
+    for kind, ids in touched.items():
+        loader, key = LOADERS[kind]
+        objs, changes[kind] = loader(user_id, ids)
+        found = {key(o) for o in objs}
+        gone = [i for i in ids if i not in found]
+        if gone:
+            deleted[kind] = gone
+    return changes, deleted
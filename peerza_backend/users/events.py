@@ -0,0 +1,208 @@
+"""
+Server-push event channel (Server-Sent Events).
+
+Views call `publish(user_id, event, data)` after they create something the
+user should hear about (incoming call, meeting request/response, new
+notification, new chat message). The broker fans it out to every open
+`/api/events/` stream of that user, so the dashboard no longer has to poll
+call/check/, meetings/pending/ and notifications/.
+
+The stream is a plain ASGI app mounted in peerza_backend/asgi.py (it needs
+an ASGI server such as uvicorn or daphne; `runserver` does not serve it).
+
+The broker is chosen by settings.PEERZA_EVENT_BROKER (dotted path). The
+default InProcessBroker only reaches streams held by the same process;
+RecordingBroker is a local stand-in for tests that also keeps what was
+published.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from . import presence
+
+DEFAULT_BROKER = "users.events.InProcessBroker"
+
+
+# =============================================================
+# BROKERS
+# =============================================================
+
+class Subscription:
+    """One open stream: an asyncio queue bound to the loop that reads it."""
+
+    def __init__(self, maxsize=100):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def _put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            pass  # slow client: drop rather than grow without bound
+
+    def deliver(self, item):
+        # publish() runs in a sync view thread; hand over to the stream's loop.
+        self.loop.call_soon_threadsafe(self._put, item)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class InProcessBroker:
+    """Fan-out to the subscriptions open in this process."""
+
+    def __init__(self):
+        self._subs = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        sub = Subscription()
+        with self._lock:
+            self._subs[user_id].add(sub)
+        return sub
+
+    def unsubscribe(self, user_id, sub):
+        with self._lock:
+            subs = self._subs.get(user_id)
+            if subs:
+                subs.discard(sub)
+                if not subs:
+                    del self._subs[user_id]
+
+    def subscriber_count(self, user_id=None):
+        with self._lock:
+            if user_id is not None:
+                return len(self._subs.get(user_id, ()))
+            return sum(len(s) for s in self._subs.values())
+
+    def publish(self, user_id, event, data):
+        with self._lock:
+            subs = list(self._subs.get(user_id, ()))
+        for sub in subs:
+            sub.deliver((event, data))
+
+
+class RecordingBroker(InProcessBroker):
+    """Local stand-in: behaves like InProcessBroker and remembers every publish."""
+
+    def __init__(self):
+        super().__init__()
+        self.published = []
+
+    def publish(self, user_id, event, data):
+        self.published.append((user_id, event, data))
+        super().publish(user_id, event, data)
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        path = getattr(settings, "PEERZA_EVENT_BROKER", DEFAULT_BROKER)
+        _broker = import_string(path)()
+    return _broker
+
+
+@receiver(setting_changed)
+def _reset_broker(setting, **kwargs):
+    global _broker
+    if setting == "PEERZA_EVENT_BROKER":
+        _broker = None
+
+
+def publish(user_id, event, data):
+    """Queue an event for `user_id`, delivered once the current transaction commits."""
+    transaction.on_commit(lambda: get_broker().publish(user_id, event, data))
+
+
+# =============================================================
+# SSE ASGI APP  (GET /api/events/?token=<access JWT>)
+# =============================================================
+
+def _format(event, data):
+    payload = json.dumps(data, cls=DjangoJSONEncoder)
+    return f"event: {event}\ndata: {payload}\n\n".encode()
+
+
+@sync_to_async
+def _authenticate(scope):
+    # EventSource cannot send headers, so the access token travels in the query string.
+    from rest_framework.exceptions import AuthenticationFailed
+    from rest_framework_simplejwt.exceptions import InvalidToken
+    from .authentication import CachedJWTAuthentication
+
+    query = parse_qs(scope.get("query_string", b"").decode())
+    raw = (query.get("token") or [""])[0]
+    if not raw:
+        return None
+    auth = CachedJWTAuthentication()
+    try:
+        return auth.get_user(auth.get_validated_token(raw))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+def _headers(content_type):
+    headers = [(b"content-type", content_type), (b"cache-control", b"no-cache")]
+    if getattr(settings, "CORS_ALLOW_ALL_ORIGINS", False):
+        headers.append((b"access-control-allow-origin", b"*"))
+    return headers
+
+
+async def _wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def event_stream_app(scope, receive, send):
+    user = await _authenticate(scope)
+    if user is None or not user.is_active:
+        await send({"type": "http.response.start", "status": 401,
+                    "headers": _headers(b"application/json")})
+        await send({"type": "http.response.body",
+                    "body": b'{"detail": "Authentication credentials were not provided or are invalid."}'})
+        return
+
+    heartbeat = getattr(settings, "PEERZA_EVENT_HEARTBEAT", 15)
+    broker = get_broker()
+    await sync_to_async(presence.heartbeat)(user.id)
+    sub = broker.subscribe(user.id)
+    disconnect = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": _headers(b"text/event-stream") + [(b"x-accel-buffering", b"no")]})
+        await send({"type": "http.response.body", "body": b": connected\n\n", "more_body": True})
+
+        while True:
+            next_event = asyncio.ensure_future(sub.get())
+            done, _ = await asyncio.wait(
+                {next_event, disconnect}, timeout=heartbeat, return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnect in done:
+                next_event.cancel()
+                break
+            if next_event in done:
+                body = _format(*next_event.result())
+            else:
+                next_event.cancel()
+                body = b": ping\n\n"
+                await sync_to_async(presence.heartbeat)(user.id)  # an open stream keeps the user online
+            await send({"type": "http.response.body", "body": body, "more_body": True})
+    finally:
+        broker.unsubscribe(user.id, sub)
+        disconnect.cancel()
@@ -0,0 +1,236 @@
+"""
+Fast read-only serialization for the hot list endpoints.
+
+A DRF ModelSerializer walks its fields for every object, builds nested
+serializers per row and needs full model instances. The shapes below build
+the same dicts straight from .values_list() tuples: each Shape is compiled
+once into a row builder (itemgetters and per-field closures over tuple
+indexes), so a list costs one query and one builder call per row.
+
+The output matches the serializers in serializers.py exactly - same keys in
+the same order and the same value representations (DRF's ISO-8601
+datetimes with "Z", media URLs for files, None for missing relations), so
+the rendered JSON is byte-identical. The tests compare both for every
+endpoint that uses this module; keep the two in step when adding fields.
+"""
+from operator import itemgetter
+
+from django.utils import timezone
+
+from . import metrics
+from .models import User
+
+
+def datetime_repr(value, tz):
+    """serializers.DateTimeField().to_representation for the ISO-8601 default, in timezone `tz`."""
+    if not value:
+        return None
+    value = value.astimezone(tz).isoformat()
+    if value.endswith("+00:00"):
+        value = value[:-6] + "Z"
+    return value
+
+
+def file_repr(storage):
+    """serializers.FileField().to_representation (no request in context: relative URL)."""
+    def convert(name, tz=None):
+        return storage.url(name) if name else None
+    return convert
+
+
+class Nested:
+    """A related object serialized with `shape`; None when the relation is empty."""
+
+    def __init__(self, path, shape):
+        self.path = path
+        self.shape = shape
+
+
+# Row builders: every getter is called as getter(row, tz). A plain column
+# getter carries its tuple index so _record can fetch plain-only shapes with
+# a single itemgetter.
+
+def _column(index, convert=None):
+    if convert is None:
+        def get(r, tz):
+            return r[index]
+        get.index = index
+    else:
+        def get(r, tz):
+            return convert(r[index], tz)
+    return get
+
+
+def _nested(index, build):
+    def get(r, tz):
+        return None if r[index] is None else build(r, tz)
+    return get
+
+
+def _record(keys, getters):
+    keys = tuple(keys)
+    indexes = [getattr(get, "index", None) for get in getters]
+    if len(keys) > 1 and None not in indexes:
+        fetch = itemgetter(*indexes)
+
+        def build(r, tz):
+            return dict(zip(keys, fetch(r)))
+    else:
+        getters = tuple(getters)
+
+        def build(r, tz):
+            return dict(zip(keys, [get(r, tz) for get in getters]))
+    return build
+
+
+class Shape:
+    """
+    Output fields as (key, source) pairs. A source is a lookup relative to
+    the row's model, (lookup, converter), or Nested(relation, shape).
+    Converters are called as converter(value, tz) with the current timezone,
+    which is looked up once per list.
+
+    The normalized variant (?shape=normalized) emits nested users as their
+    id only; normalized() returns them once each in a separate "users" map.
+    """
+
+    def __init__(self, fields):
+        self.fields = fields
+        self._compiled = {}
+
+    def compile(self, refs=False):
+        """(columns, build(row, tz), indexes of user id columns) for full or normalized output."""
+        if refs not in self._compiled:
+            columns, ref_indexes = [], []
+
+            def record(shape, prefix):
+                keys, getters = [], []
+                for key, source in shape.fields:
+                    index = len(columns)
+                    keys.append(key)
+                    if isinstance(source, Nested):
+                        nested_prefix = f"{prefix}{source.path}__"
+                        columns.append(f"{nested_prefix}id")  # None when the relation is empty
+                        if refs and source.shape is USER:
+                            ref_indexes.append(index)
+                            getters.append(_column(index))
+                        else:
+                            getters.append(_nested(index, record(source.shape, nested_prefix)))
+                        continue
+                    lookup, convert = source if isinstance(source, tuple) else (source, None)
+                    columns.append(prefix + lookup)
+                    getters.append(_column(index, convert))
+                return _record(keys, getters)
+
+            build = record(self, "")
+            self._compiled[refs] = tuple(columns), build, tuple(ref_indexes)
+        return self._compiled[refs]
+
+    @property
+    def columns(self):
+        return self.compile()[0]
+
+    @property
+    def normalized_columns(self):
+        return self.compile(refs=True)[0]
+
+    def rows(self, rows):
+        """Dicts for tuples of self.columns."""
+        build, tz = self.compile()[1], timezone.get_current_timezone()
+        with metrics.serializing():
+            return [build(r, tz) for r in rows]
+
+    def normalized(self, rows):
+        """{"items": [...], "users": {id: user}} for tuples of self.normalized_columns."""
+        _, build, ref_indexes = self.compile(refs=True)
+        tz = timezone.get_current_timezone()
+        ids = {}  # first-reference order, like serializers.normalize
+        with metrics.serializing():
+            for r in rows:
+                for i in ref_indexes:
+                    if r[i] is not None:
+                        ids[r[i]] = None
+            items = [build(r, tz) for r in rows]
+        return {"items": items, "users": users_by_id(ids)}  # its own query and rows() call
+
+    def many(self, queryset, limit=None, normalized=False):
+        rows = queryset.values_list(*(self.normalized_columns if normalized else self.columns))
+        if limit is not None:
+            rows = rows[:limit]
+        return self.normalized(list(rows)) if normalized else self.rows(list(rows))  # the query is DB time
+
+
+_avatar = file_repr(User._meta.get_field("avatar").storage)
+
+# UserSerializer
+USER = Shape([
+    ("id", "id"), ("username", "username"), ("bio", "bio"), ("is_pro", "is_pro"), ("avatar", ("avatar", _avatar)),
+])
+
+# UserSkillSerializer
+USER_SKILL = Shape([
+    ("id", "id"),
+    ("user", Nested("user", USER)),
+    ("skill", Nested("skill", Shape([("id", "id"), ("name", "name")]))),
+    ("proficiency", "proficiency"),
+    ("skill_type", "skill_type"),
+])
+
+# MeetingSerializer
+MEETING = Shape([
+    ("id", "id"),
+    ("host", Nested("host", USER)),
+    ("guest", "guest_id"),
+    ("topic", "topic"),
+    ("start_datetime", ("start_datetime", datetime_repr)),
+    ("end_datetime", ("end_datetime", datetime_repr)),
+    ("status", "status"),
+    ("jitsi_room", "jitsi_room"),
+    ("created_at", ("created_at", datetime_repr)),
+])
+
+# NotificationSerializer
+NOTIFICATION = Shape([
+    ("id", "id"),
+    ("type", "type"),
+    ("actor", Nested("actor", USER)),
+    ("data", "data"),
+    ("is_read", "is_read"),
+    ("created_at", ("created_at", datetime_repr)),
+])
+
+# friends_list rows: {"id": friendship id, "friend": UserSerializer}
+FRIENDSHIP_ROW = Shape([("id", "id"), ("friend", Nested("friend", USER))])
+
+
+def users_by_id(ids):
+    """{id: UserSerializer data} for `ids`, in their order, in one query."""
+    found = {u["id"]: u for u in USER.many(User.objects.filter(id__in=list(ids)))}
+    return {i: found[i] for i in ids if i in found}
+
+
+def user(obj):
+    """UserSerializer(obj).data for an instance that is already loaded."""
+    return {
+        "id": obj.id, "username": obj.username, "bio": obj.bio, "is_pro": obj.is_pro,
+        "avatar": _avatar(obj.avatar.name),
+    }
+
+
+def messages(rows, users, marks):
+    """
+    MessageSerializer(many=True) for thread rows (inbox.THREAD_COLUMNS, from
+    inbox.thread_page(..., rows=True)). `users` maps each participant id to
+    what the sender/receiver keys hold: its user dict (serialized once and
+    shared by every row) or, for the normalized shape, the id itself.
+    `marks` is inbox.read_marks for the thread's two directions.
+    """
+    tz = timezone.get_current_timezone()
+    with metrics.serializing():
+        return [
+            {
+                "id": msg_id, "sender": users[sender_id], "receiver": users[receiver_id], "content": content,
+                "timestamp": datetime_repr(ts, tz), "is_read": msg_id <= marks[(receiver_id, sender_id)],
+            }
+            for msg_id, sender_id, receiver_id, content, ts in rows
+        ]
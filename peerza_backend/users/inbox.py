@@ -0,0 +1,202 @@
+"""
+Chat read paths: the conversation inbox and paginated message threads.
+
+Every chat has two Conversation rows, one per participant, holding the last
+message, that participant's unread count and the time of last activity.
+They are maintained by chat_send / chat_mark_read so the inbox is a single
+indexed query no matter how many peers a user has.
+
+Read state is a watermark per side: Conversation.last_read_id means "the
+owner has read every message from peer up to this id". Marking a chat read
+is one row UPDATE instead of flagging each message, the unread counter is
+maintained alongside it, and when it has to be recounted (partial reads)
+that is an id range on the (sender, receiver, id) index.
+
+Threads are paged by message id over the (sender, receiver, id) index, so a
+client holding the newest message only downloads what arrived after it.
+Paging back past the hot rows continues into the thread's archived
+segments (see message_archive.py).
+"""
+import base64
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import F, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from . import message_archive
+from .models import Conversation, Message
+
+
+def record_message(msg):
+    """Bump both sides of the conversation for a freshly created message."""
+    if msg.sender_id == msg.receiver_id:
+        return
+    with transaction.atomic():
+        _touch(msg.sender_id, msg.receiver_id, msg, unread=False)
+        _touch(msg.receiver_id, msg.sender_id, msg, unread=True)
+
+
+def _touch(owner_id, peer_id, msg, unread):
+    changes = {"last_message": msg, "last_activity": msg.timestamp}
+    if unread:
+        changes["unread_count"] = F("unread_count") + 1
+
+    qs = Conversation.objects.filter(owner_id=owner_id, peer_id=peer_id)
+    if not qs.update(**changes):
+        Conversation.objects.get_or_create(owner_id=owner_id, peer_id=peer_id)
+        qs.update(**changes)
+
+
+def mark_read(owner, peer, up_to=None):
+    """
+    Advance owner's read watermark for `peer` and return it. Without `up_to`
+    everything up to the latest message is read; with it, only messages up
+    to that id (the watermark never moves backwards).
+    """
+    qs = Conversation.objects.filter(owner=owner, peer=peer)
+    latest = _latest_ids(owner.id, peer.id)
+    if up_to is None:
+        qs.update(
+            last_read_id=Greatest(Coalesce(Subquery(latest), F("last_read_id")), F("last_read_id")),
+            unread_count=0,
+        )
+        return qs.values_list("last_read_id", flat=True).first() or 0
+
+    with transaction.atomic():
+        conv = qs.select_for_update().first()
+        if conv is None:
+            return 0
+        mark = min(up_to, latest.first() or 0)
+        if mark > conv.last_read_id:
+            qs.update(last_read_id=mark, unread_count=unread_after(owner.id, peer.id, mark))
+            return mark
+        return conv.last_read_id
+
+
+def _latest_ids(owner_id, peer_id):
+    # The thread's own newest message id; Conversation.last_message can be
+    # NULL (e.g. after the message was deleted) while unread ones remain.
+    return (
+        Message.objects.filter(Q(sender_id=owner_id, receiver_id=peer_id) | Q(sender_id=peer_id, receiver_id=owner_id))
+        .order_by("-id")
+        .values_list("id", flat=True)[:1]
+    )
+
+
+def unread_after(owner_id, peer_id, mark):
+    """Messages from peer to owner above `mark` (an index range count)."""
+    return Message.objects.filter(sender_id=peer_id, receiver_id=owner_id, id__gt=mark).count()
+
+
+def read_marks(pairs):
+    """{(reader_id, sender_id): last_read_id} for the given pairs, in one query."""
+    pairs = set(pairs)
+    if not pairs:
+        return {}
+    match = Q()
+    for reader_id, sender_id in pairs:
+        match |= Q(owner_id=reader_id, peer_id=sender_id)
+    marks = dict.fromkeys(pairs, 0)
+    marks.update(
+        ((owner_id, peer_id), mark)
+        for owner_id, peer_id, mark in Conversation.objects.filter(match)
+        .values_list("owner_id", "peer_id", "last_read_id")
+    )
+    return marks
+
+
+def ensure_conversation(user, peer):
+    """Make sure both users see each other in their inbox (e.g. new friends)."""
+    Conversation.objects.get_or_create(owner=user, peer=peer)
+    Conversation.objects.get_or_create(owner=peer, peer=user)
+
+
+def inbox_read_marks(owner_id, rows):
+    """read_marks for serializing the last messages of the owner's Conversation `rows`."""
+    marks = {(owner_id, c.peer_id): c.last_read_id for c in rows}
+    marks.update(read_marks(
+        (c.peer_id, owner_id) for c in rows if c.last_message and c.last_message.sender_id == owner_id
+    ))
+    return marks
+
+
+# -------------------------------------------------------------
+# Keyset pagination over (-last_activity, -id)
+# -------------------------------------------------------------
+
+def encode_cursor(conv):
+    raw = f"{conv.last_activity.isoformat()}|{conv.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Returns (last_activity, id); raises ValueError on a malformed cursor."""
+    raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+    ts, pk = raw.split("|")
+    return datetime.fromisoformat(ts), int(pk)
+
+
+def inbox_page(owner, limit=None, cursor=None):
+    """
+    Conversations for `owner`, most recently active first.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    qs = (
+        Conversation.objects.filter(owner=owner)
+        .select_related("peer", "last_message__sender", "last_message__receiver")
+        .order_by("-last_activity", "-id")
+    )
+    if cursor:
+        ts, pk = decode_cursor(cursor)
+        qs = qs.filter(Q(last_activity__lt=ts) | Q(last_activity=ts, id__lt=pk))
+
+    if limit is None:
+        return list(qs), None
+
+    rows = list(qs[:limit + 1])
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+# Columns of thread_page(..., rows=True) tuples
+THREAD_COLUMNS = ("id", "sender_id", "receiver_id", "content", "timestamp")
+
+
+def thread_page(me, peer, limit=None, before_id=None, after_id=None, rows=False):
+    """
+    Messages between `me` and `peer`, oldest first.
+
+    - after_id: the first `limit` messages newer than it (incremental refresh)
+    - before_id: the `limit` messages immediately older than it (scroll back)
+    - neither: the newest `limit` messages, or the whole thread without a limit
+
+    With `rows`, THREAD_COLUMNS tuples instead of Message instances (for
+    fastserializers.messages; the two users are the caller's anyway).
+    """
+    qs = Message.objects.filter(Q(sender=me, receiver=peer) | Q(sender=peer, receiver=me))
+    qs = qs.values_list(*THREAD_COLUMNS) if rows else qs.select_related("sender", "receiver")
+    if before_id is not None:
+        qs = qs.filter(id__lt=before_id)
+    if after_id is not None:
+        qs = qs.filter(id__gt=after_id)
+
+    # Old messages may live in cold storage; it always holds the oldest part
+    # of the thread, so it is only read when the hot rows run out.
+    if after_id is not None:
+        older = message_archive.read(me, peer, before_id=before_id, after_id=after_id, limit=limit, rows=rows)
+        if limit is None:
+            return older + list(qs.order_by("id"))
+        if len(older) >= limit:
+            return older
+        return older + list(qs.order_by("id")[:limit - len(older)])
+
+    hot = list(qs.order_by("id")) if limit is None else list(qs.order_by("-id")[:limit])[::-1]
+    if limit is None or len(hot) < limit:
+        if hot:
+            below = hot[0][0] if rows else hot[0].id
+        else:
+            below = before_id
+        need = None if limit is None else limit - len(hot)
+        hot = message_archive.read(me, peer, before_id=below, limit=need, rows=rows) + hot
+    return hot
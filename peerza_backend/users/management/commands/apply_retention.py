@@ -0,0 +1,71 @@
+"""
+Apply the data retention policies (users/retention.py).
+
+    python manage.py apply_retention [--only notification,meeting] [--dry-run]
+    python manage.py apply_retention --every 3600      # keep running, hourly
+
+Prints rows removed/archived and each table's size before and after. SQLite
+only hands freed pages back to the filesystem on VACUUM; pass --vacuum to
+run one at the end (it locks the whole database while it runs).
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from users import retention
+
+
+class Command(BaseCommand):
+    help = "Delete or archive expired Calls, Notifications, dead Meetings and sync/ log entries in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--only", default="", help="comma-separated policy names")
+        parser.add_argument("--batch", type=int, default=retention.BATCH_SIZE)
+        parser.add_argument("--pause", type=float, default=retention.PAUSE,
+                            help="seconds to sleep between batches")
+        parser.add_argument("--dry-run", action="store_true", help="only count what would be removed")
+        parser.add_argument("--vacuum", action="store_true")
+        parser.add_argument("--every", type=float, default=0,
+                            help="repeat every N seconds instead of running once")
+
+    def handle(self, *args, **opts):
+        try:
+            policies = retention.policies()
+        except ValueError as exc:
+            raise CommandError(exc)
+        if opts["only"]:
+            wanted = {name.strip() for name in opts["only"].split(",")}
+            unknown = wanted - {p.name for p in policies}
+            if unknown:
+                raise CommandError(f"Unknown policies: {', '.join(sorted(unknown))}")
+            policies = [p for p in policies if p.name in wanted]
+
+        while True:
+            self.run(policies, opts)
+            if not opts["every"]:
+                break
+            time.sleep(opts["every"])
+
+    def run(self, policies, opts):
+        before = retention.database_size()
+        for policy in policies:
+            start = time.perf_counter()
+            report = retention.apply(policy, batch_size=opts["batch"], pause=opts["pause"], dry_run=opts["dry_run"])
+            verb = "would remove" if opts["dry_run"] else f"{policy.action}d"
+            count = report["expired"] if opts["dry_run"] else report["removed"]
+            self.stdout.write(
+                f"{policy.name:<13} {verb} {count} rows in {report['batches']} batches "
+                f"({time.perf_counter() - start:.2f}s): "
+                f"{retention.format_size(report['before'])} -> {retention.format_size(report['after'])}"
+            )
+
+        if opts["vacuum"] and not opts["dry_run"] and connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                cursor.execute("VACUUM")
+        after = retention.database_size()
+        if before is not None:
+            self.stdout.write(self.style.SUCCESS(
+                f"database: {before[0] / 1024:.0f} KiB ({before[1] / 1024:.0f} KiB free) -> "
+                f"{after[0] / 1024:.0f} KiB ({after[1] / 1024:.0f} KiB free)"
+            ))
@@ -0,0 +1,45 @@
+"""
+Move old, read chat messages into compressed segments (users/message_archive.py).
+
+    python manage.py archive_messages [--older-than-days 90] [--vacuum]
+
+Prints messages moved and the size of the Message table (rows, and bytes of
+the table plus its indexes on SQLite) next to the segment table, before and
+after. SQLite only shrinks the file on VACUUM; pass --vacuum for that.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from users import message_archive, retention
+from users.models import Message, MessageSegment
+
+
+class Command(BaseCommand):
+    help = "Archive read chat messages older than the threshold into zlib-compressed segments."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than-days", type=int, default=None,
+                            help="default: settings.PEERZA_MESSAGE_ARCHIVE_DAYS")
+        parser.add_argument("--segment-size", type=int, default=message_archive.SEGMENT_SIZE)
+        parser.add_argument("--pause", type=float, default=retention.PAUSE,
+                            help="seconds to sleep between segments")
+        parser.add_argument("--vacuum", action="store_true")
+
+    def handle(self, *args, **opts):
+        before = {m: retention.table_size(m) for m in (Message, MessageSegment)}
+        start = time.perf_counter()
+        report = message_archive.archive(opts["older_than_days"], opts["segment_size"], opts["pause"])
+        elapsed = time.perf_counter() - start
+        if opts["vacuum"] and connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                cursor.execute("VACUUM")
+
+        self.stdout.write(
+            f"Archived {report['messages']} messages from {report['threads']} threads "
+            f"into {report['segments']} segments in {elapsed:.1f}s"
+        )
+        for model, size in before.items():
+            after = retention.table_size(model)
+            self.stdout.write(f"{model.__name__:<15} {retention.format_size(size)} -> {retention.format_size(after)}")
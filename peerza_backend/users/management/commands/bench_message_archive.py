@@ -0,0 +1,127 @@
+"""
+Benchmark message cold storage: storage before/after and thread read latency.
+
+    python manage.py bench_message_archive --messages 10000000 --pairs 20000
+
+Seeds `--messages` messages spread over two years across `--pairs` threads
+(everything read), then reports the Message table and index size and chat
+page latency, archives everything older than `--older-than-days`, VACUUMs
+and reports again.
+"""
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+
+from users import inbox, message_archive, retention
+from users.management.scratch import ScratchCommand
+from users.models import Conversation, Message, MessageSegment, User
+
+WORDS = (
+    "hey hi thanks sure tomorrow today meeting lesson python guitar spanish chess call later "
+    "sounds good great see you at the on in for practice question homework code review link"
+).split()
+
+
+def _kib(n):
+    return f"{n / 1024:,.0f} KiB" if n is not None else "n/a"
+
+
+class Command(ScratchCommand):
+    help = "Measure Message table/index size and chat paging before and after archiving."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=1000000)
+        parser.add_argument("--pairs", type=int, default=2000)
+        parser.add_argument("--older-than-days", type=int, default=90)
+        parser.add_argument("--repeat", type=int, default=50)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def bench(self, opts):
+        rng = random.Random(opts["seed"])
+        self.seed(opts["messages"], opts["pairs"], rng)
+        self.report("before", rng, opts["repeat"])
+        start = time.perf_counter()
+        result = message_archive.archive(opts["older_than_days"])
+        self.stdout.write(
+            f"Archived {result['messages']:,} messages into {result['segments']:,} segments "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+        self.report("after", rng, opts["repeat"])
+
+    def seed(self, n, pairs, rng):
+        self.stdout.write(f"Seeding {n:,} messages over {pairs:,} threads…")
+        users = User.objects.bulk_create(
+            [User(username=f"bench{i}", email=f"bench{i}@peerza.test") for i in range(pairs * 2)],
+            batch_size=5000,
+        )
+        self.pairs = [(users[2 * i], users[2 * i + 1]) for i in range(pairs)]
+
+        start = timezone.now() - timedelta(days=730)
+        step = timedelta(days=730) / n
+        table = Message._meta.db_table
+        sql = f"INSERT INTO {table} (sender_id, receiver_id, content, timestamp) VALUES (%s, %s, %s, %s)"
+        batch = []
+        with connection.cursor() as cursor:
+            for i in range(n):
+                a, b = self.pairs[rng.randrange(pairs)]
+                if rng.random() < 0.5:
+                    a, b = b, a
+                text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 14)))
+                batch.append((a.id, b.id, text, (start + step * i).isoformat()))
+                if len(batch) == 50000:
+                    cursor.executemany(sql, batch)
+                    batch = []
+            if batch:
+                cursor.executemany(sql, batch)
+
+        # every thread fully read on both sides
+        last = dict(
+            ((min(s, r), max(s, r)), m) for s, r, m in
+            Message.objects.values("sender_id", "receiver_id").annotate(m=Max("id"))
+            .values_list("sender_id", "receiver_id", "m")
+        )
+        convs = []
+        for a, b in self.pairs:
+            key = (min(a.id, b.id), max(a.id, b.id))
+            if key in last:
+                convs += [Conversation(owner=a, peer=b, last_message_id=last[key], last_read_id=last[key]),
+                          Conversation(owner=b, peer=a, last_message_id=last[key], last_read_id=last[key])]
+        Conversation.objects.bulk_create(convs, batch_size=5000)
+
+    def timed(self, fn, repeat):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        return statistics.median(samples), samples[max(int(len(samples) * 0.95) - 1, 0)]
+
+    def report(self, label, rng, repeat):
+        with connection.cursor() as cursor:
+            cursor.execute("VACUUM")
+        hot, cold = retention.table_size(Message), retention.table_size(MessageSegment)
+        file_bytes, _ = retention.database_size()
+        self.stdout.write(self.style.MIGRATE_HEADING(f"--- {label} ---"))
+        self.stdout.write(f"Message:        {hot['rows']:>12,} rows  {_kib(hot['bytes']):>14} (table + indexes)")
+        self.stdout.write(f"MessageSegment: {cold['rows']:>12,} rows  {_kib(cold['bytes']):>14}")
+        self.stdout.write(f"database file:  {_kib(file_bytes):>33}")
+
+        def newest():
+            me, peer = rng.choice(self.pairs)
+            inbox.thread_page(me, peer, limit=50)
+
+        def deep():
+            # a page from the first half of the thread (archived after the run)
+            me, peer = rng.choice(self.pairs)
+            ids = Conversation.objects.filter(owner=me, peer=peer).values_list("last_message_id", flat=True).first()
+            inbox.thread_page(me, peer, limit=50, before_id=max((ids or 0) // 2, 1))
+
+        for name, fn in (("newest page", newest), ("scroll-back page", deep)):
+            p50, p95 = self.timed(fn, repeat)
+            self.stdout.write(f"{name:<18} p50 {p50:7.2f} ms   p95 {p95:7.2f} ms")
@@ -0,0 +1,114 @@
+"""
+Measure the overhead of MetricsMiddleware.
+
+    python manage.py bench_metrics [--rows 200] [--repeat 300]
+
+Seeds like bench_serializers and sends authenticated GETs through the full
+middleware stack (test client) to a few list endpoints: first without
+MetricsMiddleware, then with it at several sample rates, interleaved in
+rounds. Prints the p50 and mean per request and
+the p50 overhead against the baseline.
+
+End-to-end differences of a few percent are within run-to-run noise, so it
+also times the middleware's own work directly (bookkeeping per request,
+execute_wrapper per query) and prints the overhead that implies at each
+sample rate.
+"""
+import statistics
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from users import metrics
+from users.management.commands import bench_serializers
+
+ENDPOINTS = ("profile/", "chats/{peer}/messages/?limit=50", "meetings/my/", "search/?skill=python", "friends/")
+
+
+class Command(bench_serializers.Command):
+    help = "Compare request latency with and without users.metrics.MetricsMiddleware."
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.set_defaults(repeat=300)
+
+    def run(self, rows, repeat):
+        setup_test_environment()
+        try:
+            self.compare(repeat)
+        finally:
+            teardown_test_environment()
+
+    def client(self, middleware, urls):
+        token = str(RefreshToken.for_user(self.me).access_token)
+        client = Client(HTTP_AUTHORIZATION=f"Bearer {token}")
+        with override_settings(MIDDLEWARE=middleware):
+            for url in urls:  # loads this middleware stack; warms caches and connections
+                client.get(url)
+        return client
+
+    def compare(self, repeat):
+        urls = [f"/api/{e.format(peer=self.peer.id)}" for e in ENDPOINTS]
+        with_metrics = list(settings.MIDDLEWARE)
+        without = [m for m in with_metrics if m != "users.metrics.MetricsMiddleware"]
+        runs = [("no middleware", self.client(without, urls), 0.0),
+                ("sample 0%", self.client(with_metrics, urls), 0.0),
+                ("sample 10%", self.client(with_metrics, urls), 0.1),
+                ("sample 100%", self.client(with_metrics, urls), 1.0)]
+
+        # interleave the configurations in rounds so drift hits them all alike
+        samples = {label: [] for label, _, _ in runs}
+        for _ in range(repeat // 10):
+            for label, client, rate in runs:
+                with override_settings(PEERZA_METRICS_SAMPLE_RATE=rate):
+                    for _ in range(10):
+                        for url in urls:
+                            start = time.perf_counter()
+                            client.get(url)
+                            samples[label].append((time.perf_counter() - start) * 1000)
+
+        self.stdout.write(f"{len(urls)} endpoints × {repeat} requests per configuration")
+        self.stdout.write(f"{'configuration':<16}{'p50 ms':>10}{'mean ms':>10}{'overhead':>10}")
+        baseline = statistics.median(samples["no middleware"])
+        for label, _, _ in runs:
+            p50 = statistics.median(samples[label])
+            self.stdout.write(f"{label:<16}{p50:>10.3f}{statistics.fmean(samples[label]):>10.3f}"
+                              f"{(p50 / baseline - 1) * 100:>9.1f}%")
+
+        self.direct_cost(statistics.fmean(samples["no middleware"]))
+
+    def direct_cost(self, request_ms, n=20000):
+        # queries per sampled request, from the runs above
+        views = [v for name, v in metrics.registry.views.items() if v.sampled]
+        per_request = sum(v.db_queries for v in views) / max(sum(v.sampled for v in views), 1)
+
+        registry = metrics.Registry()
+        start = time.perf_counter()
+        for _ in range(n):  # every request: sampling decision, two clock reads, registry update
+            metrics.random.random()
+            t = time.perf_counter()
+            registry.record("bench", "GET", 200, time.perf_counter() - t, 1000)
+        record_ms = (time.perf_counter() - start) * 1000 / n
+
+        with connection.cursor() as cursor:
+            start = time.perf_counter()
+            for _ in range(n):
+                cursor.execute("SELECT 1")
+            plain = time.perf_counter() - start
+            with connection.execute_wrapper(metrics.Sample(10)):
+                start = time.perf_counter()
+                for _ in range(n):
+                    cursor.execute("SELECT 1")
+                wrapped = time.perf_counter() - start
+        query_ms = (wrapped - plain) * 1000 / n
+
+        self.stdout.write(f"\nDirect cost: {record_ms * 1000:.1f} µs bookkeeping per request, "
+                          f"{query_ms * 1000:.1f} µs per wrapped query, {per_request:.1f} queries per request")
+        for rate in (0.0, 0.1, 1.0):
+            cost = record_ms + rate * per_request * query_ms
+            self.stdout.write(f"sample {rate:>4.0%}: {cost * 1000:6.1f} µs = {cost / request_ms * 100:.2f}% "
+                              f"of a {request_ms:.2f} ms request")
@@ -0,0 +1,140 @@
+"""
+Benchmark read watermarks against the old per-message is_read flags.
+
+    python manage.py bench_read_state --messages 100000
+
+The legacy column is re-added in the scratch database with raw SQL so both
+strategies run against the same 100k-message conversation.
+"""
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.db import connection
+from django.utils import timezone
+
+from users import inbox
+from users.management.scratch import ScratchCommand
+from users.models import Conversation, Message, User
+
+
+class Command(ScratchCommand):
+    help = "Compare mark-read and unread counting: watermarks vs per-message is_read."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=100000)
+        parser.add_argument("--new", type=int, default=20, help="messages arriving between reads")
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def bench(self, opts):
+        self.seed(opts["messages"], random.Random(opts["seed"]))
+        self.run(opts["new"], opts["repeat"])
+
+    def seed(self, n, rng):
+        self.stdout.write(f"Seeding one conversation with {n} messages…")
+        self.alice = User.objects.create(username="alice", email="alice@peerza.test")
+        self.bob = User.objects.create(username="bob", email="bob@peerza.test")
+        start = timezone.now() - timedelta(days=365)
+        batch = []
+        for i in range(n):
+            sender, receiver = (self.alice, self.bob) if rng.random() < 0.5 else (self.bob, self.alice)
+            batch.append(Message(sender=sender, receiver=receiver, content=f"message {i}",
+                                 timestamp=start + timedelta(seconds=i)))
+            if len(batch) == 10000:
+                Message.objects.bulk_create(batch)
+                batch = []
+        Message.objects.bulk_create(batch)
+
+        last = Message.objects.latest("id")
+        for owner, peer in ((self.alice, self.bob), (self.bob, self.alice)):
+            Conversation.objects.create(owner=owner, peer=peer, last_message=last, last_activity=last.timestamp)
+
+        with connection.cursor() as cursor:  # the pre-watermark schema
+            cursor.execute("ALTER TABLE users_message ADD COLUMN is_read bool NOT NULL DEFAULT 0")
+
+    # --- the two strategies, for bob reading alice's messages ---
+
+    def legacy_mark_read(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE users_message SET is_read = 1 WHERE sender_id = %s AND receiver_id = %s AND is_read = 0",
+                [self.alice.id, self.bob.id],
+            )
+
+    def legacy_unread(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT COUNT(*) FROM users_message WHERE sender_id = %s AND receiver_id = %s AND is_read = 0",
+                [self.alice.id, self.bob.id],
+            )
+            return cursor.fetchone()[0]
+
+    def watermark_mark_read(self):
+        inbox.mark_read(self.bob, self.alice)
+
+    def watermark_counter(self):
+        return Conversation.objects.filter(owner=self.bob, peer=self.alice).values_list(
+            "unread_count", flat=True).get()
+
+    def watermark_recount(self):
+        mark = Conversation.objects.filter(owner=self.bob, peer=self.alice).values_list(
+            "last_read_id", flat=True).get()
+        return inbox.unread_after(self.bob.id, self.alice.id, mark)
+
+    # --- state setup between samples (not timed) ---
+
+    def everything_unread(self):
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE users_message SET is_read = 0")
+        unread = Message.objects.filter(sender=self.alice, receiver=self.bob).count()
+        Conversation.objects.filter(owner=self.bob, peer=self.alice).update(last_read_id=0, unread_count=unread)
+
+    def everything_read(self):
+        self.legacy_mark_read()
+        self.watermark_mark_read()
+
+    def new_messages(self, k):
+        for _ in range(k):
+            inbox.record_message(Message.objects.create(sender=self.alice, receiver=self.bob, content="new"))
+
+    def timed(self, fn, setup, repeat):
+        samples, result = [], None
+        for _ in range(repeat):
+            setup()
+            start = time.perf_counter()
+            result = fn()
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        return statistics.median(samples), samples[max(int(len(samples) * 0.95) - 1, 0)], result
+
+    def run(self, new, repeat):
+        total = Message.objects.count()
+        self.stdout.write(f"{total} messages, about half of them from alice to bob")
+        cases = [
+            ("mark-read, all unread", self.everything_unread, [
+                ("legacy is_read UPDATE", self.legacy_mark_read),
+                ("watermark", self.watermark_mark_read),
+            ]),
+            (f"mark-read, {new} new", lambda: self.new_messages(new), [
+                ("legacy is_read UPDATE", self.legacy_mark_read),
+                ("watermark", self.watermark_mark_read),
+            ]),
+            ("unread count, all unread", self.everything_unread, [
+                ("legacy COUNT(*)", self.legacy_unread),
+                ("watermark counter", self.watermark_counter),
+                ("watermark range recount", self.watermark_recount),
+            ]),
+            ("unread count, all read", self.everything_read, [
+                ("legacy COUNT(*)", self.legacy_unread),
+                ("watermark counter", self.watermark_counter),
+                ("watermark range recount", self.watermark_recount),
+            ]),
+        ]
+        self.stdout.write(f"{'case':<30}{'strategy':<26}{'p50 ms':>9}{'p95 ms':>9}{'result':>9}")
+        for case, setup, strategies in cases:
+            for label, fn in strategies:
+                p50, p95, result = self.timed(fn, setup, repeat)
+                result = "" if result is None else result
+                self.stdout.write(f"{case:<30}{label:<26}{p50:>9.2f}{p95:>9.2f}{result!s:>9}")
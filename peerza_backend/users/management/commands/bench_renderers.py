@@ -0,0 +1,56 @@
+"""
+Benchmark response rendering and compression on the largest list endpoints.
+
+    python manage.py bench_renderers [--rows 200] [--repeat 30]
+
+Seeds like bench_serializers. For chat_messages, my_meetings and
+search_peers it takes the data the view returns and times each renderer
+(DRF's JSONRenderer, ORJSONRenderer and, when msgpack is installed,
+MessagePackRenderer) followed by each content coding CompressionMiddleware
+can pick, printing p50 CPU time and the bytes that go on the wire.
+"""
+import statistics
+import time
+
+from django.core.management.base import CommandError
+from rest_framework.renderers import JSONRenderer
+
+from users import compression, renderers
+from users.management.commands import bench_serializers
+
+
+class Command(bench_serializers.Command):
+    help = "Compare renderers and response compression on chat_messages, my_meetings and search_peers."
+
+    def timed(self, fn, repeat):
+        samples = []
+        for _ in range(repeat):
+            start = time.process_time()
+            body = fn()
+            samples.append((time.process_time() - start) * 1000)
+        return statistics.median(samples), body
+
+    def run(self, rows, repeat):
+        formats = [("json (DRF)", JSONRenderer()), ("orjson", renderers.ORJSONRenderer())]
+        if renderers.msgpack is not None:
+            formats.append(("msgpack", renderers.MessagePackRenderer()))
+        else:
+            self.stdout.write("msgpack is not installed: skipping application/msgpack")
+        if compression.brotli is None:
+            self.stdout.write("brotli is not installed: gzip only")
+        codings = ("identity",) + compression.supported()[::-1]
+
+        self.stdout.write(f"{'endpoint':<16}{'format':<12}{'coding':<10}{'CPU ms':>9}{'bytes':>10}{'ratio':>8}")
+        for name in ("chat_messages", "my_meetings", "search_peers"):
+            data = getattr(self, name)(rows)[1]()
+            baseline = JSONRenderer().render(data)
+            if renderers.ORJSONRenderer().render(data) != baseline:
+                raise CommandError(f"{name}: ORJSONRenderer output differs from JSONRenderer")
+            for label, renderer in formats:
+                for coding in codings:
+                    def fn():
+                        body = renderer.render(data)
+                        return body if coding == "identity" else compression.compress(body, coding)
+                    ms, body = self.timed(fn, repeat)
+                    self.stdout.write(f"{name:<16}{label:<12}{coding:<10}{ms:>9.2f}{len(body):>10,}"
+                                      f"{len(baseline) / len(body):>7.1f}x")
@@ -0,0 +1,99 @@
+"""
+Benchmark the trigram skill search against the old icontains query.
+
+    python manage.py bench_search --userskills 1000000
+"""
+import random
+import statistics
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.db.models import Count
+
+from users import search
+from users.management.scratch import ScratchCommand
+from users.models import Skill, SkillTrigram, User, UserSkill
+
+TOPICS = [
+    "python", "javascript", "typescript", "django", "react", "guitar", "piano",
+    "spanish", "french", "german", "photography", "cooking", "chess", "yoga",
+    "design", "marketing", "excel", "statistics", "calculus", "physics",
+]
+LEVELS = ["", "advanced", "beginner", "basics of", "intro to", "applied"]
+
+QUERIES = ["python", "pyth", "script", "pyhton", "javscript", "guitar", "intro to chess", "zzz"]
+
+
+class Command(ScratchCommand):
+    help = "Compare trigram skill search with the legacy icontains scan."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=20000)
+        parser.add_argument("--userskills", type=int, default=100000)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def bench(self, opts):
+        self.seed(opts["users"], opts["userskills"], random.Random(opts["seed"]))
+        self.run(opts["repeat"])
+
+    def seed(self, n_users, n_userskills, rng):
+        self.stdout.write(f"Seeding {n_users} users / {n_userskills} user skills…")
+        password = make_password(None)
+        User.objects.bulk_create(
+            [User(username=f"bench{i}", email=f"bench{i}@peerza.test", password=password)
+             for i in range(n_users)],
+            batch_size=5000,
+        )
+        names = sorted({f"{lvl} {a} {b}".strip() if rng.random() < 0.5 else f"{lvl} {a}".strip()
+                        for lvl in LEVELS for a in TOPICS for b in TOPICS if a != b})
+        Skill.objects.bulk_create([Skill(name=n) for n in names], batch_size=5000)
+
+        user_ids = list(User.objects.values_list("id", flat=True))
+        skill_ids = list(Skill.objects.values_list("id", flat=True))
+        batch = []
+        for _ in range(n_userskills):
+            batch.append(UserSkill(
+                user_id=rng.choice(user_ids), skill_id=rng.choice(skill_ids),
+                skill_type="TEACH" if rng.random() < 0.6 else "LEARN",
+            ))
+            if len(batch) == 10000:
+                UserSkill.objects.bulk_create(batch)
+                batch = []
+        UserSkill.objects.bulk_create(batch)
+
+        SkillTrigram.objects.bulk_create(
+            [SkillTrigram(skill=s, trigram=g) for s in Skill.objects.all() for g in search.trigrams(s.name)],
+            batch_size=10000,
+        )
+        counts = UserSkill.objects.filter(skill_type="TEACH").values("skill_id").annotate(n=Count("id"))
+        for row in counts:
+            Skill.objects.filter(id=row["skill_id"]).update(teacher_count=row["n"])
+        self.me = User.objects.first()
+
+    def timed(self, fn, repeat):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            rows = fn()
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        return statistics.median(samples), samples[int(len(samples) * 0.95) - 1], len(rows)
+
+    def run(self, repeat):
+        me = self.me
+        strategies = {
+            "legacy icontains (all rows)": lambda q: list(
+                UserSkill.objects.filter(skill__name__icontains=q, skill_type="TEACH").exclude(user=me)
+            ),
+            "legacy icontains (first 20)": lambda q: list(
+                UserSkill.objects.filter(skill__name__icontains=q, skill_type="TEACH").exclude(user=me)[:20]
+            ),
+            "trigram index (page 1, 20)": lambda q: search.search_teachers(q, me, 0, 20),
+            "trigram index (page 50, 20)": lambda q: search.search_teachers(q, me, 980, 20),
+        }
+        self.stdout.write(f"{'query':<16}{'strategy':<30}{'p50 ms':>9}{'p95 ms':>9}{'rows':>9}")
+        for q in QUERIES:
+            for label, fn in strategies.items():
+                p50, p95, rows = self.timed(lambda: fn(q), repeat)
+                self.stdout.write(f"{q:<16}{label:<30}{p50:>9.2f}{p95:>9.2f}{rows:>9}")
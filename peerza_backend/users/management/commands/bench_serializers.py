@@ -0,0 +1,182 @@
+"""
+Benchmark the fast read serializers against the DRF ModelSerializers.
+
+    python manage.py bench_serializers [--rows 200] [--repeat 30]
+
+For each list endpoint it times the old path (queryset -> ModelSerializer
+-> JSONRenderer) and the new one (values_list -> fastserializers ->
+JSONRenderer), checks that both render to the same bytes, and prints p50 latency and rows per second. A second
+table compares the default nested users with ?shape=normalized.
+"""
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import CommandError
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from users import fastserializers, inbox, search
+from users.management.scratch import ScratchCommand
+from users.models import Friendship, Meeting, Message, Notification, Skill, User, UserSkill
+from users.serializers import (
+    MeetingSerializer, MessageSerializer, NotificationSerializer, UserSerializer, UserSkillSerializer, normalize,
+)
+
+
+class Command(ScratchCommand):
+    help = "Compare DRF serializers with users.fastserializers on the hot list endpoints."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=200, help="rows per list")
+        parser.add_argument("--repeat", type=int, default=30)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def bench(self, opts):
+        self.seed(opts["rows"], random.Random(opts["seed"]))
+        self.run(opts["rows"], opts["repeat"])
+
+    def seed(self, n, rng):
+        self.stdout.write(f"Seeding {n} rows per endpoint…")
+        users = User.objects.bulk_create([
+            User(username=f"bench{i}", email=f"bench{i}@peerza.test", bio=f"bio {i}" * 5,
+                 avatar=f"avatars/{i}.png" if i % 2 else None, is_pro=bool(i % 3))
+            for i in range(n + 1)
+        ])
+        self.me, self.peer = users[0], users[1]
+        now = timezone.now()
+
+        for i in range(n):
+            sender, receiver = (self.me, self.peer) if rng.random() < 0.5 else (self.peer, self.me)
+            inbox.record_message(Message.objects.create(sender=sender, receiver=receiver, content=f"message {i}"))
+        inbox.mark_read(self.me, self.peer)
+
+        Notification.objects.bulk_create([
+            Notification(user=self.me, actor=users[1 + i % n], type="FRIEND_REQUEST", data={"request_id": i})
+            for i in range(n)
+        ])
+        Meeting.objects.bulk_create([
+            Meeting(host=users[1 + i % n] if i % 2 else self.me, guest=self.me if i % 2 else users[1 + i % n],
+                    topic=f"Lesson {i}", start_datetime=now + timedelta(hours=i),
+                    end_datetime=now + timedelta(hours=i, minutes=45), status="ACCEPTED", jitsi_room=f"room-{i}")
+            for i in range(n)
+        ])
+        Friendship.objects.bulk_create([Friendship(user=self.me, friend=u) for u in users[1:]])
+        skill = Skill.objects.create(name="python")
+        search.index_skill(skill)
+        UserSkill.objects.bulk_create([
+            UserSkill(user=u, skill=skill, skill_type="TEACH", proficiency="Expert") for u in users[1:]
+        ])
+        for _ in users[1:]:
+            search.teacher_added(skill.id)
+
+    # --- the two paths per endpoint: (DRF data, fast data) builders ---
+
+    def chat_messages(self, limit):
+        me, peer = self.me, self.peer
+
+        def drf():
+            msgs = inbox.thread_page(me, peer, limit=limit)
+            marks = inbox.read_marks([(me.id, peer.id), (peer.id, me.id)])
+            return MessageSerializer(msgs, many=True, context={"read_marks": marks}).data
+
+        def fast():
+            rows = inbox.thread_page(me, peer, limit=limit, rows=True)
+            marks = inbox.read_marks([(me.id, peer.id), (peer.id, me.id)])
+            users = {me.id: fastserializers.user(me), peer.id: fastserializers.user(peer)}
+            return fastserializers.messages(rows, users, marks)
+
+        return drf, fast
+
+    def notifications_list(self, limit):
+        qs = Notification.objects.filter(user=self.me, is_read=False).order_by("-created_at")
+        return (lambda: NotificationSerializer(qs[:50], many=True).data,
+                lambda: fastserializers.NOTIFICATION.many(qs, limit=50))
+
+    def search_peers(self, limit):
+        shape = fastserializers.USER_SKILL
+        return (
+            lambda: UserSkillSerializer(search.search_teachers("python", self.me, limit=limit), many=True).data,
+            lambda: shape.rows(search.search_teachers("python", self.me, limit=limit, columns=shape.columns)),
+        )
+
+    def my_meetings(self, limit):
+        qs = Meeting.objects.filter(Q(host=self.me) | Q(guest=self.me))
+        return lambda: MeetingSerializer(qs, many=True).data, lambda: fastserializers.MEETING.many(qs)
+
+    def friends_list(self, limit):
+        qs = Friendship.objects.filter(user=self.me)
+        return (
+            lambda: [{"id": f.id, "friend": UserSerializer(f.friend).data} for f in qs.select_related("friend")],
+            lambda: fastserializers.FRIENDSHIP_ROW.many(qs),
+        )
+
+    def timed(self, fn, repeat):
+        renderer, samples = JSONRenderer(), []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            data = fn()
+            body = renderer.render(data)
+            samples.append((time.perf_counter() - start) * 1000)
+        return statistics.median(samples), body, len(data)
+
+    def run(self, rows, repeat):
+        self.stdout.write(f"{'endpoint':<20}{'rows':>6}{'DRF ms':>10}{'fast ms':>10}{'speedup':>9}"
+                          f"{'DRF rows/s':>13}{'fast rows/s':>13}")
+        for name in ("chat_messages", "notifications_list", "search_peers", "my_meetings", "friends_list"):
+            drf, fast = getattr(self, name)(rows)
+            slow_ms, slow_body, count = self.timed(drf, repeat)
+            fast_ms, fast_body, _ = self.timed(fast, repeat)
+            if slow_body != fast_body:
+                raise CommandError(f"{name}: fast output differs from the DRF serializer")
+            self.stdout.write(
+                f"{name:<20}{count:>6}{slow_ms:>10.2f}{fast_ms:>10.2f}{slow_ms / fast_ms:>8.1f}x"
+                f"{1000 * count / slow_ms:>13,.0f}{1000 * count / fast_ms:>13,.0f}"
+            )
+
+        self.stdout.write(f"\n{'?shape=normalized':<20}{'nested B':>10}{'norm. B':>10}{'nested ms':>11}"
+                          f"{'norm. ms':>10}{'DRF norm. ms':>14}")
+        for name in ("chat_messages", "notifications_list", "search_peers"):
+            _, nested = getattr(self, name)(rows)
+            drf, fast = getattr(self, f"{name}_normalized")(rows)
+            nested_ms, nested_body, _ = self.timed(nested, repeat)
+            fast_ms, fast_body, _ = self.timed(fast, repeat)
+            drf_ms, drf_body, _ = self.timed(drf, repeat)
+            if drf_body != fast_body:
+                raise CommandError(f"{name}: normalized output differs from serializers.normalize")
+            self.stdout.write(f"{name:<20}{len(nested_body):>10,}{len(fast_body):>10,}{nested_ms:>11.2f}"
+                              f"{fast_ms:>10.2f}{drf_ms:>14.2f}")
+
+    # --- ?shape=normalized: (serializers.normalize, fastserializers) builders ---
+
+    def chat_messages_normalized(self, limit):
+        me, peer = self.me, self.peer
+
+        def drf():
+            msgs = inbox.thread_page(me, peer, limit=limit)
+            marks = inbox.read_marks([(me.id, peer.id), (peer.id, me.id)])
+            return normalize(MessageSerializer, msgs, {"read_marks": marks})
+
+        def fast():  # as in views.chat_messages
+            rows = inbox.thread_page(me, peer, limit=limit, rows=True)
+            marks = inbox.read_marks([(me.id, peer.id), (peer.id, me.id)])
+            users = {me.id: fastserializers.user(me), peer.id: fastserializers.user(peer)}
+            items = fastserializers.messages(rows, {me.id: me.id, peer.id: peer.id}, marks)
+            return {"items": items, "users": {uid: users[uid] for uid in (rows[0][1], rows[0][2])}}
+
+        return drf, fast
+
+    def notifications_list_normalized(self, limit):
+        qs = Notification.objects.filter(user=self.me, is_read=False).order_by("-created_at")
+        return (lambda: normalize(NotificationSerializer, qs[:50]),
+                lambda: fastserializers.NOTIFICATION.many(qs, limit=50, normalized=True))
+
+    def search_peers_normalized(self, limit):
+        shape = fastserializers.USER_SKILL
+        return (
+            lambda: normalize(UserSkillSerializer, search.search_teachers("python", self.me, limit=limit)),
+            lambda: shape.normalized(search.search_teachers("python", self.me, limit=limit,
+                                                            columns=shape.normalized_columns)),
+        )
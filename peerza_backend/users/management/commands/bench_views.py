@@ -0,0 +1,320 @@
+"""
+Time every API view against a seeded database and keep the results as JSON.
+
+    python manage.py seed_peerza --users 100000                 # once
+    python manage.py bench_views --output before.json
+    python manage.py bench_views --output after.json --compare before.json
+    python manage.py bench_views --scratch 2000                 # throwaway test database
+
+Every route users.urls serves from users/views.py, views_availability.py
+and views_meeting.py is requested through the whole middleware stack with
+the test client, authenticated with a JWT as seed0 (seed_peerza's busiest
+user) and aimed at their most recent chat partner. Writes run in a
+transaction that is rolled back, so the dataset is the same on every run
+(and on_commit work such as the outbox and events is not timed). A route
+without a benchmark below is reported, so new views are not missed.
+
+The view cache is cleared before each endpoint: cold_ms is the first
+request, p50/p95/mean the following ones (at most --repeat requests, fewer
+once an endpoint has used --budget seconds). Query counts and response
+bytes come from the last request.
+
+The JSON holds the git commit, the dataset size and one entry per
+endpoint. --compare prints p50 changes against an earlier file and fails
+when an endpoint got more than --threshold slower (ignoring changes under
+--min-ms) or runs more queries.
+"""
+import json
+import logging
+import statistics
+import subprocess
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from users import urls
+from users.management.scratch import scratch_database_if
+from users.models import (
+    Availability, Conversation, FriendRequest, Friendship, Meeting, Message, Notification, Skill, User, UserSkill,
+)
+
+MODULES = ("users.views", "users.views_availability", "users.views_meeting")
+METHODS = ("GET", "POST", "PUT", "PATCH", "DELETE")
+
+
+def routes():
+    """{(url name, method)} for every route users.urls serves from MODULES."""
+    found = set()
+    for pattern in urls.urlpatterns:
+        view = pattern.callback
+        cls = getattr(view, "cls", None)
+        if cls is None or cls.__module__ not in MODULES:
+            continue
+        actions = getattr(view, "actions", None)
+        methods = ([m.upper() for m in actions if m.upper() in METHODS] if actions is not None  # no HEAD
+                   else [m for m in METHODS if hasattr(cls, m.lower())])
+        found.update((pattern.name, m) for m in methods)
+    return found
+
+
+class Counter:
+    """connection.execute_wrapper counting queries."""
+
+    def __init__(self):
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+
+def _p95(ordered):
+    return ordered[max(int(len(ordered) * 0.95) - 1, 0)]
+
+
+def _commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                             cwd=Path(__file__).resolve().parent)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = "Benchmark every users/ API view on a seed_peerza dataset; write and compare JSON results."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=20, help="requests per endpoint")
+        parser.add_argument("--budget", type=float, default=10.0, help="seconds per endpoint")
+        parser.add_argument("--only", nargs="*", default=None, help="endpoint labels to run")
+        parser.add_argument("--output", help="write results to this JSON file")
+        parser.add_argument("--compare", help="JSON file of an earlier run")
+        parser.add_argument("--threshold", type=float, default=0.2, help="allowed p50 slowdown (0.2 = 20%%)")
+        parser.add_argument("--min-ms", type=float, default=1.0, help="ignore p50 changes smaller than this")
+        parser.add_argument("--scratch", type=int, metavar="USERS",
+                            help="seed a throwaway test database with this many users and run there")
+
+    def handle(self, *args, **opts):
+        setup_test_environment()  # 'testserver' in ALLOWED_HOSTS
+        logging.getLogger("django.request").setLevel(logging.ERROR)  # expected 4xx, e.g. the free plan's 403
+        try:
+            with scratch_database_if(opts["scratch"]):
+                if opts["scratch"]:
+                    call_command("seed_peerza", users=opts["scratch"], stdout=self.stdout)
+                results = self.run(opts)
+        finally:
+            teardown_test_environment()
+
+        if opts["output"]:
+            Path(opts["output"]).write_text(json.dumps(results, indent=2) + "\n")
+            self.stdout.write(f"Wrote {opts['output']}")
+        if opts["compare"]:
+            self.compare(json.loads(Path(opts["compare"]).read_text()), results, opts)
+
+    # --- running ---
+
+    def run(self, opts):
+        me = User.objects.filter(username="seed0").first()
+        if me is None:
+            raise CommandError("No seed_peerza data here: run seed_peerza first, or pass --scratch USERS.")
+        client = Client(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(me).access_token}")
+        endpoints = self.endpoints(me, client)
+
+        missing = sorted(f"{name} {method}" for name, method in routes() - {(e[1], e[2]) for e in endpoints})
+        if missing:
+            self.stdout.write(self.style.WARNING(f"Not benchmarked: {', '.join(missing)}"))
+
+        results = {
+            "commit": _commit(),
+            "created": timezone.now().isoformat(),
+            "vendor": connection.vendor,
+            "dataset": {model.__name__: model.objects.count() for model in (User, Message, Meeting, Friendship)},
+            "repeat": opts["repeat"],
+            "endpoints": {},
+        }
+        self.stdout.write(f"{'endpoint':<34}{'status':>7}{'cold ms':>10}{'p50 ms':>9}{'p95 ms':>9}"
+                          f"{'queries':>9}{'bytes':>10}")
+        for label, name, method, path, body in endpoints:
+            if opts["only"] and label not in opts["only"]:
+                continue
+            if path is None:
+                self.stdout.write(f"{label:<34}  (no data in this dataset)")
+                continue
+            entry = self.measure(client, method, path, body, opts)
+            results["endpoints"][label] = entry
+            self.stdout.write(f"{label:<34}{entry['status']:>7}{entry['cold_ms']:>10.2f}{entry['p50_ms']:>9.2f}"
+                              f"{entry['p95_ms']:>9.2f}{entry['queries']:>9}{entry['bytes']:>10,}")
+        return results
+
+    def request(self, client, method, path, body):
+        counter = Counter()
+        with connection.execute_wrapper(counter):
+            start = time.perf_counter()
+            if method == "GET":
+                response = client.get(path)
+            else:
+                with transaction.atomic():
+                    response = client.generic(method, path, json.dumps(body or {}), content_type="application/json")
+                    transaction.set_rollback(True)
+            ms = (time.perf_counter() - start) * 1000
+        return ms, response, counter.queries
+
+    def measure(self, client, method, path, body, opts):
+        caches[getattr(settings, "PEERZA_VIEW_CACHE", "views")].clear()
+        samples, deadline = [], time.perf_counter() + opts["budget"]
+        while len(samples) < max(opts["repeat"], 2):
+            ms, response, queries = self.request(client, method, path, body)
+            samples.append(ms)
+            if len(samples) >= 2 and time.perf_counter() > deadline:
+                break
+        warm = sorted(samples[1:])
+        return {
+            "method": method, "path": path, "status": response.status_code,
+            "n": len(samples), "cold_ms": round(samples[0], 3),
+            "p50_ms": round(statistics.median(warm), 3), "p95_ms": round(_p95(warm), 3),
+            "mean_ms": round(statistics.fmean(warm), 3),
+            "queries": queries, "bytes": len(response.content),
+        }
+
+    def endpoints(self, me, client):
+        """[(label, url name, method, path or None when the dataset has no target, body)]."""
+        conv = Conversation.objects.filter(owner=me).exclude(last_message=None).order_by("-last_activity").first()
+        friends = list(Friendship.objects.filter(user=me).values_list("friend_id", flat=True)[:50])
+        peer_id = conv.peer_id if conv else next(iter(friends), None)
+        total = User.objects.count()
+        stranger = User.objects.filter(username=f"seed{total // 2}").values_list("id", flat=True).first()
+        skill = Skill.objects.order_by("-teacher_count").values_list("name", flat=True).first()
+        request = FriendRequest.objects.filter(to_user=me, status=FriendRequest.PENDING).values_list("id", flat=True)
+        invite = Meeting.objects.filter(Q(host=me) | Q(guest=me), status="PENDING").values_list("id", flat=True)
+        hosted = Meeting.objects.filter(host=me).values_list("id", flat=True)
+        note = Notification.objects.filter(user=me, is_read=False).values_list("id", flat=True)
+        user_skill = UserSkill.objects.filter(user=me).values_list("id", flat=True)
+        slot = Availability.objects.filter(user=me).values_list("id", flat=True)
+        cursor = client.get(reverse("sync")).json()["cursor"]
+        free = (timezone.now() + timedelta(days=400)).replace(hour=3, minute=0, second=0, microsecond=0)
+        booking = {"guest_id": peer_id, "guest": peer_id, "topic": "Benchmark",
+                   "start_datetime": free.isoformat(), "end_datetime": (free + timedelta(minutes=30)).isoformat()}
+        new_slot = {"day_of_week": "SUNDAY", "start_time": "05:00", "end_time": "06:00"}
+
+        def url(name, *args, query=""):
+            if any(a is None for a in args):
+                return None
+            return reverse(name, args=args) + (f"?{query}" if query else "")
+
+        batch_paths = [reverse(n) for n in ("profile", "notifications_list", "chat_conversations", "friends_list",
+                                            "my_meetings")]
+        return [
+            # users/views.py
+            ("register POST", "register", "POST", url("register"),
+             {"username": "bench-register", "password": "bench-password-1", "email": "bench-register@peerza.test"}),
+            ("profile", "profile", "GET", url("profile"), None),
+            ("profile PATCH", "profile", "PATCH", url("profile"), {"bio": "Benchmarking"}),
+            ("change_password POST", "change_password", "POST", url("change_password"),
+             {"old_password": "peerza-seed", "new_password": "peerza-seed"}),
+            ("register_firebase_uid POST", "register_firebase_uid", "POST", url("register_firebase_uid"),
+             {"firebase_uid": "bench-uid"}),
+            ("my_skills", "my_skills", "GET", url("my_skills"), None),
+            ("my_skills POST", "my_skills", "POST", url("my_skills"), {"skill_name": skill, "skill_type": "LEARN"}),
+            ("delete_skill DELETE", "delete_skill", "DELETE", url("delete_skill", user_skill.first()), None),
+            ("search_peers", "search_peers", "GET", url("search_peers", query=f"skill={skill}"), None),
+            ("search_peers typo", "search_peers", "GET", url("search_peers", query=f"skill={(skill or '')[:-1]}x"),
+             None),
+            ("swap_matches", "swap_matches", "GET", url("swap_matches"), None),
+            ("public_profile", "public_profile", "GET", url("public_profile", peer_id), None),
+            ("presence_lookup", "presence_lookup", "GET",
+             url("presence_lookup", query="ids=" + ",".join(map(str, friends))), None),
+            ("presence_heartbeat POST", "presence_heartbeat", "POST", url("presence_heartbeat"), None),
+            ("check_calls", "check_calls", "GET", url("check_calls"), None),
+            ("call_start POST", "call_start", "POST", url("call_start", peer_id), None),
+            ("call_end POST", "call_end", "POST", url("call_end", peer_id), None),
+            ("request_meeting POST", "request_meeting", "POST", url("request_meeting"), booking),
+            ("respond_meeting POST", "respond_meeting", "POST", url("respond_meeting", invite.first()),
+             {"response": "ACCEPT"}),
+            ("my_meetings", "my_meetings", "GET", url("my_meetings"), None),
+            ("pending_meetings", "pending_meetings", "GET", url("pending_meetings"), None),
+            ("notifications_list", "notifications_list", "GET", url("notifications_list"), None),
+            ("notifications_list normalized", "notifications_list", "GET",
+             url("notifications_list", query="shape=normalized"), None),
+            ("mark_notification_read POST", "mark_notification_read", "POST",
+             url("mark_notification_read", note.first()), None),
+            ("mark_notifications_read_all POST", "mark_notifications_read_all", "POST",
+             url("mark_notifications_read_all"), None),
+            ("notifications_outbox_stats", "notifications_outbox_stats", "GET", url("notifications_outbox_stats"),
+             None),
+            ("view_cache_stats", "view_cache_stats", "GET", url("view_cache_stats"), None),
+            ("batch POST", "batch", "POST", url("batch"), {"requests": [{"path": p} for p in batch_paths]}),
+            ("chat_conversations", "chat_conversations", "GET", url("chat_conversations"), None),
+            ("chat_conversations paged", "chat_conversations", "GET", url("chat_conversations", query="limit=50"),
+             None),
+            ("chat_messages", "chat_messages", "GET", url("chat_messages", peer_id), None),
+            ("chat_messages paged", "chat_messages", "GET", url("chat_messages", peer_id, query="limit=50"), None),
+            ("chat_send POST", "chat_send", "POST", url("chat_send", peer_id), {"content": "benchmark message"}),
+            ("chat_mark_read POST", "chat_mark_read", "POST", url("chat_mark_read", peer_id), None),
+            ("sync", "sync", "GET", url("sync"), None),
+            ("sync since", "sync", "GET", url("sync", query=f"since={cursor}"), None),
+            ("friends_list", "friends_list", "GET", url("friends_list"), None),
+            ("friend_requests_inbox", "friend_requests_inbox", "GET", url("friend_requests_inbox"), None),
+            ("friend_request_send POST", "friend_request_send", "POST", url("friend_request_send", stranger), None),
+            ("friend_request_respond POST", "friend_request_respond", "POST",
+             url("friend_request_respond", request.first()), {"action": "ACCEPT"}),
+            # users/views_availability.py
+            ("availability-list", "availability-list", "GET", url("availability-list"), None),
+            ("availability-list POST", "availability-list", "POST", url("availability-list"), new_slot),
+            ("availability-detail", "availability-detail", "GET", url("availability-detail", slot.first()), None),
+            ("availability-detail PUT", "availability-detail", "PUT", url("availability-detail", slot.first()),
+             new_slot),
+            ("availability-detail PATCH", "availability-detail", "PATCH", url("availability-detail", slot.first()),
+             {"end_time": "23:00"}),
+            ("availability-detail DELETE", "availability-detail", "DELETE",
+             url("availability-detail", slot.first()), None),
+            ("availability-user", "availability-user", "GET", url("availability-user", peer_id), None),
+            ("availability-common", "availability-common", "GET",
+             url("availability-common", query=f"user_b={peer_id}"), None),
+            # users/views_meeting.py
+            ("meeting-list", "meeting-list", "GET", url("meeting-list"), None),
+            ("meeting-list POST", "meeting-list", "POST", url("meeting-list"), booking),
+            ("meeting-detail", "meeting-detail", "GET", url("meeting-detail", hosted.first()), None),
+            ("meeting-detail PUT", "meeting-detail", "PUT", url("meeting-detail", hosted.first()), booking),
+            ("meeting-detail PATCH", "meeting-detail", "PATCH", url("meeting-detail", hosted.first()),
+             {"topic": "Benchmark"}),
+            ("meeting-detail DELETE", "meeting-detail", "DELETE", url("meeting-detail", hosted.first()), None),
+        ]
+
+    # --- comparing ---
+
+    def compare(self, before, after, opts):
+        self.stdout.write(f"\nvs {before.get('commit') or '?'} ({before.get('created', '?')})")
+        if before.get("dataset") != after.get("dataset"):
+            self.stdout.write(self.style.WARNING(
+                f"Datasets differ: {before.get('dataset')} vs {after.get('dataset')}"
+            ))
+        self.stdout.write(f"{'endpoint':<34}{'p50 before':>11}{'p50 after':>11}{'change':>9}{'queries':>11}")
+        regressions = []
+        for label, new in after["endpoints"].items():
+            old = before.get("endpoints", {}).get(label)
+            if old is None:
+                continue
+            change = (new["p50_ms"] - old["p50_ms"]) / old["p50_ms"] if old["p50_ms"] else 0.0
+            slower = change > opts["threshold"] and new["p50_ms"] - old["p50_ms"] >= opts["min_ms"]
+            more_queries = new["queries"] > old["queries"]
+            line = (f"{label:<34}{old['p50_ms']:>11.2f}{new['p50_ms']:>11.2f}{change:>+9.0%}"
+                    f"{old['queries']:>5} → {new['queries']:<3}")
+            if slower or more_queries:
+                regressions.append(label)
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
+        if regressions:
+            raise CommandError(f"{len(regressions)} endpoint(s) regressed: {', '.join(regressions)}")
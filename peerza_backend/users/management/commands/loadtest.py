@@ -0,0 +1,505 @@
+"""
+Closed-loop load test: N virtual users behaving like the React client.
+
+    python manage.py runserver --noreload          # or: uvicorn peerza_backend.asgi:application
+    python manage.py loadtest --url http://127.0.0.1:8000 --users 200 --duration 120 [--output run.json]
+
+Each virtual user signs in as a seed_peerza account (seed1, seed2, … with
+--password) through login/ and then runs the dashboard's timers, each
+waiting for its own response before the next tick, as the browser does:
+
+  - page load: profile/ (twice, Home and ChatContext), my-skills/,
+    meetings/pending/, notifications/, chats/, friends/;
+  - the /api/events/ stream (ASGI servers only); while it is down, sync/
+    every 5s (following has_more) and the call/wait/ long poll;
+  - chats/ 5s after the previous answer (the chat widget), the presence
+    heartbeat every 60s and the chat list's presence/ lookup every 30s;
+  - notifications/ and meetings/pending/ again when a push event or a sync
+    delta says they changed;
+  - every --think seconds on average (exponential), one action: open a
+    chat (messages, read, chats/), send a message, search, open a profile,
+    the friends page, or book a meeting (availability, then meetings/;
+    409 for a taken slot is expected).
+
+Like a browser, a user keeps at most 6 keep-alive connections to the host.
+An expired access token is refreshed through token/refresh/ once.
+
+Only requests completing after the --warmup period (default: the ramp-up)
+count. The report lists per route (numeric ids folded into {id}) the
+requests, throughput, p50/p95/p99 latency, 4xx responses and errors
+(5xx, timeouts and connection failures); --output also writes it as JSON.
+call/wait/ is a long poll: its latency is the hold time, not a cost.
+Run one server worker to measure capacity per worker.
+"""
+import asyncio
+import json
+import random
+import re
+import ssl
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from users.management.commands.bench_views import _commit
+
+CONNECTIONS_PER_HOST = 6    # browsers' HTTP/1.1 limit
+SEARCHES = ("python", "guitar", "spanish", "machine learning", "chess", "piano", "excel", "drawing", "yoga")
+ACTIONS = (("open_chat", 30), ("send_message", 25), ("search", 15), ("profile", 10), ("friends_page", 10),
+           ("book_meeting", 5), ("my_meetings", 5))
+_ID = re.compile(r"/\d+(?=/)")
+
+
+def route(method, path):
+    return f"{method} {_ID.sub('/{id}', path.split('?', 1)[0])}"
+
+
+def _percentile(ordered, q):
+    return ordered[max(int(len(ordered) * q) - 1, 0)]
+
+
+class ProtocolError(Exception):
+    """The server's answer is not HTTP/1.1 we can parse."""
+
+
+# =============================================================
+# HTTP/1.1 CLIENT (asyncio streams, keep-alive)
+# =============================================================
+
+class Connection:
+    def __init__(self, reader, writer, host):
+        self.reader, self.writer, self.host = reader, writer, host
+
+    @classmethod
+    async def open(cls, url):
+        port = url.port or (443 if url.scheme == "https" else 80)
+        context = ssl.create_default_context() if url.scheme == "https" else None
+        reader, writer = await asyncio.open_connection(url.hostname, port, ssl=context, limit=2 ** 20)
+        return cls(reader, writer, url.netloc)
+
+    def close(self):
+        self.writer.close()
+
+    async def send(self, method, target, headers, body=b""):
+        lines = [f"{method} {target} HTTP/1.1", f"Host: {self.host}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        if body or method in ("POST", "PUT", "PATCH"):
+            lines.append(f"Content-Length: {len(body)}")
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await self.writer.drain()
+
+    async def head(self):
+        """(status, {lowercase header: value}) of the next response."""
+        line = await self.reader.readline()
+        parts = line.decode("latin-1").split(" ", 2)
+        if len(parts) < 2 or not parts[0].startswith("HTTP/1."):
+            raise ProtocolError(f"bad status line {line!r}")
+        headers = {}
+        while True:
+            line = (await self.reader.readline()).decode("latin-1").rstrip("\r\n")
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return int(parts[1]), headers
+
+    async def body(self, method, status, headers):
+        """(body, reusable) for a response whose head was just read."""
+        if method == "HEAD" or status in (204, 304) or status < 200:
+            return b"", True
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                if not size:
+                    while (await self.reader.readline()) not in (b"\r\n", b""):
+                        pass  # trailers
+                    return b"".join(chunks), True
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readexactly(2)
+        if "content-length" in headers:
+            return await self.reader.readexactly(int(headers["content-length"])), True
+        return await self.reader.read(), False  # delimited by close
+
+    async def request(self, method, target, headers, body=b""):
+        await self.send(method, target, headers, body)
+        status, response_headers = await self.head()
+        content, reusable = await self.body(method, status, response_headers)
+        reusable = reusable and response_headers.get("connection", "").lower() != "close"
+        return status, response_headers, content, reusable
+
+
+class Client:
+    """One browser: a keep-alive pool towards --url and the user's tokens."""
+
+    def __init__(self, url, stats, timeout):
+        self.url, self.stats, self.timeout = url, stats, timeout
+        self.prefix = url.path.rstrip("/") + "/api/"
+        self.slots = asyncio.Semaphore(CONNECTIONS_PER_HOST)
+        self.idle = []
+        self.access = self.refresh = None
+
+    def close(self):
+        for conn in self.idle:
+            conn.close()
+        self.idle.clear()
+
+    def headers(self, body):
+        headers = {"Accept": "application/json"}
+        if body:
+            headers["Content-Type"] = "application/json"
+        if self.access:
+            headers["Authorization"] = f"Bearer {self.access}"
+        return headers
+
+    async def call(self, method, path, data=None, params=None, timeout=None, retry=True):
+        """(status or None on failure, decoded JSON body or None) for /api/<path>."""
+        target = self.prefix + path + (f"?{urlencode(params)}" if params else "")
+        body = json.dumps(data).encode() if data is not None else b""
+        async with self.slots:
+            started = time.perf_counter()
+            while True:
+                reused = bool(self.idle)
+                conn = self.idle.pop() if reused else None
+                try:
+                    conn = conn or await Connection.open(self.url)
+                    status, headers, content, reusable = await asyncio.wait_for(
+                        conn.request(method, target, self.headers(body), body), timeout or self.timeout,
+                    )
+                    break
+                except (OSError, EOFError, ValueError, asyncio.TimeoutError, ProtocolError) as exc:
+                    if conn is not None:
+                        conn.close()
+                    if reused and not isinstance(exc, asyncio.TimeoutError):
+                        continue  # the server closed an idle connection: retry on a new one, as browsers do
+                    self.stats.record(route(method, path), None, time.perf_counter() - started)
+                    return None, None
+            self.stats.record(route(method, path), status, time.perf_counter() - started)
+            if reusable:
+                self.idle.append(conn)
+            else:
+                conn.close()
+
+        if status == 401 and retry and self.refresh and path != "token/refresh/":
+            refreshed, tokens = await self.call("POST", "token/refresh/", {"refresh": self.refresh}, retry=False)
+            if refreshed == 200:
+                self.access = tokens["access"]
+                return await self.call(method, path, data, params, timeout, retry=False)
+        try:
+            decoded = json.loads(content) if headers.get("content-type", "").startswith("application/json") else None
+        except ValueError:
+            decoded = None
+        return status, decoded
+
+
+# =============================================================
+# STATS
+# =============================================================
+
+class Stats:
+    def __init__(self):
+        self.recording = False
+        self.started = None
+        self.latency = defaultdict(list)   # route -> seconds
+        self.statuses = defaultdict(Counter)  # route -> status (None: failed) -> count
+        self.events = Counter()            # stream connects and events received
+
+    def start(self):
+        self.recording, self.started = True, time.perf_counter()
+
+    def record(self, name, status, seconds):
+        if self.recording:
+            self.latency[name].append(seconds)
+            self.statuses[name][status] += 1
+
+    def report(self, elapsed):
+        routes, total, failed = {}, 0, 0
+        for name in sorted(self.latency):
+            ordered = sorted(self.latency[name])
+            statuses = self.statuses[name]
+            errors = sum(n for status, n in statuses.items() if status is None or status >= 500)
+            client_errors = sum(n for status, n in statuses.items() if status is not None and 400 <= status < 500)
+            total, failed = total + len(ordered), failed + errors
+            routes[name] = {
+                "requests": len(ordered), "rps": round(len(ordered) / elapsed, 2),
+                "p50_ms": round(_percentile(ordered, 0.50) * 1000, 2),
+                "p95_ms": round(_percentile(ordered, 0.95) * 1000, 2),
+                "p99_ms": round(_percentile(ordered, 0.99) * 1000, 2),
+                "4xx": client_errors, "errors": errors,
+                "error_rate": round(errors / len(ordered), 4),
+                "statuses": {str(status): n for status, n in sorted(statuses.items(), key=lambda kv: str(kv[0]))},
+            }
+        return {
+            "seconds": round(elapsed, 1), "requests": total, "rps": round(total / elapsed, 2),
+            "errors": failed, "error_rate": round(failed / total, 4) if total else 0.0,
+            "events": dict(self.events), "routes": routes,
+        }
+
+
+# =============================================================
+# VIRTUAL USER
+# =============================================================
+
+class VirtualUser:
+    def __init__(self, client, username, password, rng, think):
+        self.client, self.username, self.password = client, username, password
+        self.rng, self.think = rng, think
+        self.live = False          # event stream connected
+        self.me = None
+        self.friends = []
+        self.cursor = None         # sync/ cursor
+
+    async def run(self):
+        status, tokens = await self.client.call("POST", "login/", {"username": self.username,
+                                                                 "password": self.password})
+        if status != 200:
+            return
+        self.client.access, self.client.refresh = tokens["access"], tokens["refresh"]
+        await self.page_load()
+        loops = [
+            self.events(), self.sync(), self.call_wait(),
+            self.every(5, lambda: self.client.call("GET", "chats/"), after_response=True),
+            self.every(60, lambda: self.client.call("POST", "presence/heartbeat/")),
+            self.every(30, self.presence),
+            self.actions(),
+        ]
+        tasks = [asyncio.create_task(loop) for loop in loops]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def page_load(self):
+        call = self.client.call
+        _, self.me = await call("GET", "profile/")
+        await asyncio.gather(
+            call("GET", "profile/"), call("GET", "my-skills/"), call("GET", "meetings/pending/"),
+            call("GET", "notifications/"), call("GET", "chats/"), self.load_friends(),
+        )
+
+    async def load_friends(self):
+        _, friends = await self.client.call("GET", "friends/")
+        self.friends = [f["friend"]["id"] for f in friends or [] if isinstance(f, dict) and "friend" in f]
+
+    async def every(self, seconds, fn, after_response=False):
+        """setInterval (fixed rate) or, with after_response, setTimeout re-armed after each answer."""
+        await asyncio.sleep(self.rng.uniform(0, seconds))
+        while True:
+            started = time.perf_counter()
+            await fn()
+            elapsed = time.perf_counter() - started
+            await asyncio.sleep(seconds if after_response else max(seconds - elapsed, 0))
+
+    # --- push, and its polling fallbacks ---
+
+    async def events(self):
+        client = self.client
+        while True:
+            conn = None
+            try:
+                conn = await Connection.open(client.url)
+                await conn.send("GET", f"{client.prefix}events/?{urlencode({'token': client.access})}",
+                                {"Accept": "text/event-stream"})
+                status, headers = await asyncio.wait_for(conn.head(), client.timeout)
+                if status == 200 and headers.get("content-type", "").startswith("text/event-stream"):
+                    self.live = True
+                    client.stats.events["connected"] += 1
+                    # each event is one write, so with chunked framing its lines still start a line
+                    while line := await conn.reader.readline():
+                        if line.startswith(b"event:"):
+                            await self.on_event(line[6:].strip().decode())
+            except (OSError, EOFError, ValueError, asyncio.TimeoutError, ProtocolError):
+                pass
+            finally:
+                self.live = False
+                if conn is not None:
+                    conn.close()
+            await asyncio.sleep(15)  # as serverEvents.js: retry the stream later
+
+    async def on_event(self, kind):
+        self.client.stats.events[kind] += 1
+        if kind == "notification":
+            await self.client.call("GET", "notifications/")
+        elif kind in ("meeting_request", "meeting_response"):
+            await self.client.call("GET", "meetings/pending/")
+
+    async def sync(self):
+        async def tick():
+            if self.live:
+                return
+            if self.cursor is None:
+                _, data = await self.client.call("GET", "sync/")
+                self.cursor = (data or {}).get("cursor")
+                return
+            more = True
+            while more:
+                status, data = await self.client.call("GET", "sync/", params={"since": self.cursor})
+                if status != 200 or not data:
+                    return
+                self.cursor, more = data["cursor"], data["has_more"]
+                changes = data.get("changes", {})
+                if changes.get("notification") or changes.get("friend_request"):
+                    await self.client.call("GET", "notifications/")
+                if changes.get("meeting"):
+                    await self.client.call("GET", "meetings/pending/")
+
+        await self.every(5, tick)
+
+    async def call_wait(self):
+        version = -1
+        while True:
+            if self.live:
+                await asyncio.sleep(3)
+                continue
+            status, data = await self.client.call("GET", "call/wait/", params={"version": version},
+                                                  timeout=self.client.timeout + 30)
+            if status == 200 and data:
+                version = data.get("version", version)
+            else:
+                await asyncio.sleep(3)
+
+    async def presence(self):
+        if self.friends:
+            await self.client.call("GET", "presence/", params={"ids": ",".join(map(str, self.friends[:50]))})
+
+    # --- user actions ---
+
+    async def actions(self):
+        names, weights = zip(*ACTIONS)
+        while True:
+            await asyncio.sleep(self.rng.expovariate(1 / self.think))
+            await getattr(self, self.rng.choices(names, weights)[0])()
+
+    def peer(self):
+        return self.rng.choice(self.friends) if self.friends else None
+
+    async def open_chat(self, peer=None):
+        peer = peer or self.peer()
+        if peer is None:
+            return
+        await self.client.call("GET", f"chats/{peer}/messages/", params={"limit": 50})
+        await self.client.call("POST", f"chats/{peer}/read/", {})
+        await self.client.call("GET", "chats/")
+
+    async def send_message(self):
+        peer = self.peer()
+        if peer is not None:
+            await self.client.call("POST", f"chats/{peer}/send/", {"content": f"load test {self.rng.random():.6f}"})
+
+    async def search(self):
+        await self.client.call("GET", "search/", params={"skill": self.rng.choice(SEARCHES)})
+
+    async def profile(self):
+        peer = self.peer()
+        if peer is not None:
+            await self.client.call("GET", f"users/{peer}/")
+
+    async def friends_page(self):
+        await asyncio.gather(self.client.call("GET", "friends/requests/"), self.load_friends())
+
+    async def my_meetings(self):
+        await self.client.call("GET", "meetings/my/")
+
+    async def book_meeting(self):
+        peer = self.peer()
+        if peer is None:
+            return
+        await self.client.call("GET", f"availability/{peer}/user/")
+        start = (timezone.now() + timedelta(hours=self.rng.randint(24, 60 * 24))).replace(
+            minute=0, second=0, microsecond=0)
+        await self.client.call("POST", "meetings/", {
+            "guest": peer, "topic": "Load test", "start_datetime": start.isoformat(),
+            "end_datetime": (start + timedelta(minutes=30)).isoformat(),
+        })
+
+
+# =============================================================
+# COMMAND
+# =============================================================
+
+class Command(BaseCommand):
+    help = "Simulate N polling frontend clients against a running server; report per-route latency."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000")
+        parser.add_argument("--users", type=int, default=50, help="concurrent virtual users")
+        parser.add_argument("--duration", type=float, default=60, help="seconds, ramp-up included")
+        parser.add_argument("--ramp", type=float, default=10, help="seconds to start all users")
+        parser.add_argument("--warmup", type=float, default=None, help="seconds not measured (default: --ramp)")
+        parser.add_argument("--think", type=float, default=20, help="mean seconds between user actions")
+        parser.add_argument("--accounts", type=int, default=None,
+                            help="seed_peerza accounts to sign in as (default: one per user)")
+        parser.add_argument("--password", default="peerza-seed")
+        parser.add_argument("--timeout", type=float, default=30)
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--output", help="write the report to this JSON file")
+
+    def handle(self, *args, **opts):
+        url = urlsplit(opts["url"])
+        if url.scheme not in ("http", "https") or not url.hostname:
+            raise CommandError("--url must be http(s)://host[:port]")
+        report = asyncio.run(self.load(url, opts))
+        self.print_report(report, opts)
+        if opts["output"]:
+            Path(opts["output"]).write_text(json.dumps(report, indent=2) + "\n")
+            self.stdout.write(f"Wrote {opts['output']}")
+
+    async def load(self, url, opts):
+        stats, rng = Stats(), random.Random(opts["seed"])
+        accounts = opts["accounts"] or opts["users"]
+        warmup = opts["ramp"] if opts["warmup"] is None else opts["warmup"]
+        clients, tasks = [], []
+        self.stdout.write(f"{opts['users']} users against {opts['url']} for {opts['duration']:.0f}s "
+                          f"(ramp {opts['ramp']:.0f}s, measured after {warmup:.0f}s)…")
+
+        async def start_users():
+            for i in range(opts["users"]):
+                client = Client(url, stats, opts["timeout"])
+                vu = VirtualUser(client, f"seed{1 + i % accounts}", opts["password"],
+                                 random.Random(rng.random()), opts["think"])
+                clients.append(client)
+                tasks.append(asyncio.create_task(vu.run()))
+                await asyncio.sleep(opts["ramp"] / opts["users"])
+
+        starter = asyncio.create_task(start_users())
+        await asyncio.sleep(warmup)
+        stats.start()
+        await asyncio.sleep(max(opts["duration"] - warmup, 0))
+        elapsed = time.perf_counter() - stats.started
+        stats.recording = False
+        for task in [starter, *tasks]:
+            task.cancel()
+        await asyncio.gather(starter, *tasks, return_exceptions=True)
+        for client in clients:
+            client.close()
+
+        report = stats.report(elapsed)
+        report.update({
+            "commit": _commit(), "created": timezone.now().isoformat(),
+            "config": {k: opts[k] for k in ("url", "users", "duration", "ramp", "think", "timeout", "seed")},
+            "signed_in": sum(1 for c in clients if c.access),
+        })
+        return report
+
+    def print_report(self, report, opts):
+        self.stdout.write(f"{'route':<40}{'requests':>9}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+                          f"{'4xx':>6}{'errors':>8}")
+        for name, r in report["routes"].items():
+            self.stdout.write(f"{name:<40}{r['requests']:>9}{r['rps']:>8.1f}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}"
+                              f"{r['p99_ms']:>9.1f}{r['4xx']:>6}{r['error_rate']:>8.1%}")
+        self.stdout.write(
+            f"{report['requests']:,} requests in {report['seconds']}s: {report['rps']} req/s, "
+            f"{report['error_rate']:.1%} errors, {report['signed_in']}/{opts['users']} users signed in, "
+            f"event stream connects: {report['events'].get('connected', 0)}"
+        )
+        if report["signed_in"] < opts["users"]:
+            self.stdout.write(self.style.WARNING(
+                "Some users could not sign in (see POST login/): is the server up, and its database "
+                "seeded with seed_peerza using the same --password?"
+            ))
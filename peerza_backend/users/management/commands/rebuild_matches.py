@@ -0,0 +1,28 @@
+"""
+Recompute every user's top-K swap partners.
+
+    python manage.py rebuild_matches [--top-k 50]
+
+Incremental refreshes happen on skill changes; run this periodically (e.g.
+nightly) to trim and refill partners' lists.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from users import matchmaking
+
+
+class Command(BaseCommand):
+    help = "Rebuild the precomputed reciprocal TEACH/LEARN match lists."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top-k", type=int, default=matchmaking.TOP_K)
+        parser.add_argument("--chunk", type=int, default=matchmaking.CHUNK_ROWS)
+
+    def handle(self, *args, **opts):
+        start = time.perf_counter()
+        written = matchmaking.rebuild_all(k=opts["top_k"], chunk=opts["chunk"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {written} matches in {time.perf_counter() - start:.1f}s"
+        ))
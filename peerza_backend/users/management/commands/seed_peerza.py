@@ -0,0 +1,331 @@
+"""
+Generate a synthetic Peerza dataset at production scale.
+
+    python manage.py seed_peerza --users 1000000 --messages 10000000 [--seed 1]
+
+Writes into the configured database, which should be freshly migrated
+(--scratch: a throwaway test database instead):
+users seed0…seed<N-1> (all with --password; seed0 is staff, so bench_views
+can call the admin endpoints as it), skills from a fixed vocabulary,
+UserSkills, weekly Availability, Friendships and pending FriendRequests,
+Meetings with their notifications, and chat Messages.
+
+The graph is shaped like the real one: friends are drawn from a user's
+neighbourhood of ids (so friends of friends overlap), skill and chat
+activity are skewed (a few skills and threads get most of it) and half of
+each user's friends are chat partners. seed0 has the busiest threads, the
+most friends, meetings, skills and availability slots, and pending friend
+requests. Messages span --days
+and the newest 2% are still unread by their receiver.
+
+Everything the views keep up to date is filled in too: Conversation rows
+(for every friendship, as accepting a request does), last messages, unread
+counts and read watermarks, Skill.teacher_count and the trigram index, and
+SwapMatch via matchmaking.rebuild_all (--skip-matches to leave it empty).
+Bulk inserts send no signals, so nothing is written to ChangeLog or the
+notification outbox.
+
+The same --seed gives the same rows; dates are relative to the time of the run.
+"""
+import random
+import time
+from array import array
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from users import matchmaking, search
+from users.management.scratch import scratch_database_if
+from users.management.commands.bench_message_archive import WORDS
+from users.models import (
+    Availability, Conversation, FriendRequest, Friendship, Meeting, Message, Notification, Skill, User, UserSkill,
+)
+
+SKILLS = (
+    "python", "javascript", "typescript", "java", "kotlin", "swift", "rust", "go", "c++", "sql",
+    "django", "react", "flutter", "machine learning", "data analysis", "excel", "statistics",
+    "calculus", "linear algebra", "physics", "chemistry", "biology", "english", "spanish", "french",
+    "german", "mandarin", "japanese", "arabic", "hindi", "guitar", "piano", "violin", "drums",
+    "singing", "music theory", "drawing", "painting", "photography", "video editing", "graphic design",
+    "ui design", "3d modeling", "chess", "public speaking", "creative writing", "copywriting",
+    "marketing", "accounting", "investing", "cooking", "baking", "yoga", "running", "swimming",
+    "first aid", "woodworking", "knitting", "gardening", "sewing",
+)
+PROFICIENCY = ("Beginner", "Intermediate", "Advanced", "Expert")
+DAYS = [day for day, _ in Availability.DAY_CHOICES]
+MEETING_STATUS = (("ACCEPTED", 50), ("PENDING", 25), ("DECLINED", 15), ("CANCELLED", 10))
+UNREAD_SHARE = 0.02  # newest messages not yet read by their receiver
+PREFIX = "seed"
+
+
+def _skewed(rng, n, power=2.0):
+    """An index in range(n), low ones far more likely (popular skills, busy threads)."""
+    return min(int(n * rng.random() ** power), n - 1)
+
+
+def _chunks(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    help = "Fill the database with a deterministic synthetic Peerza dataset (users, skills, chats, meetings…)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10000)
+        parser.add_argument("--messages", type=int, default=None, help="default: 10 per user")
+        parser.add_argument("--skills", type=int, default=500, help="distinct skills")
+        parser.add_argument("--skills-per-user", type=int, default=4, help="average")
+        parser.add_argument("--friends-per-user", type=int, default=8, help="average")
+        parser.add_argument("--slots-per-user", type=int, default=3, help="average weekly availability slots")
+        parser.add_argument("--meetings-per-user", type=int, default=2, help="average meetings hosted")
+        parser.add_argument("--days", type=int, default=365, help="history the messages span")
+        parser.add_argument("--password", default="peerza-seed")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--skip-matches", action="store_true", help="do not rebuild SwapMatch")
+        parser.add_argument("--scratch", action="store_true",
+                            help="seed a throwaway test database and drop it again, to time a run")
+
+    def handle(self, *args, **opts):
+        with scratch_database_if(opts["scratch"]):
+            self.seed(opts)
+
+    def seed(self, opts):
+        if opts["users"] < 10:
+            raise CommandError("--users must be at least 10")
+        if User.objects.filter(username=f"{PREFIX}0").exists():
+            raise CommandError("This database is already seeded: run seed_peerza on a fresh, migrated database.")
+        if opts["messages"] is None:
+            opts["messages"] = opts["users"] * 10
+
+        self.opts = opts
+        self.rng = random.Random(opts["seed"])
+        self.now = timezone.now()
+        self.batch = opts["batch_size"]
+        started = time.perf_counter()
+        for step in (self.seed_users, self.seed_skills, self.seed_availability, self.seed_friends,
+                     self.seed_meetings, self.seed_messages, self.seed_matches):
+            step_started = time.perf_counter()
+            with transaction.atomic():
+                summary = step()
+            if summary:
+                self.stdout.write(f"{summary} in {time.perf_counter() - step_started:.1f}s")
+        self.stdout.write(self.style.SUCCESS(f"Seeded in {time.perf_counter() - started:.1f}s"))
+
+    def _insert(self, model, rows):
+        written = 0
+        for batch in _chunks(rows, self.batch):
+            written += len(model.objects.bulk_create(batch))
+        return written
+
+    # --- users, skills, availability ---
+
+    def seed_users(self):
+        n, rng, now = self.opts["users"], self.rng, self.now
+        password = make_password(self.opts["password"])  # hashed once: same login for everyone
+        self.ids = array("q")
+        for batch in _chunks(range(n), self.batch):
+            users = User.objects.bulk_create([
+                User(username=f"{PREFIX}{i}", email=f"{PREFIX}{i}@peerza.test", password=password,
+                     bio=" ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 20))) if rng.random() < 0.6 else None,
+                     is_pro=rng.random() < 0.2, is_staff=i == 0,
+                     date_joined=now - timedelta(days=rng.uniform(30, 730)),
+                     last_active=now - timedelta(minutes=rng.expovariate(1 / 600)))
+                for i in batch
+            ])
+            self.ids.extend(u.pk for u in users)
+        return f"{n:,} users"
+
+    def seed_skills(self):
+        rng, n = self.rng, self.opts["skills"]
+        names = [name if i < len(SKILLS) else f"{name} {i // len(SKILLS) + 1}"
+                 for i, name in ((i, SKILLS[i % len(SKILLS)]) for i in range(n))]
+        skills = self._skill_rows(names)
+        teachers = [0] * n
+
+        def rows():
+            avg = self.opts["skills_per_user"]
+            for i, uid in enumerate(self.ids):
+                picked = set()
+                most = max(2 * avg - 1, 1)
+                for _ in range(most if i == 0 else rng.randint(1, most)):
+                    picked.add(_skewed(rng, n))
+                for s in picked:
+                    kind = "TEACH" if rng.random() < 0.5 else "LEARN"
+                    if kind == "TEACH":
+                        teachers[s] += 1
+                    yield UserSkill(user_id=uid, skill_id=skills[s].id, skill_type=kind,
+                                    proficiency=rng.choice(PROFICIENCY))
+
+        written = self._insert(UserSkill, rows())
+        for skill, count in zip(skills, teachers):
+            skill.teacher_count = count
+        Skill.objects.bulk_update(skills, ["teacher_count"], batch_size=self.batch)
+        return f"{n:,} skills, {written:,} user skills"
+
+    def _skill_rows(self, names):
+        skills = Skill.objects.bulk_create([Skill(name=name) for name in names], batch_size=self.batch)
+        for skill in skills:
+            search.index_skill(skill)
+        return skills
+
+    def seed_availability(self):
+        rng, avg = self.rng, self.opts["slots_per_user"]
+
+        def rows():
+            for i, uid in enumerate(self.ids):
+                for day in rng.sample(DAYS, min(2 * avg if i == 0 else rng.randint(0, 2 * avg), len(DAYS))):
+                    start = rng.randint(8, 19)
+                    yield Availability(user_id=uid, day_of_week=day, start_time=f"{start:02d}:00",
+                                       end_time=f"{start + rng.randint(1, 3):02d}:00")
+
+        return f"{self._insert(Availability, rows()):,} availability slots"
+
+    # --- friends and meetings: partners come from an id neighbourhood ---
+
+    def _window(self):
+        # friends at offsets 1..W, requests at W+1..2W: with 4W < n no pair is drawn twice
+        return max(1, min(50, (self.opts["users"] - 1) // 4))
+
+    def seed_friends(self):
+        rng, n, ids, w = self.rng, self.opts["users"], self.ids, self._window()
+        avg = self.opts["friends_per_user"]
+        self.pairs_lo, self.pairs_hi = array("q"), array("q")  # every friendship, user ids
+        self.threads = array("q")                               # indexes into pairs that chat
+
+        def friendships():
+            for i in range(n):
+                k = w if i == 0 else min(rng.randint(0, avg), w)  # out-degree averages avg / 2
+                for off in rng.sample(range(1, w + 1), k):
+                    a, b = ids[i], ids[(i + off) % n]
+                    if rng.random() < 0.5:
+                        self.threads.append(len(self.pairs_lo))
+                    self.pairs_lo.append(a)
+                    self.pairs_hi.append(b)
+                    yield Friendship(user_id=a, friend_id=b)  # created_at is auto_now_add
+                    yield Friendship(user_id=b, friend_id=a)
+
+        friends = self._insert(Friendship, friendships())
+
+        def requests():
+            for i in range(n):
+                for off in rng.sample(range(w + 1, 2 * w + 1), min(2 if i == 0 else rng.randint(0, 2), w)):
+                    yield FriendRequest(from_user_id=ids[(i + off) % n], to_user_id=ids[i])
+
+        pending = []
+        for batch in _chunks(requests(), self.batch):
+            pending += [(fr.id, fr.from_user_id, fr.to_user_id) for fr in FriendRequest.objects.bulk_create(batch)]
+        self._insert(Notification, (
+            Notification(user_id=to_id, actor_id=from_id, type="FRIEND_REQUEST", data={"request_id": rid},
+                         created_at=self.now - timedelta(hours=rng.uniform(0, 72)))
+            for rid, from_id, to_id in pending
+        ))
+        return f"{friends:,} friendships, {len(pending):,} pending requests"
+
+    def seed_meetings(self):
+        rng, n, ids, w, now = self.rng, self.opts["users"], self.ids, self._window(), self.now
+        avg = self.opts["meetings_per_user"]
+        statuses, weights = zip(*MEETING_STATUS)
+
+        def rows():
+            for i in range(n):
+                count = 10 * avg if i == 0 else rng.randint(0, 2 * avg)
+                for hour in rng.sample(range(-30 * 24, 30 * 24), count):
+                    start = (now + timedelta(hours=hour)).replace(minute=0, second=0, microsecond=0)
+                    status = rng.choices(statuses, weights)[0]
+                    host, guest = ids[i], ids[(i + rng.randint(1, w)) % n]
+                    yield Meeting(host_id=host, guest_id=guest, topic=f"{rng.choice(SKILLS).title()} session",
+                                  start_datetime=start, end_datetime=start + timedelta(minutes=rng.choice((30, 60))),
+                                  status=status, created_at=min(start - timedelta(days=rng.uniform(1, 14)), now),
+                                  jitsi_room=f"peerza-{min(host, guest)}-{max(host, guest)}-{start:%Y%m%d%H}"
+                                  if status == "ACCEPTED" else None)
+
+        meetings = notes = 0
+        for batch in _chunks(rows(), self.batch):
+            created = Meeting.objects.bulk_create(batch)
+            meetings += len(created)
+            notes += self._insert(Notification, self._meeting_notes(created))
+        return f"{meetings:,} meetings, {notes:,} notifications"
+
+    def _meeting_notes(self, meetings):
+        recent = self.now - timedelta(days=3)
+        for m in meetings:
+            yield Notification(user_id=m.guest_id, actor_id=m.host_id, type="MEETING_REQUEST",
+                               data={"meeting_id": m.id}, created_at=m.created_at, is_read=m.created_at < recent)
+            if m.status != "PENDING":
+                yield Notification(user_id=m.host_id, actor_id=m.guest_id, type="MEETING_RESPONSE",
+                                   data={"meeting_id": m.id, "response": m.status},
+                                   created_at=m.created_at, is_read=m.created_at < recent)
+
+    # --- chat ---
+
+    def seed_messages(self):
+        rng, total, threads = self.rng, self.opts["messages"], self.threads
+        if not threads or not total:
+            return self._conversations(None, {}, 0, 0)
+        # Message.timestamp is auto_now_add, which bulk_create would overwrite:
+        # rows go in with explicit ids and timestamps instead.
+        first_id = (Message.objects.aggregate(m=Max("id"))["m"] or 0) + 1
+        read_upto = first_id + int(total * (1 - UNREAD_SHARE)) - 1  # every receiver read up to here
+        start = self.now - timedelta(days=self.opts["days"])
+        step = timedelta(days=self.opts["days"]) / total
+        last = array("q", [0]) * len(self.pairs_lo)   # per friendship: newest message index + 1
+        unread = {}                                    # (owner, peer) -> unread count
+
+        table, adapt = Message._meta.db_table, connection.ops.adapt_datetimefield_value
+        sql = f"INSERT INTO {table} (id, sender_id, receiver_id, content, timestamp) VALUES (%s, %s, %s, %s, %s)"
+
+        def rows():
+            for i in range(total):
+                pair = threads[_skewed(rng, len(threads))]
+                sender, receiver = self.pairs_lo[pair], self.pairs_hi[pair]
+                if rng.random() < 0.5:
+                    sender, receiver = receiver, sender
+                last[pair] = i + 1
+                if first_id + i > read_upto:
+                    unread[(receiver, sender)] = unread.get((receiver, sender), 0) + 1
+                text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 14)))
+                yield first_id + i, sender, receiver, text, adapt(start + step * i)
+
+        with connection.cursor() as cursor:
+            for batch in _chunks(rows(), 10 * self.batch):
+                cursor.executemany(sql, batch)
+            for statement in connection.ops.sequence_reset_sql(no_style(), [Message]):
+                cursor.execute(statement)
+        convs = self._conversations((first_id, read_upto, start, step, last), unread, total, len(threads))
+        return convs
+
+    def _conversations(self, messages, unread, total, threads):
+        def rows():
+            for pair, (a, b) in enumerate(zip(self.pairs_lo, self.pairs_hi)):
+                if messages is None or not messages[4][pair]:
+                    yield Conversation(owner_id=a, peer_id=b)
+                    yield Conversation(owner_id=b, peer_id=a)
+                    continue
+                first_id, read_upto, start, step, last = messages
+                last_id = first_id + last[pair] - 1
+                activity = start + step * (last[pair] - 1)
+                for owner, peer in ((a, b), (b, a)):
+                    yield Conversation(owner_id=owner, peer_id=peer, last_message_id=last_id,
+                                       last_read_id=min(last_id, read_upto),
+                                       unread_count=unread.get((owner, peer), 0), last_activity=activity)
+
+        convs = self._insert(Conversation, rows())
+        return f"{total:,} messages over {threads:,} threads, {convs:,} conversations"
+
+    def seed_matches(self):
+        if self.opts["skip_matches"]:
+            return None
+        return f"{matchmaking.rebuild_all():,} swap matches"
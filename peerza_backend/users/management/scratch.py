@@ -0,0 +1,45 @@
+"""
+Throwaway test databases for the seed and bench commands.
+
+scratch_database() creates a fresh, migrated database the way the test
+runner does (test_<NAME>, or in memory for SQLite), points the default
+connection at it for the block and destroys it afterwards, so seeding and
+benchmarking never touch the configured database. ScratchCommand is the
+base of the bench commands that always run there: they implement bench()
+instead of handle().
+"""
+from contextlib import contextmanager, nullcontext
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+SCRATCH_HELP = "Runs in a throwaway test database; the configured database is never touched."
+
+
+@contextmanager
+def scratch_database():
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def scratch_database_if(enabled):
+    """scratch_database() for commands where it is optional (--scratch)."""
+    return scratch_database() if enabled else nullcontext()
+
+
+class ScratchCommand(BaseCommand):
+    def create_parser(self, prog_name, subcommand, **kwargs):
+        parser = super().create_parser(prog_name, subcommand, **kwargs)
+        parser.epilog = SCRATCH_HELP
+        return parser
+
+    def handle(self, *args, **opts):
+        with scratch_database():
+            self.bench(opts)
+
+    def bench(self, opts):
+        raise NotImplementedError
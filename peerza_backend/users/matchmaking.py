@@ -0,0 +1,261 @@
+"""
+Reciprocal TEACH/LEARN matchmaking ("recommended swap partners").
+
+For users A and B:
+    gives = |skills A teaches ∩ skills B wants to learn|
+    takes = |skills B teaches ∩ skills A wants to learn|
+    score = gives + takes + MUTUAL_BONUS * min(gives, takes)
+so real two-way swaps rank above one-sided matches.
+
+rebuild_all() computes every pair at once from sparse user×skill matrices
+(T = teaches, L = learns): gives = T·Lᵀ, takes = L·Tᵀ, processed in row
+chunks, and stores each user's top-K in SwapMatch. Each chunk replaces its
+users' rows in its own short transaction, so readers never see empty lists
+and the database write lock is never held for the whole rebuild.
+
+refresh_user() redoes a single user after their skills change, with NumPy
+over that user's candidates only, and patches the partners' lists. Views
+call schedule_refresh(), which runs it after commit on one background
+thread (settings.PEERZA_MATCH_REFRESH = "background"), or in the
+committing thread with "inline" (tests). The endpoint then just reads
+SwapMatch, which is constant time per request.
+
+Partners' lists may briefly hold more than TOP_K rows or miss a refill
+after an incremental refresh; the next rebuild_all() (manage.py
+rebuild_matches) trims and fills them.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy import sparse
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from .models import SwapMatch, UserSkill
+
+TOP_K = 50
+MUTUAL_BONUS = 2.0
+CHUNK_ROWS = 2000
+SQL_IN_BATCH = 900  # stay under SQLite's bound-parameter limit
+
+logger = logging.getLogger(__name__)
+
+
+def _score(gives, takes):
+    return gives + takes + MUTUAL_BONUS * np.minimum(gives, takes)
+
+
+# -------------------------------------------------------------
+# Full rebuild (sparse matrix products)
+# -------------------------------------------------------------
+
+def build_matrices():
+    """Returns (user_ids, T, L): binary CSR matrices of shape users × skills."""
+    rows = list(UserSkill.objects.values_list("user_id", "skill_id", "skill_type"))
+    n = len(rows)
+    users = np.fromiter((r[0] for r in rows), np.int64, n)
+    skills = np.fromiter((r[1] for r in rows), np.int64, n)
+    teach = np.fromiter((r[2] == "TEACH" for r in rows), bool, n)
+
+    user_ids, u_idx = np.unique(users, return_inverse=True)
+    _, s_idx = np.unique(skills, return_inverse=True)
+    shape = (len(user_ids), int(s_idx.max()) + 1 if n else 0)
+
+    def matrix(mask):
+        m = sparse.csr_matrix((np.ones(mask.sum()), (u_idx[mask], s_idx[mask])), shape=shape)
+        m.data[:] = 1  # a skill listed twice still counts once
+        return m
+
+    return user_ids, matrix(teach), matrix(~teach)
+
+
+# gives and takes are small counts; packing them as gives * PACK + takes lets one
+# sparse matrix carry both on the union of their sparsity patterns.
+PACK = 4096.0
+
+
+def _top_k_rows(user_ids, start, packed, k):
+    """(user, partner, score, gives, takes) tuples for the top-k of each chunk row."""
+    packed = packed.tocsr()
+    rows = np.repeat(np.arange(packed.shape[0]), np.diff(packed.indptr))
+    cols = packed.indices
+    gives = np.floor(packed.data / PACK)
+    takes = packed.data - gives * PACK
+    scores = _score(gives, takes)
+
+    keep = cols != rows + start  # never match yourself
+    rows, cols, gives, takes, scores = rows[keep], cols[keep], gives[keep], takes[keep], scores[keep]
+
+    # Sort by row, then best score first; keep the first k of every row.
+    order = np.lexsort((cols, -scores, rows))
+    rows, cols, gives, takes, scores = rows[order], cols[order], gives[order], takes[order], scores[order]
+    first = np.searchsorted(rows, rows, side="left")
+    top = np.arange(len(rows)) - first < k
+
+    return list(zip(
+        user_ids[rows[top] + start].tolist(), user_ids[cols[top]].tolist(),
+        scores[top].tolist(), gives[top].astype(int).tolist(), takes[top].astype(int).tolist(),
+    ))
+
+
+def _insert_rows(rows):
+    # Plain executemany: millions of rows are too many for model instances.
+    table = connection.ops.quote_name(SwapMatch._meta.db_table)
+    now = timezone.now()
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {table} (user_id, partner_id, score, gives, takes, updated_at) "
+            "VALUES (%s, %s, %s, %s, %s, %s)",
+            [row + (now,) for row in rows],
+        )
+
+
+def rebuild_all(k=TOP_K, chunk=CHUNK_ROWS):
+    """Recompute every user's top-k partners. Returns the number of rows written."""
+    user_ids, T, L = build_matrices()
+    Lt, Tt = L.T.tocsc(), T.T.tocsc()
+    if not len(user_ids):
+        SwapMatch.objects.all().delete()
+        return 0
+
+    written = 0
+    for start in range(0, len(user_ids), chunk):
+        stop = min(start + chunk, len(user_ids))
+        packed = (T[start:stop] @ Lt) * PACK + L[start:stop] @ Tt
+        batch = _top_k_rows(user_ids, start, packed, k)
+        # The chunk owns the user ids from its first user up to the next chunk's
+        # (the first and last chunks are open-ended), so users who no longer
+        # have skills lose their stale rows too.
+        owned = SwapMatch.objects.all()
+        if start:
+            owned = owned.filter(user_id__gte=int(user_ids[start]))
+        if stop < len(user_ids):
+            owned = owned.filter(user_id__lt=int(user_ids[stop]))
+        with transaction.atomic():
+            owned.delete()
+            _insert_rows(batch)
+        written += len(batch)
+    return written
+
+
+# -------------------------------------------------------------
+# Incremental refresh for one user
+# -------------------------------------------------------------
+
+def _counts(user_id, skill_ids, skill_type):
+    """(partner_ids, counts): users of `skill_type` sharing skills in `skill_ids`."""
+    if not skill_ids:
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    pairs = (
+        UserSkill.objects.filter(skill_id__in=skill_ids, skill_type=skill_type)
+        .exclude(user_id=user_id)
+        .values_list("user_id", "skill_id")
+        .distinct()
+    )
+    ids = np.fromiter((u for u, _ in pairs), dtype=np.int64)
+    return np.unique(ids, return_counts=True)
+
+
+def partner_scores(user_id):
+    """(partner_ids, gives, takes, scores) against everyone, as NumPy arrays."""
+    mine = UserSkill.objects.filter(user_id=user_id).values_list("skill_id", "skill_type")
+    teach = list({s for s, t in mine if t == "TEACH"})
+    learn = list({s for s, t in mine if t == "LEARN"})
+
+    give_ids, give_n = _counts(user_id, teach, "LEARN")
+    take_ids, take_n = _counts(user_id, learn, "TEACH")
+    ids = np.union1d(give_ids, take_ids)
+    gives = np.zeros(len(ids), np.int64)
+    takes = np.zeros(len(ids), np.int64)
+    gives[np.searchsorted(ids, give_ids)] = give_n
+    takes[np.searchsorted(ids, take_ids)] = take_n
+    return ids, gives, takes, _score(gives, takes)
+
+
+def refresh_user(user_id, k=TOP_K):
+    ids, gives, takes, scores = partner_scores(user_id)
+    order = np.argsort(-scores, kind="stable")[:k]
+
+    with transaction.atomic():
+        # 1. The user's own list
+        SwapMatch.objects.filter(user_id=user_id).delete()
+        SwapMatch.objects.bulk_create([
+            SwapMatch(user_id=user_id, partner_id=int(ids[i]), score=float(scores[i]),
+                      gives=int(gives[i]), takes=int(takes[i]))
+            for i in order
+        ])
+
+        # 2. Partners' lists: drop the stale entry, re-insert where it now makes their top-k
+        SwapMatch.objects.filter(partner_id=user_id).delete()
+        reverse = []
+        for lo in range(0, len(ids), SQL_IN_BATCH):
+            chunk = ids[lo:lo + SQL_IN_BATCH]
+            current = {
+                row["user_id"]: (row["n"], row["lowest"])
+                for row in SwapMatch.objects.filter(user_id__in=chunk.tolist())
+                .values("user_id").annotate(n=Count("id"), lowest=Min("score"))
+            }
+            for j, pid in enumerate(chunk.tolist(), start=lo):
+                n, lowest = current.get(pid, (0, 0.0))
+                if n < k or scores[j] > lowest:
+                    # symmetric score; gives/takes swap sides
+                    reverse.append(SwapMatch(user_id=pid, partner_id=user_id, score=float(scores[j]),
+                                             gives=int(takes[j]), takes=int(gives[j])))
+        SwapMatch.objects.bulk_create(reverse, batch_size=5000)
+
+
+# -------------------------------------------------------------
+# Deferred refreshes (off the request path)
+# -------------------------------------------------------------
+
+_pending = set()  # user ids queued and not started yet
+_pending_lock = threading.Lock()
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    with _pending_lock:
+        if _executor is None:
+            # one worker: refreshes never compete with each other for the write lock
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="matchmaking")
+        return _executor
+
+
+def schedule_refresh(user_id):
+    """refresh_user(user_id) once the current transaction commits."""
+    transaction.on_commit(lambda: _submit(user_id))
+
+
+def _submit(user_id):
+    if getattr(settings, "PEERZA_MATCH_REFRESH", "background") == "inline":
+        refresh_user(user_id)
+        return
+    with _pending_lock:
+        if user_id in _pending:
+            return  # the queued refresh reads the skills when it runs
+        _pending.add(user_id)
+    _get_executor().submit(_run, user_id)
+
+
+def _run(user_id):
+    with _pending_lock:
+        _pending.discard(user_id)  # changes from now on queue another refresh
+    close_old_connections()
+    try:
+        refresh_user(user_id)
+    except Exception:
+        logger.exception("Swap match refresh failed for user %s", user_id)
+    finally:
+        close_old_connections()
+
+
+def top_matches(user, limit=20):
+    return list(
+        SwapMatch.objects.filter(user=user).select_related("partner").order_by("-score", "partner_id")[:limit]
+    )
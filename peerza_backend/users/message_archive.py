@@ -0,0 +1,187 @@
+"""
+Cold storage for old chat messages.
+
+archive() moves each thread's old messages out of the Message table into
+MessageSegment rows: up to SEGMENT_SIZE messages per row, packed as compact
+JSON (id and time deltas, direction bit, content) and zlib-compressed. The
+hot table and its (sender, receiver, id) index then only cover recent
+chats, while a thread's archive is a handful of blobs behind one small index.
+
+Only a prefix of each thread is archived: messages older than the cutoff,
+already read by their receiver and not the conversation's last_message.
+Every message of a pair with id <= its newest segment's last_id is
+therefore in the archive and every newer one is hot, so read() can simply
+continue where the hot rows stop (inbox.thread_page does that). Unread
+counts and read watermarks never need archived rows.
+
+Archived messages are removed from the hot table with a plain DELETE: no
+signals, so nothing is pushed through sync/. Run it with
+`python manage.py archive_messages`.
+"""
+import json
+import time
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import retention
+from .models import Conversation, Message, MessageSegment
+
+SEGMENT_SIZE = 500  # messages per segment
+LEVEL = 9           # zlib compression level
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def _thread(lo, hi):
+    return Q(sender_id=lo, receiver_id=hi) | Q(sender_id=hi, receiver_id=lo)
+
+
+# =============================================================
+# PACKING
+# =============================================================
+
+def pack(messages, lo):
+    """zlib blob for `messages` (ascending ids) of the pair whose lower user id is `lo`."""
+    rows, prev_id, prev_us = [], 0, 0
+    for m in messages:
+        us = (m.timestamp - EPOCH) // MICROSECOND
+        rows.append([m.id - prev_id, 0 if m.sender_id == lo else 1, us - prev_us, m.content])
+        prev_id, prev_us = m.id, us
+    return zlib.compress(json.dumps(rows, separators=(",", ":"), ensure_ascii=False).encode(), LEVEL)
+
+
+def unpack(segment):
+    """[(id, sender_is_lo, timestamp_us, content)] for `segment`, ascending ids."""
+    out, msg_id, us = [], 0, 0
+    for id_delta, direction, us_delta, content in json.loads(zlib.decompress(bytes(segment.data))):
+        msg_id += id_delta
+        us += us_delta
+        out.append((msg_id, direction == 0, us, content))
+    return out
+
+
+def _message(row, lo, hi):
+    msg_id, lo_sent, us, content = row
+    sender, receiver = (lo, hi) if lo_sent else (hi, lo)
+    return Message(id=msg_id, sender=sender, receiver=receiver, content=content,
+                   timestamp=EPOCH + us * MICROSECOND)
+
+
+def _row(row, lo_id, hi_id):
+    msg_id, lo_sent, us, content = row
+    sender_id, receiver_id = (lo_id, hi_id) if lo_sent else (hi_id, lo_id)
+    return msg_id, sender_id, receiver_id, content, EPOCH + us * MICROSECOND
+
+
+# =============================================================
+# READING
+# =============================================================
+
+def read(me, peer, before_id=None, after_id=None, limit=None, rows=False):
+    """
+    Archived messages between `me` and `peer` strictly between after_id and
+    before_id, oldest first, as unsaved Message instances (or, with `rows`,
+    inbox.THREAD_COLUMNS tuples). With `limit`, the newest `limit` of them,
+    or the oldest when after_id is given (matching inbox.thread_page).
+    """
+    lo, hi = (me, peer) if me.id < peer.id else (peer, me)
+    qs = MessageSegment.objects.filter(user_lo_id=lo.id, user_hi_id=hi.id)
+    if before_id is not None:
+        qs = qs.filter(first_id__lt=before_id)
+    if after_id is not None:
+        qs = qs.filter(last_id__gt=after_id)
+    forward = after_id is not None
+
+    picked = []
+    for segment in qs.order_by("last_id" if forward else "-last_id").iterator(chunk_size=4):
+        kept = [
+            r for r in unpack(segment)
+            if (before_id is None or r[0] < before_id) and (after_id is None or r[0] > after_id)
+        ]
+        picked = picked + kept if forward else kept + picked
+        if limit is not None and len(picked) >= limit:
+            break
+    if limit is not None:
+        picked = picked[:limit] if forward else picked[len(picked) - limit:]
+    # only build the rows actually returned
+    if rows:
+        return [_row(r, lo.id, hi.id) for r in picked]
+    return [_message(r, lo, hi) for r in picked]
+
+
+# =============================================================
+# ARCHIVING
+# =============================================================
+
+def _boundary(lo, hi, cutoff_id):
+    """Highest id of the pair that may be archived (0 = nothing)."""
+    convs = {c.owner_id: c for c in Conversation.objects.filter(owner_id__in=[lo, hi], peer_id__in=[lo, hi])}
+    if len(convs) < 2:
+        return 0
+    limit = cutoff_id
+    for reader, sender in ((lo, hi), (hi, lo)):
+        conv = convs[reader]
+        if conv.last_message_id:
+            limit = min(limit, conv.last_message_id)
+        # the first message `reader` has not read yet must stay hot
+        first_unread = (
+            Message.objects.filter(sender_id=sender, receiver_id=reader, id__gt=conv.last_read_id)
+            .order_by("id").values_list("id", flat=True).first()
+        )
+        if first_unread is not None:
+            limit = min(limit, first_unread)
+    return limit - 1
+
+
+def archive_pair(lo, hi, boundary, segment_size=SEGMENT_SIZE, pause=0):
+    """Move the pair's hot messages with id <= boundary into segments. Returns (messages, segments)."""
+    moved = segments = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                Message.objects.filter(_thread(lo, hi), id__lte=boundary)
+                .order_by("id")[:segment_size]
+            )
+            if not batch:
+                return moved, segments
+            MessageSegment.objects.create(
+                user_lo_id=lo, user_hi_id=hi, first_id=batch[0].id, last_id=batch[-1].id,
+                count=len(batch), data=pack(batch, lo),
+            )
+            retention.delete_rows(Message, [m.id for m in batch])
+        moved += len(batch)
+        segments += 1
+        if pause:
+            time.sleep(pause)
+
+
+def archive(older_than_days=None, segment_size=SEGMENT_SIZE, pause=0, now=None):
+    """Archive every thread's old, read messages. Returns {"messages", "segments", "threads"}."""
+    if older_than_days is None:
+        older_than_days = getattr(settings, "PEERZA_MESSAGE_ARCHIVE_DAYS", 90)
+    now = now or timezone.now()
+    # ids grow with time, so everything below the first young message is old
+    cutoff_id = (
+        Message.objects.filter(timestamp__gte=now - timedelta(days=older_than_days))
+        .order_by("id").values_list("id", flat=True).first()
+    )
+    if cutoff_id is None:
+        cutoff_id = (Message.objects.order_by("-id").values_list("id", flat=True).first() or 0) + 1
+
+    report = {"messages": 0, "segments": 0, "threads": 0}
+    pairs = Conversation.objects.filter(owner_id__lt=F("peer_id")).values_list("owner_id", "peer_id")
+    for lo, hi in list(pairs):
+        boundary = _boundary(lo, hi, cutoff_id)
+        if boundary <= 0:
+            continue
+        moved, segments = archive_pair(lo, hi, boundary, segment_size, pause)
+        if moved:
+            report["threads"] += 1
+            report["messages"] += moved
+            report["segments"] += segments
+    return report
@@ -0,0 +1,337 @@
+"""
+Per-endpoint request metrics, exported as Prometheus text at GET /metrics.
+
+MetricsMiddleware labels every request with its URL name (users.urls names
+such as "chat_messages"; "unresolved" for 404s) and records:
+
+  - request count by method and status, a latency histogram and a response
+    size histogram (bytes on the wire, after compression): every request;
+  - database queries and time (a connection.execute_wrapper), serialize
+    time (building response data in users.fastserializers, see
+    serializing()), render time (the DRF renderer turning that data into
+    bytes, measured between process_template_response and the post-render
+    callback) and likely N+1 patterns: only a sampled share of requests,
+    settings.PEERZA_METRICS_SAMPLE_RATE. Views still on DRF serializers
+    build their data in serializer.data, which is not counted as either.
+
+Under ASGI a sampled request for a sync view runs the rest of the stack in
+one sync_to_async thread, with the execute_wrapper installed on that
+thread's connection; Django's own adapters for the sync view then run on
+the same thread, so its queries are seen. Async views (signaling.call_wait)
+are timed only: their queries run on threads of their own choosing.
+
+A request is flagged as N+1 when one SQL shape (the statement with IN
+lists collapsed; parameters are never part of it) runs more than
+settings.PEERZA_METRICS_REPEAT_THRESHOLD times. The flag is counted per
+view and logged once per view and shape, with the SQL.
+
+The registry is per process, like the outbox metrics: scrape every worker,
+or run one process per container. With settings.PEERZA_METRICS_TOKEN set,
+/metrics requires "Authorization: Bearer <token>"; without it, only staff
+sessions and requests from the local host may read it.
+"""
+import contextvars
+import logging
+import random
+import re
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse, HttpResponseForbidden
+from django.urls import Resolver404, get_resolver
+
+from .middleware import HybridMiddleware
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)  # seconds
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)  # bytes
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+_IN_LIST = re.compile(r"\((?:\s*%s\s*,)+\s*%s\s*\)")
+_LOCAL_ADDRS = {"127.0.0.1", "::1"}
+_current_sample = contextvars.ContextVar("peerza_metrics_sample", default=None)
+
+
+def summary(samples):
+    """{"p50", "p95", "max"} of recent millisecond samples (the outbox and view cache stats); None when empty."""
+    if not samples:
+        return {"p50": None, "p95": None, "max": None}
+    ordered = sorted(samples)
+    return {
+        "p50": round(statistics.median(ordered), 3),
+        "p95": round(ordered[max(int(len(ordered) * 0.95) - 1, 0)], 3),
+        "max": round(ordered[-1], 3),
+    }
+
+
+def shape(sql):
+    """`sql` with IN (%s, %s, ...) lists collapsed, so batches of any size look alike."""
+    return _IN_LIST.sub("(...)", sql)
+
+
+# =============================================================
+# REGISTRY
+# =============================================================
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, n in zip(self.buckets, self.counts):
+            cumulative += n
+            yield f'{name}_bucket{{{labels},le="{bound:g}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f"{name}_sum{{{labels}}} {self.sum:.6f}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+
+class ViewStats:
+    def __init__(self):
+        self.requests = Counter()  # (method, status) -> count
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.size = Histogram(SIZE_BUCKETS)
+        self.sampled = 0
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.render_seconds = 0.0
+        self.n_plus_one = 0
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = defaultdict(ViewStats)
+        self._reported = set()  # (view, shape) already logged
+
+    def record(self, view, method, status, seconds, size, sample=None):
+        repeated = sample.repeated() if sample is not None else None
+        with self.lock:
+            stats = self.views[view]
+            stats.requests[(method, status)] += 1
+            stats.latency.observe(seconds)
+            stats.size.observe(size)
+            if sample is not None:
+                stats.sampled += 1
+                stats.db_queries += sample.queries
+                stats.db_seconds += sample.db_seconds
+                stats.serialize_seconds += sample.serialize_seconds
+                stats.render_seconds += sample.render_seconds
+            if repeated is not None:
+                stats.n_plus_one += 1
+                if (view, repeated[0]) in self._reported:
+                    repeated = None
+                else:
+                    self._reported.add((view, repeated[0]))
+        if repeated is not None:
+            logger.warning("Possible N+1 in %s: %d× %s", view, repeated[1], repeated[0])
+
+    def export(self):
+        out = []
+
+        def family(name, kind, help_text):
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+
+        with self.lock:
+            views = sorted(self.views.items())
+            family("peerza_http_requests_total", "counter", "Requests by view, method and status.")
+            for view, s in views:
+                for (method, status), n in sorted(s.requests.items()):
+                    labels = f'view="{view}",method="{method}",status="{status}"'
+                    out.append(f"peerza_http_requests_total{{{labels}}} {n}")
+            family("peerza_http_request_duration_seconds", "histogram", "Time spent in the middleware stack.")
+            for view, s in views:
+                out.extend(s.latency.lines("peerza_http_request_duration_seconds", f'view="{view}"'))
+            family("peerza_http_response_size_bytes", "histogram", "Response body size as sent.")
+            for view, s in views:
+                out.extend(s.size.lines("peerza_http_response_size_bytes", f'view="{view}"'))
+            for name, attr, kind, help_text in (
+                ("peerza_sampled_requests_total", "sampled", "counter", "Requests with DB, serialize and render timing."),
+                ("peerza_db_queries_total", "db_queries", "counter", "Queries run by sampled requests."),
+                ("peerza_db_query_seconds_total", "db_seconds", "counter", "Query time of sampled requests."),
+                ("peerza_serialize_seconds_total", "serialize_seconds", "counter",
+                 "Time sampled requests spent building response data in users.fastserializers."),
+                ("peerza_render_seconds_total", "render_seconds", "counter",
+                 "Time sampled requests spent in the DRF renderer (data to bytes)."),
+                ("peerza_n_plus_one_total", "n_plus_one", "counter",
+                 "Sampled requests repeating one SQL shape more than the threshold."),
+            ):
+                family(name, kind, help_text)
+                for view, s in views:
+                    value = getattr(s, attr)
+                    out.append(f'{name}{{view="{view}"}} {value:.6f}' if isinstance(value, float)
+                               else f'{name}{{view="{view}"}} {value}')
+        return "\n".join(out) + "\n"
+
+    def reset(self):
+        with self.lock:
+            self.views.clear()
+            self._reported.clear()
+
+
+registry = Registry()
+
+
+# =============================================================
+# MIDDLEWARE
+# =============================================================
+
+class Sample:
+    """DB, serialize and render timing of one sampled request (installed as a connection.execute_wrapper)."""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.render_seconds = 0.0
+        self.render_started = None
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - started
+            self.queries += 1
+            self.shapes[sql] += 1
+
+    def repeated(self):
+        """(shape, count) of the most repeated SQL shape above the threshold, or None."""
+        shapes = Counter()
+        for sql, n in self.shapes.items():
+            shapes[shape(sql)] += n
+        if not shapes:
+            return None
+        sql, n = shapes.most_common(1)[0]
+        return (sql, n) if n > self.threshold else None
+
+
+@contextmanager
+def serializing():
+    """Count the enclosed block as serialize time of the current sampled request, if any."""
+    sample = _current_sample.get()
+    if sample is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        sample.serialize_seconds += time.perf_counter() - started
+
+
+def _view_name(request):
+    match = getattr(request, "resolver_match", None)
+    return (match.view_name if match is not None else None) or "unresolved"
+
+
+def _start_sample():
+    if random.random() < getattr(settings, "PEERZA_METRICS_SAMPLE_RATE", 0.1):
+        return Sample(getattr(settings, "PEERZA_METRICS_REPEAT_THRESHOLD", 10))
+    return None
+
+
+def _sync_view(request):
+    try:
+        match = get_resolver(getattr(request, "urlconf", None)).resolve(request.path_info)
+    except Resolver404:
+        return False
+    return not iscoroutinefunction(match.func)
+
+
+def _size(response):
+    if response.streaming:
+        return 0
+    return len(response.content)
+
+
+class MetricsMiddleware(HybridMiddleware):
+    def call(self, request):
+        sample = _start_sample()
+        request._metrics_sample = sample
+        started = time.perf_counter()
+        if sample is None:
+            response = self.get_response(request)
+        else:
+            token = _current_sample.set(sample)
+            try:
+                with connection.execute_wrapper(sample):
+                    response = self.get_response(request)
+            finally:
+                _current_sample.reset(token)
+        self._record(request, response, time.perf_counter() - started, sample)
+        return response
+
+    async def __acall__(self, request):
+        # only counters and timers on the loop; sampled sync views run in a thread
+        sample = _start_sample()
+        if sample is not None and not _sync_view(request):
+            sample = None  # async views: timing only
+        request._metrics_sample = sample
+        started = time.perf_counter()
+        if sample is None:
+            response = await self.get_response(request)
+        else:
+            response = await sync_to_async(self._sampled)(request, sample)
+        self._record(request, response, time.perf_counter() - started, sample)
+        return response
+
+    def _sampled(self, request, sample):
+        token = _current_sample.set(sample)
+        try:
+            with connection.execute_wrapper(sample):
+                return async_to_sync(self.get_response)(request)
+        finally:
+            _current_sample.reset(token)
+
+    def process_template_response(self, request, response):
+        # runs right before DRF renders the Response; the callback runs right after
+        sample = getattr(request, "_metrics_sample", None)
+        if sample is not None:
+            sample.render_started = time.perf_counter()
+
+            def rendered(response):
+                sample.render_seconds += time.perf_counter() - sample.render_started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def _record(self, request, response, seconds, sample):
+        view = _view_name(request)
+        if view == "metrics":
+            return
+        registry.record(view, request.method, response.status_code, seconds, _size(response), sample)
+
+
+def metrics_view(request):
+    token = getattr(settings, "PEERZA_METRICS_TOKEN", None)
+    if token:
+        if request.headers.get("Authorization") != f"Bearer {token}":
+            return HttpResponse(status=401)
+    elif request.META.get("REMOTE_ADDR") not in _LOCAL_ADDRS and not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.export(), content_type=CONTENT_TYPE)
@@ -0,0 +1,32 @@
+"""
+Base class for the users middlewares (metrics, compression, presence).
+
+Under ASGI Django keeps the chain async only while every middleware is
+async_capable; one sync-only middleware pins each request, including the
+async views behind it (signaling.call_wait, a long poll), to a thread. A
+HybridMiddleware runs in both stacks: call(request) serves WSGI and
+__acall__(request) ASGI. Subclasses must not block the event loop in
+__acall__ - database work goes through sync_to_async.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+
+class HybridMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.call(request)
+
+    def call(self, request):
+        raise NotImplementedError
+
+    async def __acall__(self, request):
+        raise NotImplementedError
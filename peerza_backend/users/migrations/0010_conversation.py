@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:58
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_conversations(apps, schema_editor):
+    Message = apps.get_model('users', 'Message')
+    Friendship = apps.get_model('users', 'Friendship')
+    Conversation = apps.get_model('users', 'Conversation')
+
+    rows = {}
+    for msg in Message.objects.order_by('id').iterator():
+        if msg.sender_id == msg.receiver_id:
+            continue
+        for owner_id, peer_id in ((msg.sender_id, msg.receiver_id), (msg.receiver_id, msg.sender_id)):
+            row = rows.setdefault((owner_id, peer_id), {'unread_count': 0})
+            row['last_message_id'] = msg.id
+            row['last_activity'] = msg.timestamp
+        if not msg.is_read:
+            rows[(msg.receiver_id, msg.sender_id)]['unread_count'] += 1
+
+    for f in Friendship.objects.all():
+        rows.setdefault((f.user_id, f.friend_id), {'unread_count': 0, 'last_activity': f.created_at})
+
+    Conversation.objects.bulk_create(
+        [Conversation(owner_id=o, peer_id=p, **row) for (o, p), row in rows.items()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_availability_meeting_availability'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('last_activity', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='users.message')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversations', to=settings.AUTH_USER_MODEL)),
+                ('peer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', '-last_activity', '-id'], name='conversation_inbox_idx')],
+                'unique_together': {('owner', 'peer')},
+            },
+        ),
+        migrations.RunPython(backfill_conversations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def _trigrams(text):
+    # Frozen copy of users.search.trigrams
+    grams = set()
+    for word in (text or "").lower().split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def build_search_index(apps, schema_editor):
+    Skill = apps.get_model('users', 'Skill')
+    SkillTrigram = apps.get_model('users', 'SkillTrigram')
+    UserSkill = apps.get_model('users', 'UserSkill')
+
+    counts = {}
+    for skill_id in UserSkill.objects.filter(skill_type='TEACH').values_list('skill_id', flat=True):
+        counts[skill_id] = counts.get(skill_id, 0) + 1
+
+    postings = []
+    for skill in Skill.objects.all():
+        if counts.get(skill.id):
+            Skill.objects.filter(id=skill.id).update(teacher_count=counts[skill.id])
+        postings.extend(SkillTrigram(skill_id=skill.id, trigram=g) for g in _trigrams(skill.name))
+    SkillTrigram.objects.bulk_create(postings, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0011_message_thread_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SkillTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='skill',
+            name='teacher_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='userskill',
+            index=models.Index(fields=['skill', 'skill_type', 'id'], name='userskill_search_idx'),
+        ),
+        migrations.AddField(
+            model_name='skilltrigram',
+            name='skill',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigrams', to='users.skill'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='skilltrigram',
+            unique_together={('trigram', 'skill')},
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
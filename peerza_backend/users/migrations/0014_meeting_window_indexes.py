@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0013_swapmatch'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='meeting',
+            index=models.Index(fields=['host', 'status', 'start_datetime'], name='meeting_host_window_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='meeting',
+            index=models.Index(fields=['guest', 'status', 'start_datetime'], name='meeting_guest_window_idx'),
+        ),
+    ]
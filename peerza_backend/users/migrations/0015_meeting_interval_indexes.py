@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0014_meeting_window_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='meeting',
+            name='meeting_host_window_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='meeting',
+            name='meeting_guest_window_idx',
+        ),
+        migrations.AddIndex(
+            model_name='meeting',
+            index=models.Index(fields=['host', 'status', 'start_datetime', 'end_datetime'], name='meeting_host_interval_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='meeting',
+            index=models.Index(fields=['guest', 'status', 'start_datetime', 'end_datetime'], name='meeting_guest_interval_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:38
+
+from django.db import migrations, models
+from django.db.models import Max, Min
+
+
+def backfill_watermarks(apps, schema_editor):
+    # Watermark = just below the oldest unread message from the peer, or the
+    # newest message from the peer when everything has been read.
+    Message = apps.get_model('users', 'Message')
+    Conversation = apps.get_model('users', 'Conversation')
+
+    marks = {
+        (r['receiver_id'], r['sender_id']): r['top']
+        for r in Message.objects.values('sender_id', 'receiver_id').annotate(top=Max('id'))
+    }
+    for r in Message.objects.filter(is_read=False).values('sender_id', 'receiver_id').annotate(first=Min('id')):
+        marks[(r['receiver_id'], r['sender_id'])] = r['first'] - 1
+
+    for (owner_id, peer_id), mark in marks.items():
+        Conversation.objects.filter(owner_id=owner_id, peer_id=peer_id).update(last_read_id=mark)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0016_call_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='last_read_id',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_watermarks, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='message',
+            name='is_read',
+        ),
+    ]
@@ -1,3 +1,4 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
@@ -23,11 +24,24 @@ class User(AbstractUser):
 # 2. SKILL
 class Skill(models.Model):
     name = models.CharField(max_length=100, unique=True)
+    teacher_count = models.PositiveIntegerField(default=0)  # TEACH UserSkills, kept by search.connect()
 
     def __str__(self):
         return self.name
 
 
+# 2b. SKILL TRIGRAM (search postings, see users/search.py)
+class SkillTrigram(models.Model):
+    skill = models.ForeignKey(Skill, on_delete=models.CASCADE, related_name="trigrams")
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        unique_together = ("trigram", "skill")
+
+    def __str__(self):
+        return f"{self.trigram!r} → {self.skill.name}"
+
+
 # 3. USER-SKILL
 class UserSkill(models.Model):
     SKILL_TYPES = (
@@ -40,16 +54,43 @@ class UserSkill(models.Model):
     proficiency = models.CharField(max_length=50, default="Beginner")
     skill_type = models.CharField(max_length=10, choices=SKILL_TYPES)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["skill", "skill_type", "id"], name="userskill_search_idx"),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.skill.name} ({self.skill_type})"
 
 
+# 3b. SWAP MATCH (precomputed top-K reciprocal TEACH/LEARN partners, see users/matchmaking.py)
+class SwapMatch(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="swap_matches")
+    partner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    score = models.FloatField()
+    gives = models.PositiveSmallIntegerField(default=0)  # skills user teaches that partner wants
+    takes = models.PositiveSmallIntegerField(default=0)  # skills partner teaches that user wants
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("user", "partner")
+        indexes = [
+            models.Index(fields=["user", "-score"], name="swapmatch_topk_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} ⇄ {self.partner.username} ({self.score:.1f})"
+
+
 # 4. CALL MODEL
 class Call(models.Model):
     caller = models.ForeignKey(User, related_name='calls_made', on_delete=models.CASCADE)
     receiver = models.ForeignKey(User, related_name='calls_received', on_delete=models.CASCADE)
     is_active = models.BooleanField(default=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Written when a call ends (users/signaling.py): created_at is when it
+    # started ringing, ended_at when it was ended or expired.
+    created_at = models.DateTimeField(default=timezone.now)
+    ended_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.caller.username} calling {self.receiver.username}"
@@ -61,14 +102,57 @@ class Message(models.Model):
     receiver = models.ForeignKey(User, related_name='received_messages', on_delete=models.CASCADE)
     content = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
-    is_read = models.BooleanField(default=False)
+    # Read state is the receiver's Conversation.last_read_id watermark;
+    # MessageSerializer.is_read is derived from it.
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            models.Index(fields=['sender', 'receiver', 'id'], name='message_thread_idx'),
+        ]
 
     def __str__(self):
         return f"Msg from {self.sender.username} to {self.receiver.username}"
 
+# 5b. CONVERSATION SUMMARY (one row per side of a chat, maintained on send/read)
+# last_read_id: the owner has read every message from peer with id <= it.
+class Conversation(models.Model):
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="conversations")
+    peer = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    last_message = models.ForeignKey(Message, null=True, blank=True, on_delete=models.SET_NULL, related_name="+")
+    unread_count = models.PositiveIntegerField(default=0)
+    last_read_id = models.PositiveBigIntegerField(default=0)
+    last_activity = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ("owner", "peer")
+        indexes = [
+            models.Index(fields=["owner", "-last_activity", "-id"], name="conversation_inbox_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.owner.username} → {self.peer.username} ({self.unread_count} unread)"
+
+
+# 5c. MESSAGE SEGMENT (cold storage: zlib-packed runs of old messages, see users/message_archive.py)
+# user_lo < user_hi; a pair's segments hold its oldest messages, ids first_id..last_id.
+class MessageSegment(models.Model):
+    user_lo = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    user_hi = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    first_id = models.PositiveBigIntegerField()
+    last_id = models.PositiveBigIntegerField()
+    count = models.PositiveIntegerField()
+    data = models.BinaryField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user_lo", "user_hi", "last_id"], name="segment_thread_idx"),
+        ]
+
+    def __str__(self):
+        return f"Segment {self.user_lo_id}/{self.user_hi_id} #{self.first_id}-{self.last_id} ({self.count})"
+
 # 6. AVAILABILITY (per-user weekly slots)
 class Availability(models.Model):
     DAY_CHOICES = [
@@ -110,6 +194,12 @@ class Meeting(models.Model):
     jitsi_room = models.CharField(max_length=255, blank=True, null=True)
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["host", "status", "start_datetime", "end_datetime"], name="meeting_host_interval_idx"),
+            models.Index(fields=["guest", "status", "start_datetime", "end_datetime"], name="meeting_guest_interval_idx"),
+        ]
+
     def __str__(self):
         return f"Meeting: {self.topic} ({self.status})"
 
@@ -162,3 +252,38 @@ class Friendship(models.Model):
 
     def __str__(self):
         return f"{self.user.username} ↔ {self.friend.username}"
+
+
+# 10. CHANGE LOG (per-user feed behind sync/, written by users/changes.py)
+class ChangeLog(models.Model):
+    # No FK constraint: rows are written from post_delete handlers, possibly
+    # while the user themselves is being deleted.
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+")
+    kind = models.CharField(max_length=20)
+    object_id = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "id"], name="changelog_feed_idx"),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.kind} {self.object_id} for user {self.user_id}"
+
+
+# 11. ARCHIVE (rows moved out of hot tables by users/retention.py)
+class ArchivedRecord(models.Model):
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+")
+    kind = models.CharField(max_length=20)
+    object_id = models.PositiveBigIntegerField()
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["kind", "user"], name="archive_owner_idx"),
+        ]
+
+    def __str__(self):
+        return f"Archived {self.kind} {self.object_id}"
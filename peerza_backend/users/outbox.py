@@ -0,0 +1,267 @@
+"""
+Notification outbox.
+
+Views call notify(user, actor, type, data) instead of inserting a
+Notification themselves. The intent is queued once the view's transaction
+commits, and a flush later:
+
+  - drops intents identical (user, actor, type, data) to one already
+    delivered within COALESCE_WINDOW seconds, so repeated clicks on
+    "add friend" do not flood the recipient;
+  - bulk-inserts the rest in one statement, logs them in the sync/ change
+    feed and pushes each to its recipient's event stream.
+
+settings.PEERZA_NOTIFICATION_OUTBOX picks the implementation (dotted path):
+BackgroundOutbox flushes from a daemon thread every FLUSH_INTERVAL seconds
+(or sooner once BATCH_SIZE intents are waiting), so request handlers only
+pay for an append; InlineOutbox flushes right after commit in the calling
+thread, which is what the test suite uses. Both keep OutboxMetrics (queue
+depth, flush latency), exposed at GET notifications/outbox/ for staff.
+Like the event broker, the queue is per process; intents still queued
+when the process exits are flushed by an atexit hook.
+
+A batch whose delivery fails is logged and goes back to the front of the
+queue (and stops suppressing its duplicates) for the next flush; intents
+that failed MAX_ATTEMPTS times are dropped. flush() never raises for a
+failed delivery: InlineOutbox runs it from an on_commit callback, after the
+request's own work has committed. BackgroundOutbox backs off exponentially
+between failing flushes.
+"""
+import atexit
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections, transaction
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import changes, events
+from .metrics import summary
+from .models import Notification
+from .serializers import NotificationSerializer
+
+DEFAULT_OUTBOX = "users.outbox.BackgroundOutbox"
+FLUSH_INTERVAL = 0.25  # seconds
+BATCH_SIZE = 500
+COALESCE_WINDOW = 60   # seconds
+MAX_ATTEMPTS = 3       # deliveries tried per intent before it is dropped
+MAX_BACKOFF = 30       # seconds between flushes while they keep failing
+
+logger = logging.getLogger(__name__)
+
+
+class Intent:
+    __slots__ = ("user_id", "actor", "type", "data", "queued_at", "attempts")
+
+    def __init__(self, user_id, actor, type, data):
+        self.user_id = user_id
+        self.actor = actor
+        self.type = type
+        self.data = data or {}
+        self.queued_at = time.monotonic()
+        self.attempts = 0
+
+    def key(self):
+        actor_id = self.actor.id if self.actor is not None else None
+        return self.user_id, actor_id, self.type, json.dumps(self.data, sort_keys=True, default=str)
+
+
+class OutboxMetrics:
+    def __init__(self, keep=256):
+        self.enqueued = 0
+        self.inserted = 0
+        self.coalesced = 0
+        self.flushes = 0
+        self.failures = 0
+        self.dropped = 0
+        self.flush_ms = deque(maxlen=keep)  # recent flush durations
+        self.wait_ms = deque(maxlen=keep)   # recent enqueue -> insert delays
+
+    def snapshot(self, depth):
+        return {
+            "queue_depth": depth,
+            "enqueued": self.enqueued,
+            "inserted": self.inserted,
+            "coalesced": self.coalesced,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "dropped": self.dropped,
+            "flush_ms": summary(self.flush_ms),
+            "delivery_delay_ms": summary(self.wait_ms),
+        }
+
+
+# =============================================================
+# OUTBOXES
+# =============================================================
+
+class InlineOutbox:
+    """Queues on commit and flushes immediately, in the committing thread."""
+
+    def __init__(self, window=COALESCE_WINDOW, batch_size=BATCH_SIZE):
+        self.window = window
+        self.batch_size = batch_size
+        self.metrics = OutboxMetrics()
+        self._queue = deque()
+        self._recent = {}  # intent key -> monotonic time it stops suppressing duplicates
+        self._flush_lock = threading.Lock()
+
+    def enqueue(self, intent):
+        transaction.on_commit(lambda: self._put(intent))
+
+    def _put(self, intent):
+        self._queue.append(intent)
+        self.metrics.enqueued += 1
+        self.flush()
+
+    def depth(self):
+        return len(self._queue)
+
+    def stats(self):
+        return self.metrics.snapshot(self.depth())
+
+    def _take(self):
+        batch = []
+        while self._queue and len(batch) < self.batch_size:
+            batch.append(self._queue.popleft())
+        return batch
+
+    def _coalesce(self, batch, now):
+        self._recent = {k: until for k, until in self._recent.items() if until > now}
+        keep = []
+        for intent in batch:
+            key = intent.key()
+            if key in self._recent:
+                self.metrics.coalesced += 1
+                continue
+            self._recent[key] = now + self.window
+            keep.append(intent)
+        return keep
+
+    def flush(self):
+        """
+        Deliver everything queued so far. Returns the number of notifications
+        inserted; a failed batch is requeued and ends the flush.
+        """
+        inserted = 0
+        with self._flush_lock:
+            while self._queue:
+                batch = self._take()
+                started = time.monotonic()
+                batch = self._coalesce(batch, started)
+                if not batch:
+                    continue
+                try:
+                    inserted += self._deliver(batch)
+                except Exception:
+                    logger.exception("Notification outbox delivery of %d intents failed", len(batch))
+                    self.metrics.failures += 1
+                    self._requeue(batch)
+                    break
+                finally:
+                    self.metrics.flushes += 1
+                    self.metrics.flush_ms.append((time.monotonic() - started) * 1000)
+                done = time.monotonic()
+                self.metrics.wait_ms.extend((done - i.queued_at) * 1000 for i in batch)
+        return inserted
+
+    def _requeue(self, batch):
+        """Put a failed batch back at the front of the queue, minus intents out of attempts."""
+        retry = []
+        for intent in batch:
+            self._recent.pop(intent.key(), None)
+            intent.attempts += 1
+            if intent.attempts < MAX_ATTEMPTS:
+                retry.append(intent)
+        dropped = len(batch) - len(retry)
+        if dropped:
+            self.metrics.dropped += dropped
+            logger.error("Notification outbox dropped %d intents after %d failed deliveries", dropped, MAX_ATTEMPTS)
+        self._queue.extendleft(reversed(retry))
+
+    def _deliver(self, batch):
+        now = timezone.now()
+        with transaction.atomic():
+            notes = Notification.objects.bulk_create([
+                Notification(user_id=i.user_id, actor=i.actor, type=i.type, data=i.data, created_at=now)
+                for i in batch
+            ])
+            # bulk_create skips post_save, so log the sync/ changes here
+            changes.record_pairs("notification", [(n.user_id, n.id) for n in notes])
+        # The batch's own transaction has committed; push straight to the broker.
+        broker = events.get_broker()
+        for note in notes:
+            broker.publish(note.user_id, "notification", NotificationSerializer(note).data)
+        self.metrics.inserted += len(notes)
+        return len(notes)
+
+
+class BackgroundOutbox(InlineOutbox):
+    """Queues on commit; a daemon thread flushes every `interval` seconds or at `batch_size`."""
+
+    def __init__(self, interval=FLUSH_INTERVAL, **kwargs):
+        super().__init__(**kwargs)
+        self.interval = interval
+        self._wake = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._atexit = False
+
+    def _put(self, intent):
+        self._queue.append(intent)
+        self.metrics.enqueued += 1
+        self._ensure_worker()
+        if len(self._queue) >= self.batch_size:
+            self._wake.set()
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="notification-outbox", daemon=True)
+                self._thread.start()
+                if not self._atexit:
+                    atexit.register(self.flush)
+                    self._atexit = True
+
+    def _run(self):
+        failing = 0
+        while True:
+            self._wake.wait(min(self.interval * 2 ** failing, MAX_BACKOFF))
+            self._wake.clear()
+            if not self._queue:
+                continue
+            close_old_connections()
+            failures = self.metrics.failures
+            self.flush()
+            failing = failing + 1 if self.metrics.failures > failures else 0
+
+
+_outbox = None
+
+
+def get_outbox():
+    global _outbox
+    if _outbox is None:
+        path = getattr(settings, "PEERZA_NOTIFICATION_OUTBOX", DEFAULT_OUTBOX)
+        _outbox = import_string(path)()
+    return _outbox
+
+
+@receiver(setting_changed)
+def _reset_outbox(setting, **kwargs):
+    global _outbox
+    if setting == "PEERZA_NOTIFICATION_OUTBOX":
+        _outbox = None
+
+
+def notify(user, actor, type, data=None):
+    """Queue a notification for `user`; it is delivered after the current transaction commits."""
+    get_outbox().enqueue(Intent(user.id, actor, type, data))
@@ -0,0 +1,24 @@
+"""
+Query-parameter parsing shared by the views.
+
+Parsers raise ValueError on junk; views turn that into a 400. Date windows
+(?start=/?end=) are parsed by scheduling.parse_window.
+"""
+
+
+def limit_param(request, default=None, maximum=100):
+    """Parse ?limit=, clamped to [1, maximum]. Raises ValueError on junk."""
+    raw = request.query_params.get("limit")
+    if raw in (None, ""):
+        return default
+    return max(1, min(int(raw), maximum))
+
+
+def normalized_param(request):
+    """?shape=normalized -> True (items reference users by id, plus a "users" map). Raises ValueError on junk."""
+    raw = request.query_params.get("shape")
+    if raw in (None, "", "nested"):
+        return False
+    if raw == "normalized":
+        return True
+    raise ValueError(raw)
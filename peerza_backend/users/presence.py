@@ -0,0 +1,110 @@
+"""
+Online presence.
+
+Every authenticated API request (PresenceMiddleware), every keep-alive of an
+open /api/events/ stream and POST presence/heartbeat/ record "seen now" for
+the user in a cache (settings.PEERZA_PRESENCE_CACHE, a local-memory cache by
+default; point it at a shared backend such as Redis or Memcached when
+running several processes). The entry expires after ONLINE_WINDOW, so a key
+that is present means the user is online.
+
+User.last_active is written through at most once per
+settings.PEERZA_PRESENCE_FLUSH_INTERVAL seconds per user (guarded by an
+atomic cache.add), so busy clients do not turn every request into an
+UPDATE. last_active therefore lags real activity by up to that interval.
+
+statuses() answers "who of these N users is online" with one cache
+get_many, falling back to a single query on last_active for users the cache
+does not know (offline, or the cache was restarted); those DB reads are kept
+for IDLE_TTL so polling a list of offline peers stays off the database. A
+fresh heartbeat always wins over a cached idle value.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from .middleware import HybridMiddleware
+from .models import User
+
+ONLINE_WINDOW = 300  # seconds; same threshold as User.is_online()
+MAX_LOOKUP = 500
+IDLE_TTL = 60  # how long a last_active read from the DB is reused for offline users
+
+
+def _cache():
+    return caches[getattr(settings, "PEERZA_PRESENCE_CACHE", "default")]
+
+
+def _seen_key(user_id):
+    return f"presence:seen:{user_id}"
+
+
+def _flush_key(user_id):
+    return f"presence:flush:{user_id}"
+
+
+def _idle_key(user_id):
+    return f"presence:idle:{user_id}"
+
+
+def heartbeat(user_id, now=None):
+    """Mark `user_id` as seen. Returns True when last_active was written to the DB."""
+    now = now or timezone.now()
+    cache = _cache()
+    cache.set(_seen_key(user_id), now.timestamp(), timeout=ONLINE_WINDOW)
+
+    interval = getattr(settings, "PEERZA_PRESENCE_FLUSH_INTERVAL", 60)
+    if not cache.add(_flush_key(user_id), 1, timeout=interval):
+        return False
+    User.objects.filter(id=user_id).update(last_active=now)
+    return True
+
+
+def statuses(user_ids, now=None):
+    """{user_id: {"online": bool, "last_active": datetime}} for `user_ids` that exist."""
+    now = now or timezone.now()
+    user_ids = list(dict.fromkeys(user_ids))
+    cache = _cache()
+    cached = cache.get_many([_seen_key(uid) for uid in user_ids] + [_idle_key(uid) for uid in user_ids])
+
+    out, missing = {}, []
+    for uid in user_ids:
+        ts = cached.get(_seen_key(uid), cached.get(_idle_key(uid)))
+        if ts is None:
+            missing.append(uid)
+        else:
+            out[uid] = _state(datetime.fromtimestamp(ts, tz=dt_timezone.utc), now)
+
+    if missing:
+        idle = {}
+        for uid, when in User.objects.filter(id__in=missing).values_list("id", "last_active"):
+            out[uid] = _state(when, now)
+            idle[_idle_key(uid)] = when.timestamp()
+        cache.set_many(idle, timeout=IDLE_TTL)
+    return out
+
+
+def _state(when, now):
+    return {"online": (now - when).total_seconds() < ONLINE_WINDOW, "last_active": when}
+
+
+class PresenceMiddleware(HybridMiddleware):
+    """Heartbeat for whoever a request authenticated as (DRF sets request.user)."""
+
+    def call(self, request):
+        response = self.get_response(request)
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            heartbeat(user.id)
+        return response
+
+    async def __acall__(self, request):
+        # request.user may be lazy and heartbeat() writes: both run off the loop
+        response = await self.get_response(request)
+        user = getattr(request, "user", None)
+        if user is not None and await sync_to_async(lambda: user.is_authenticated)():
+            await sync_to_async(heartbeat)(user.id)
+        return response
@@ -0,0 +1,117 @@
+"""
+Fast renderers and parsers for the API.
+
+ORJSONRenderer / ORJSONParser are drop-in replacements for DRF's JSON
+pair: the rendered bytes are the same as JSONRenderer's (compact, UTF-8,
+U+2028/U+2029 escaped, datetimes and other non-JSON types through DRF's
+encoder), only produced by orjson. Without orjson installed, or for
+anything orjson cannot encode, they fall back to the DRF implementation.
+
+MessagePackRenderer / MessagePackParser add application/msgpack, chosen
+with `Accept: application/msgpack` (or ?format=msgpack). They need the
+optional msgpack package; ContentNegotiation leaves them out while it is
+missing, so a client that also accepts JSON gets JSON (and one that only
+accepts msgpack gets 406).
+"""
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional: the DRF implementations are used instead
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional: application/msgpack is not offered
+    msgpack = None
+
+_encoder = JSONEncoder()
+
+
+def _default(obj):
+    """Types neither library encodes like DRF (datetimes, Decimal, lazy strings, ...)."""
+    return _encoder.default(obj)
+
+
+# =============================================================
+# JSON
+# =============================================================
+
+class ORJSONRenderer(JSONRenderer):
+    """JSONRenderer output, rendered by orjson."""
+
+    options = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_default, option=self.options)
+        except TypeError:  # orjson.JSONEncodeError, e.g. ints beyond 64 bits
+            return super().render(data, accepted_media_type, renderer_context)
+        # like JSONRenderer: keep the output a valid JavaScript literal
+        if b"\xe2\x80\xa8" in ret or b"\xe2\x80\xa9" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+        return ret
+
+
+class ORJSONParser(JSONParser):
+    """JSONParser, parsed by orjson."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        encoding = (parser_context or {}).get("encoding", settings.DEFAULT_CHARSET)
+        body = stream.read()
+        try:
+            if encoding.lower().replace("_", "-") not in ("utf-8", "utf8"):
+                body = body.decode(encoding)
+            return orjson.loads(body)
+        except ValueError as exc:  # orjson.JSONDecodeError or a bad charset
+            raise ParseError(f"JSON parse error - {exc}")
+
+
+# =============================================================
+# MESSAGEPACK
+# =============================================================
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+    available = msgpack is not None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=_default, use_bin_type=True)
+
+
+class MessagePackParser(BaseParser):
+    media_type = "application/msgpack"
+    available = msgpack is not None
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.UnpackException) as exc:
+            raise ParseError(f"MessagePack parse error - {exc}")
+
+
+class ContentNegotiation(DefaultContentNegotiation):
+    """DRF's negotiation over the renderers and parsers whose library is installed."""
+
+    def select_parser(self, request, parsers):
+        return super().select_parser(request, [p for p in parsers if getattr(p, "available", True)])
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        renderers = [r for r in renderers if getattr(r, "available", True)]
+        return super().select_renderer(request, renderers, format_suffix)
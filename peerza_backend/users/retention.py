@@ -0,0 +1,184 @@
+"""
+Data retention for tables that only ever grow.
+
+Each Policy names the rows that may go (e.g. read notifications), how old
+they must be (ttl_days), how many of the newest per user survive anyway
+(keep_last) and whether they are archived into ArchivedRecord first or just
+deleted. settings.PEERZA_RETENTION overrides the defaults per policy:
+
+    PEERZA_RETENTION = {"notification": {"ttl_days": 14, "keep_last": 100}}
+
+apply() works out the ids to remove once, then deletes them in batches of
+`batch_size`, each in its own short transaction with `pause` seconds in
+between, so request handlers waiting on SQLite's write lock get through.
+Rows are removed with a plain DELETE: no signals fire, so purges are not
+pushed through sync/ (the rows are old enough for clients to drop on their
+next full load). Purging the change feed itself moves changes.horizon(), so
+clients with an older cursor are told to resync. Run it with
+`python manage.py apply_retention`.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from django.forms.models import model_to_dict
+from django.utils import timezone
+
+from . import changes
+from .models import ArchivedRecord, Call, ChangeLog, Meeting, Notification
+
+BATCH_SIZE = 500
+PAUSE = 0.05  # seconds between batches
+
+
+class Policy:
+    def __init__(self, name, model, rows, user_field, age_field="created_at",
+                 ttl_days=30, keep_last=None, action="delete"):
+        if action not in ("delete", "archive"):
+            raise ValueError(f"{name}: action must be 'delete' or 'archive'")
+        self.name = name
+        self.model = model
+        self.rows = rows  # Q for the rows this policy may remove at all
+        self.user_field = user_field
+        self.age_field = age_field
+        self.ttl_days = ttl_days
+        self.keep_last = keep_last
+        self.action = action
+
+    def expired(self, now):
+        """Queryset of the rows due for removal at `now`."""
+        qs = self.model.objects.filter(self.rows, **{f"{self.age_field}__lt": now - timedelta(days=self.ttl_days)})
+        if self.keep_last:
+            newest = (
+                self.model.objects.filter(self.rows)
+                .annotate(rank=Window(
+                    RowNumber(),
+                    partition_by=[F(self.user_field)],
+                    order_by=[F(self.age_field).desc(), F("id").desc()],
+                ))
+                .filter(rank__lte=self.keep_last)
+                .values("id")
+            )
+            qs = qs.exclude(id__in=newest)
+        return qs
+
+
+DEFAULT_POLICIES = [
+    # Call history written by users/signaling.py
+    Policy("call", Call, Q(is_active=False), "caller", ttl_days=90),
+    # Read notifications; the bell still shows the newest 50
+    Policy("notification", Notification, Q(is_read=True), "user", ttl_days=30, keep_last=50),
+    # Declined/cancelled meetings clutter the calendar scans; keep them in the archive
+    Policy("meeting", Meeting, Q(status__in=["DECLINED", "CANCELLED"]), "host", ttl_days=14, action="archive"),
+    # sync/ feed entries (about four per chat message); older cursors get a full resync
+    Policy("changelog", ChangeLog, Q(), "user", ttl_days=7),
+]
+
+
+def policies():
+    """DEFAULT_POLICIES with settings.PEERZA_RETENTION applied."""
+    overrides = getattr(settings, "PEERZA_RETENTION", {})
+    unknown = set(overrides) - {p.name for p in DEFAULT_POLICIES}
+    if unknown:
+        raise ValueError(f"PEERZA_RETENTION: unknown policies {sorted(unknown)}")
+    out = []
+    for p in DEFAULT_POLICIES:
+        options = {
+            "age_field": p.age_field, "ttl_days": p.ttl_days, "keep_last": p.keep_last, "action": p.action,
+            **overrides.get(p.name, {}),
+        }
+        out.append(Policy(p.name, p.model, p.rows, p.user_field, **options))
+    return out
+
+
+# =============================================================
+# TABLE SIZES
+# =============================================================
+
+def table_size(model):
+    """{"rows": n, "bytes": table + index bytes (SQLite with dbstat only, else None)}."""
+    size = {"rows": model.objects.count(), "bytes": None}
+    if connection.vendor == "sqlite":
+        table = model._meta.db_table
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT SUM(pgsize) FROM dbstat WHERE name IN "
+                    "(SELECT name FROM sqlite_master WHERE tbl_name = %s)", [table],
+                )
+                size["bytes"] = cursor.fetchone()[0] or 0
+        except Exception:  # SQLite built without the dbstat virtual table
+            pass
+    return size
+
+
+def format_size(size):
+    """A table_size() result as "n rows" or "n rows / k KiB"."""
+    if size["bytes"] is None:
+        return f"{size['rows']} rows"
+    return f"{size['rows']} rows / {size['bytes'] / 1024:.0f} KiB"
+
+
+def database_size():
+    """(file bytes, free bytes) of the SQLite database, or None on other backends."""
+    if connection.vendor != "sqlite":
+        return None
+    values = []
+    with connection.cursor() as cursor:
+        for pragma in ("page_size", "page_count", "freelist_count"):
+            cursor.execute(f"PRAGMA {pragma}")
+            values.append(cursor.fetchone()[0])
+    page_size, pages, free = values
+    return pages * page_size, free * page_size
+
+
+# =============================================================
+# APPLYING
+# =============================================================
+
+def _archive(policy, ids):
+    now = timezone.now()
+    return len(ArchivedRecord.objects.bulk_create([
+        ArchivedRecord(
+            user_id=getattr(obj, f"{policy.user_field}_id"), kind=policy.name, object_id=obj.id,
+            data=model_to_dict(obj), archived_at=now,
+        )
+        for obj in policy.model.objects.filter(id__in=ids)
+    ]))
+
+
+def delete_rows(model, ids):
+    """DELETE `model` rows by id with one plain statement (no signals, no cascades). Returns the row count."""
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {qn(model._meta.db_table)} WHERE {qn('id')} IN ({', '.join(['%s'] * len(ids))})", ids
+        )
+        return cursor.rowcount
+
+
+def apply(policy, now=None, batch_size=BATCH_SIZE, pause=PAUSE, dry_run=False):
+    """Remove `policy`'s expired rows. Returns {"policy", "expired", "removed", "archived", "batches", "before", "after"}."""
+    now = now or timezone.now()
+    report = {"policy": policy.name, "action": policy.action, "before": table_size(policy.model)}
+    ids = list(policy.expired(now).order_by("id").values_list("id", flat=True))
+    report.update(expired=len(ids), removed=0, archived=0, batches=0)
+
+    if not dry_run:
+        for start in range(0, len(ids), batch_size):
+            chunk = ids[start:start + batch_size]
+            with transaction.atomic():
+                if policy.action == "archive":
+                    report["archived"] += _archive(policy, chunk)
+                report["removed"] += delete_rows(policy.model, chunk)
+            report["batches"] += 1
+            if pause and start + batch_size < len(ids):
+                time.sleep(pause)
+        if report["removed"] and policy.model is ChangeLog:
+            changes.forget_horizon()
+
+    report["after"] = table_size(policy.model)
+    return report
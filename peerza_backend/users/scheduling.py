@@ -0,0 +1,161 @@
+"""
+Interval helpers for availability and bookings.
+
+Weekly Availability rows are expanded into concrete dated intervals for a
+requested window, busy time comes from Meeting rows overlapping that window
+only, and overlaps are resolved with a single sweep over sorted intervals.
+Nothing here scales with a user's all-time meeting history.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Availability, Meeting
+
+WEEKDAYS = ["MONDAY", "TUESDAY", "WEDNESDAY", "THURSDAY", "FRIDAY", "SATURDAY", "SUNDAY"]
+
+# Meetings are looked up by start time; anything longer than this that began
+# before the window would be missed, which keeps the range scan bounded.
+MAX_MEETING_LENGTH = timedelta(days=1)
+MAX_WINDOW_DAYS = 92
+
+BUSY_STATUSES = ("ACCEPTED",)
+HELD_STATUSES = ("ACCEPTED", "PENDING")  # time nobody else should be offered
+
+
+def parse_window(start_param, end_param, default_days=7):
+    """
+    (start_date, end_date) from ?start=/?end= (YYYY-MM-DD, end inclusive).
+    Defaults to the next `default_days` days; raises ValueError when invalid.
+    """
+    today = timezone.localdate()
+    start = datetime.strptime(start_param, "%Y-%m-%d").date() if start_param else today
+    end = (datetime.strptime(end_param, "%Y-%m-%d").date() if end_param
+           else start + timedelta(days=default_days - 1))
+    if end < start or (end - start).days >= MAX_WINDOW_DAYS:
+        raise ValueError(f"window must be 1-{MAX_WINDOW_DAYS} days")
+    return start, end
+
+
+def window_bounds(start_date, end_date):
+    tz = timezone.get_current_timezone()
+    lo = timezone.make_aware(datetime.combine(start_date, datetime.min.time()), tz)
+    hi = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), datetime.min.time()), tz)
+    return lo, hi
+
+
+def expand_weekly(slots, start_date, end_date):
+    """[(start, end, slot)] concrete occurrences of weekly slots, sorted by start."""
+    tz = timezone.get_current_timezone()
+    by_day = defaultdict(list)
+    for slot in slots:
+        by_day[slot.day_of_week.upper()].append(slot)
+
+    out = []
+    day = start_date
+    while day <= end_date:
+        for slot in by_day.get(WEEKDAYS[day.weekday()], ()):
+            start = timezone.make_aware(datetime.combine(day, slot.start_time), tz)
+            end = timezone.make_aware(datetime.combine(day, slot.end_time), tz)
+            if end > start:
+                out.append((start, end, slot))
+        day += timedelta(days=1)
+    out.sort(key=lambda occ: occ[0])
+    return out
+
+
+def merge(intervals):
+    """Union of (start, end) intervals as a sorted, disjoint list."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(s, e) for s, e in merged]
+
+
+def busy_intervals(user_ids, lo, hi, statuses=BUSY_STATUSES):
+    """Merged meeting intervals of any of `user_ids` overlapping [lo, hi)."""
+    rows = Meeting.objects.filter(
+        Q(host_id__in=user_ids) | Q(guest_id__in=user_ids),
+        status__in=statuses,
+        start_datetime__gte=lo - MAX_MEETING_LENGTH,
+        start_datetime__lt=hi,
+        end_datetime__gt=lo,
+    ).values_list("start_datetime", "end_datetime")
+    return merge(rows)
+
+
+def mark_booked(occurrences, busy):
+    """
+    Single sweep: `occurrences` sorted by start, `busy` sorted and disjoint.
+    Yields (start, end, slot, is_booked).
+    """
+    i = 0
+    for start, end, slot in occurrences:
+        while i < len(busy) and busy[i][1] <= start:
+            i += 1
+        yield start, end, slot, i < len(busy) and busy[i][0] < end
+
+
+def dated_slots(user_id, start_date, end_date):
+    """The user's weekly availability over the window with booked/free state."""
+    lo, hi = window_bounds(start_date, end_date)
+    occurrences = expand_weekly(Availability.objects.filter(user_id=user_id), start_date, end_date)
+    busy = busy_intervals([user_id], lo, hi)
+    return list(mark_booked(occurrences, busy))
+
+
+def intersect(a, b):
+    """Intersection of two sorted, disjoint interval lists (linear merge)."""
+    out, i, j = [], 0, 0
+    while i < len(a) and j < len(b):
+        start, end = max(a[i][0], b[j][0]), min(a[i][1], b[j][1])
+        if start < end:
+            out.append((start, end))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return out
+
+
+def subtract(free, busy):
+    """`free` minus `busy`; both sorted and disjoint (linear sweep)."""
+    out, j = [], 0
+    for start, end in free:
+        while j < len(busy) and busy[j][1] <= start:
+            j += 1
+        k = j
+        while k < len(busy) and busy[k][0] < end:
+            if busy[k][0] > start:
+                out.append((start, busy[k][0]))
+            start = max(start, busy[k][1])
+            k += 1
+        if start < end:
+            out.append((start, end))
+    return out
+
+
+def common_free(user_a, user_b, start_date, end_date, min_length=timedelta(minutes=30)):
+    """
+    Windows where both users are available and neither has an ACCEPTED or
+    PENDING meeting, longest first (earliest breaks ties).
+    """
+    lo, hi = window_bounds(start_date, end_date)
+    slots = defaultdict(list)
+    for slot in Availability.objects.filter(user_id__in=[user_a, user_b]):
+        slots[slot.user_id].append(slot)
+
+    def free(user_id):
+        return merge((s, e) for s, e, _ in expand_weekly(slots[user_id], start_date, end_date))
+
+    both = intersect(free(user_a), free(user_b))
+    windows = subtract(both, busy_intervals([user_a, user_b], lo, hi, statuses=HELD_STATUSES))
+    windows = [(s, e) for s, e in windows if e - s >= min_length]
+    windows.sort(key=lambda w: (-(w[1] - w[0]), w[0]))
+    return windows
@@ -0,0 +1,214 @@
+"""
+Skill search backed by trigram postings.
+
+Every Skill name is broken into padded trigrams ("  py", " py", "pyt", ...)
+stored in SkillTrigram. A query is matched against the postings, candidates are
+ranked in Python (exact > prefix > word prefix > substring > fuzzy trigram
+similarity), and the teachers for the ranked skills are paged straight off
+the (skill, skill_type, id) index using the maintained Skill.teacher_count,
+so the cost depends on the page size rather than on the number of UserSkill
+rows.
+
+Candidates come from two lookups:
+  - substring matches: skills holding every trigram inside the query's
+    words, checked for real containment, never capped (too short a query
+    has none of those trigrams and falls back to icontains);
+  - fuzzy matches: the MAX_CANDIDATES skills sharing the most trigrams.
+
+Postings are written when my_skills creates a new Skill. Teacher counts
+follow UserSkill post_save/post_delete (connect()), so cascades and admin
+edits keep them right too; recount_teachers() repairs them after bulk writes.
+"""
+from functools import lru_cache
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from .models import Skill, SkillTrigram, UserSkill
+
+MAX_CANDIDATES = 200
+SIMILARITY_THRESHOLD = 0.25
+
+
+def normalize(text):
+    return " ".join((text or "").lower().split())
+
+
+def trigrams(text):
+    grams = set()
+    for word in normalize(text).split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def inner_trigrams(text):
+    """Trigrams inside the words of `text` (no padding): present in every name containing it."""
+    return {word[i:i + 3] for word in normalize(text).split() for i in range(len(word) - 2)}
+
+
+# -------------------------------------------------------------
+# Index maintenance
+# -------------------------------------------------------------
+
+def index_skill(skill):
+    SkillTrigram.objects.filter(skill=skill).delete()
+    SkillTrigram.objects.bulk_create(
+        [SkillTrigram(skill=skill, trigram=g) for g in trigrams(skill.name)]
+    )
+
+
+def teacher_added(skill_id):
+    Skill.objects.filter(id=skill_id).update(teacher_count=F("teacher_count") + 1)
+
+
+def teacher_removed(skill_id):
+    Skill.objects.filter(id=skill_id, teacher_count__gt=0).update(
+        teacher_count=F("teacher_count") - 1
+    )
+
+
+def recount_teachers(skill_ids=None):
+    """Recompute teacher_count from the UserSkill rows (all skills without `skill_ids`)."""
+    teachers = (
+        UserSkill.objects.filter(skill=OuterRef("pk"), skill_type="TEACH")
+        .order_by().values("skill").annotate(n=Count("id")).values("n")
+    )
+    skills = Skill.objects.all() if skill_ids is None else Skill.objects.filter(id__in=skill_ids)
+    skills.update(teacher_count=Coalesce(Subquery(teachers), 0))
+
+
+def _before_user_skill_save(sender, instance, raw=False, **kwargs):
+    # an edit may move the row to another skill or type: remember where it was
+    instance._previous_teach = None
+    if not raw and not instance._state.adding:
+        instance._previous_teach = (
+            UserSkill.objects.filter(pk=instance.pk).values_list("skill_id", "skill_type").first()
+        )
+
+
+def _on_user_skill_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        if instance.skill_type == "TEACH":
+            teacher_added(instance.skill_id)
+        return
+    previous = getattr(instance, "_previous_teach", None)
+    if previous is not None and previous != (instance.skill_id, instance.skill_type):
+        recount_teachers({previous[0], instance.skill_id})
+
+
+def _on_user_skill_deleted(sender, instance, **kwargs):
+    if instance.skill_type == "TEACH":
+        teacher_removed(instance.skill_id)
+
+
+def connect():
+    pre_save.connect(_before_user_skill_save, sender=UserSkill, dispatch_uid="search-teachers-pre-save")
+    post_save.connect(_on_user_skill_saved, sender=UserSkill, dispatch_uid="search-teachers-save")
+    post_delete.connect(_on_user_skill_deleted, sender=UserSkill, dispatch_uid="search-teachers-delete")
+
+
+# -------------------------------------------------------------
+# Querying
+# -------------------------------------------------------------
+
+@lru_cache(maxsize=65536)
+def _gram_count(name):
+    return len(trigrams(name))
+
+
+def _score(query, query_grams, name, shared):
+    name = normalize(name)
+    if name == query:
+        return 4.0
+    if name.startswith(query):
+        return 3.0 + len(query) / len(name)
+    if any(word.startswith(query) for word in name.split()):
+        return 2.5
+    if query in name:
+        return 2.0
+    similarity = shared / (len(query_grams) + _gram_count(name) - shared)
+    return similarity if similarity >= SIMILARITY_THRESHOLD else 0.0
+
+
+def _containing(query):
+    """(skill_id, name, teacher_count) of every taught skill whose name contains `query`."""
+    inner = inner_trigrams(query)
+    if not inner:
+        rows = Skill.objects.filter(name__icontains=query, teacher_count__gt=0).values_list(
+            "id", "name", "teacher_count"
+        )
+    else:
+        rows = (
+            SkillTrigram.objects.filter(trigram__in=inner, skill__teacher_count__gt=0)
+            .values("skill_id", "skill__name", "skill__teacher_count")
+            .annotate(shared=Count("id"))
+            .filter(shared=len(inner))
+            .values_list("skill_id", "skill__name", "skill__teacher_count")
+        )
+    return [row for row in rows if query in normalize(row[1])]
+
+
+def rank_skills(query):
+    """[(skill_id, teacher_count)] for skills matching `query`, best first."""
+    query = normalize(query)
+    grams = trigrams(query)
+    if not grams:
+        return []
+
+    candidates = (
+        SkillTrigram.objects.filter(trigram__in=grams, skill__teacher_count__gt=0)
+        .values("skill_id", "skill__name", "skill__teacher_count")
+        .annotate(shared=Count("id"))
+        .order_by("-shared")
+        .values_list("skill_id", "skill__name", "skill__teacher_count", "shared")[:MAX_CANDIDATES]
+    )
+
+    ranked, seen = [], set()
+    for skill_id, name, teacher_count, shared in candidates:
+        seen.add(skill_id)
+        score = _score(query, grams, name, shared)
+        if score:
+            ranked.append((score, teacher_count, name, skill_id))
+    for skill_id, name, teacher_count in _containing(query):
+        if skill_id not in seen:  # beyond the fuzzy cap; containment scores >= 2 without `shared`
+            ranked.append((_score(query, grams, name, 0), teacher_count, name, skill_id))
+    ranked.sort(key=lambda r: (-r[0], -r[1], r[2]))
+    return [(skill_id, count) for _, count, _, skill_id in ranked]
+
+
+def search_teachers(query, exclude_user, offset=0, limit=20, columns=None):
+    """
+    A page of TEACH UserSkills for `query`, ordered by skill rank then id.
+    With `columns`, .values_list(*columns) tuples instead of instances.
+    """
+    ranked = rank_skills(query)
+    if not ranked:
+        return []
+
+    # Only needed to skip whole skills on later pages (our own rows are excluded).
+    own = set()
+    if offset:
+        own = set(
+            UserSkill.objects.filter(
+                user=exclude_user, skill_type="TEACH", skill_id__in=[s for s, _ in ranked]
+            ).values_list("skill_id", flat=True)
+        )
+
+    results, skip = [], offset
+    for skill_id, count in ranked:
+        available = count - (1 if skill_id in own else 0)
+        if skip >= available:
+            skip -= available
+            continue
+        take = limit - len(results)
+        qs = UserSkill.objects.filter(skill_id=skill_id, skill_type="TEACH").exclude(user=exclude_user)
+        qs = qs.values_list(*columns) if columns else qs.select_related("user", "skill")
+        results.extend(qs.order_by("id")[skip:skip + take])
+        skip = 0
+        if len(results) >= limit:
+            break
+    return results
@@ -1,5 +1,8 @@
 from rest_framework import serializers
-from .models import User, Skill, UserSkill, Meeting, Notification, Message, FriendRequest, Friendship
+from .models import (
+    User, Skill, UserSkill, Meeting, Notification, Message, Conversation, FriendRequest, Friendship,
+)
+from .inbox import read_marks
 
 
 # 1. Skill Serializer
@@ -16,10 +19,38 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'bio', 'is_pro', 'avatar']
 
 
+# 2b. A related user: nested in full, or by id for ?shape=normalized
+class UserRefField(serializers.Field):
+    """
+    UserSerializer data by default. When the context carries a "users" dict
+    (see normalize()), only the id is emitted and the user is added to that
+    dict once, however many rows reference it.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, user):
+        users = self.context.get("users")
+        if users is None:
+            return UserSerializer(user).data
+        if user.id not in users:
+            users[user.id] = UserSerializer(user).data
+        return user.id
+
+
+def normalize(serializer_class, instances, context=None):
+    """{"items": [...], "users": {id: user}}: list items reference users by id."""
+    users = {}
+    items = serializer_class(instances, many=True, context={**(context or {}), "users": users}).data
+    return {"items": items, "users": users}
+
+
 # 3. UserSkill Serializer
 class UserSkillSerializer(serializers.ModelSerializer):
     skill = SkillSerializer(read_only=True)
-    user = UserSerializer(read_only=True)
+    user = UserRefField()
 
     class Meta:
         model = UserSkill
@@ -69,7 +100,7 @@ class MeetingSerializer(serializers.ModelSerializer):
 
 # 6. ✅ Updated Notification Serializer
 class NotificationSerializer(serializers.ModelSerializer):
-    actor = UserSerializer(read_only=True)
+    actor = UserRefField()
 
     class Meta:
         model = Notification
@@ -78,13 +109,33 @@ class NotificationSerializer(serializers.ModelSerializer):
 
 # 7. Message Serializer
 class MessageSerializer(serializers.ModelSerializer):
-    sender = UserSerializer(read_only=True)
-    receiver = UserSerializer(read_only=True)
+    sender = UserRefField()
+    receiver = UserRefField()
+    is_read = serializers.SerializerMethodField()
 
     class Meta:
         model = Message
         fields = ["id", "sender", "receiver", "content", "timestamp", "is_read"]
 
+    def get_is_read(self, obj):
+        # Views may pass context["read_marks"] (see inbox.read_marks); missing
+        # pairs are looked up once and shared by the rest of the list.
+        marks = self.context.setdefault("read_marks", {})
+        key = (obj.receiver_id, obj.sender_id)
+        if key not in marks:
+            marks.update(read_marks([key]))
+        return obj.id <= marks[key]
+
+
+# 7b. Conversation (inbox row) Serializer
+class ConversationSerializer(serializers.ModelSerializer):
+    peer = UserSerializer(read_only=True)
+    last_message = MessageSerializer(read_only=True)
+
+    class Meta:
+        model = Conversation
+        fields = ["peer", "unread_count", "last_message"]
+
 
 # 8. Friend Request Serializer
 class FriendRequestSerializer(serializers.ModelSerializer):
@@ -0,0 +1,265 @@
+"""
+Call signaling ("who is ringing whom").
+
+Ringing state lives in memory, not in the Call/Meeting tables. call/start/
+registers a Ring for the receiver, call/end/ (either side) removes it, and
+an unanswered ring expires after RING_TTL seconds. A Call row is written
+only once the call has ended, as history.
+
+The receiver learns about a ring through the "call" push event, or with
+the long-poll GET call/wait/?version=N. That request returns as soon as the
+receiver's state differs from version N (a call arrived, was cancelled or
+expired), or after `timeout` seconds with the state unchanged. It is an
+async view, so under ASGI a waiting client holds no worker thread.
+
+The registry is chosen by settings.PEERZA_CALL_REGISTRY (dotted path), like
+the event broker. The default InProcessCallRegistry only sees rings started
+in the same process.
+"""
+import asyncio
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from django.views.decorators.http import require_GET
+
+from . import events
+from .models import Call
+
+DEFAULT_REGISTRY = "users.signaling.InProcessCallRegistry"
+RING_TTL = 45  # seconds an unanswered call keeps ringing
+WAIT_TIMEOUT = 25
+MAX_WAIT_TIMEOUT = 55
+
+
+class Ring:
+    __slots__ = ("caller_id", "receiver_id", "caller", "room", "started_at", "ended_at", "deadline")
+
+    def __init__(self, caller_id, receiver_id, caller, room, ttl):
+        self.caller_id = caller_id
+        self.receiver_id = receiver_id
+        self.caller = caller  # serialized caller, sent to the receiver as-is
+        self.room = room
+        self.started_at = timezone.now()
+        self.ended_at = None
+        self.deadline = time.monotonic() + ttl
+
+
+class _Waiter:
+    """A long-poll request parked on its own event loop."""
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+
+    def wake(self):
+        try:
+            self.loop.call_soon_threadsafe(self.event.set)
+        except RuntimeError:
+            pass  # the request's loop is already gone
+
+
+# =============================================================
+# REGISTRY
+# =============================================================
+
+class InProcessCallRegistry:
+    def __init__(self, ttl=RING_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._rings = {}                  # receiver_id -> {caller_id: Ring}
+        self._versions = defaultdict(int)  # receiver_id -> state version
+        self._waiters = defaultdict(set)   # receiver_id -> {_Waiter}
+        self._ended = []                   # expired rings not yet written as history
+
+    # --- internals (lock held) ---
+
+    def _changed(self, receiver_id):
+        self._versions[receiver_id] += 1
+        for waiter in self._waiters.pop(receiver_id, ()):
+            waiter.wake()
+
+    def _remove(self, receiver_id, caller_id):
+        rings = self._rings.get(receiver_id, {})
+        ring = rings.pop(caller_id, None)
+        if not rings:
+            self._rings.pop(receiver_id, None)
+        return ring
+
+    def _expire(self, receiver_id, now):
+        expired = [r for r in self._rings.get(receiver_id, {}).values() if r.deadline <= now]
+        for ring in expired:
+            self._remove(receiver_id, ring.caller_id)
+            ring.ended_at = ring.started_at + timedelta(seconds=self.ttl)
+            self._ended.append(ring)
+        if expired:
+            self._changed(receiver_id)
+
+    def _state(self, receiver_id):
+        self._expire(receiver_id, time.monotonic())
+        rings = self._rings.get(receiver_id)
+        state = {"version": self._versions[receiver_id], "active": bool(rings)}
+        if rings:
+            latest = max(rings.values(), key=lambda r: r.started_at)
+            state.update(caller=latest.caller, room=latest.room, started_at=latest.started_at)
+        return state
+
+    # --- API ---
+
+    def ring(self, caller_id, receiver_id, caller, room):
+        with self._lock:
+            replaced = self._remove(receiver_id, caller_id)
+            if replaced is not None:
+                replaced.ended_at = timezone.now()
+                self._ended.append(replaced)
+            self._rings.setdefault(receiver_id, {})[caller_id] = Ring(
+                caller_id, receiver_id, caller, room, self.ttl
+            )
+            self._changed(receiver_id)
+
+    def end(self, user_a, user_b):
+        """Stop rings between the two users, in either direction. Returns them."""
+        ended = []
+        with self._lock:
+            for caller_id, receiver_id in ((user_a, user_b), (user_b, user_a)):
+                ring = self._remove(receiver_id, caller_id)
+                if ring is not None:
+                    ring.ended_at = timezone.now()
+                    ended.append(ring)
+                    self._changed(receiver_id)
+        return ended
+
+    def state(self, receiver_id):
+        with self._lock:
+            return self._state(receiver_id)
+
+    async def wait(self, receiver_id, version, timeout):
+        """The receiver's state once it differs from `version`, or after `timeout`."""
+        with self._lock:
+            state = self._state(receiver_id)
+            if state["version"] != version:
+                return state
+            waiter = _Waiter()
+            self._waiters[receiver_id].add(waiter)
+            deadlines = [r.deadline for r in self._rings.get(receiver_id, {}).values()]
+
+        if deadlines:  # wake up in time to report an expiring ring
+            timeout = min(timeout, max(0.0, min(deadlines) - time.monotonic()))
+        try:
+            await asyncio.wait_for(waiter.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(receiver_id)
+                if waiters is not None:
+                    waiters.discard(waiter)
+                    if not waiters:
+                        del self._waiters[receiver_id]
+        return self.state(receiver_id)
+
+    def drain_ended(self):
+        """Expire every overdue ring and hand back all rings awaiting persistence."""
+        with self._lock:
+            now = time.monotonic()
+            for receiver_id in list(self._rings):
+                self._expire(receiver_id, now)
+            ended, self._ended = self._ended, []
+        return ended
+
+
+_registry = None
+
+
+def get_registry():
+    global _registry
+    if _registry is None:
+        path = getattr(settings, "PEERZA_CALL_REGISTRY", DEFAULT_REGISTRY)
+        _registry = import_string(path)()
+    return _registry
+
+
+@receiver(setting_changed)
+def _reset_registry(setting, **kwargs):
+    global _registry
+    if setting == "PEERZA_CALL_REGISTRY":
+        _registry = None
+
+
+# =============================================================
+# OPERATIONS (used by the views)
+# =============================================================
+
+def persist(rings):
+    Call.objects.bulk_create([
+        Call(caller_id=r.caller_id, receiver_id=r.receiver_id, is_active=False,
+             created_at=r.started_at, ended_at=r.ended_at)
+        for r in rings
+    ])
+
+
+def persist_ended():
+    persist(get_registry().drain_ended())
+
+
+def start(caller, receiver, caller_data, room):
+    get_registry().ring(caller.id, receiver.id, caller_data, room)
+    persist_ended()
+    events.publish(receiver.id, "call", {"caller": caller_data, "room": room})
+
+
+def end(user, peer):
+    ended = get_registry().end(user.id, peer.id)
+    persist(ended + get_registry().drain_ended())
+    events.publish(peer.id, "call_ended", {"peer_id": user.id})
+    return ended
+
+
+def current(user):
+    return get_registry().state(user.id)
+
+
+# =============================================================
+# LONG-POLL  (GET /api/call/wait/?version=<n>&timeout=<s>)
+# =============================================================
+
+@sync_to_async
+def _authenticate(request):
+    from rest_framework.exceptions import AuthenticationFailed
+    from rest_framework_simplejwt.exceptions import InvalidToken
+    from .authentication import CachedJWTAuthentication
+
+    try:
+        result = CachedJWTAuthentication().authenticate(request)
+    except (InvalidToken, AuthenticationFailed):
+        return None
+    return result[0] if result else None
+
+
+@require_GET
+async def call_wait(request):
+    user = await _authenticate(request)
+    if user is None or not user.is_active:
+        return JsonResponse(
+            {"detail": "Authentication credentials were not provided or are invalid."}, status=401
+        )
+    request.user = user  # lets PresenceMiddleware count the poll as activity
+
+    try:
+        version = int(request.GET.get("version", -1))
+        timeout = max(0.0, min(float(request.GET.get("timeout", WAIT_TIMEOUT)), MAX_WAIT_TIMEOUT))
+    except ValueError:
+        return JsonResponse({"detail": "Invalid version or timeout"}, status=400)
+
+    state = await get_registry().wait(user.id, version, timeout)
+    await sync_to_async(persist_ended)()
+    return JsonResponse(state, encoder=DjangoJSONEncoder)
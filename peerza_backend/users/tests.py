@@ -1,3 +1,1851 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import logging
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import date, time as dt_time, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import enterModuleContext, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Q
+from django.test import AsyncClient, Client, LiveServerTestCase, TestCase, TransactionTestCase, override_settings, tag
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from peerza_backend.asgi import application
+from . import (
+    authentication, batch, booking, changes, compression, events, inbox, matchmaking, message_archive, metrics, outbox,
+    presence, renderers, retention, scheduling, search, signaling, viewcache,
+)
+from .management.commands import bench_views, loadtest
+from .models import (
+    ArchivedRecord, Availability, Call, ChangeLog, Conversation, FriendRequest, Friendship, Meeting, Message,
+    Notification, Skill, SwapMatch, User, UserSkill,
+)
+from .serializers import (
+    MeetingSerializer, MessageSerializer, NotificationSerializer, UserSerializer, UserSkillSerializer, normalize,
+)
+
+
+def make_user(name):
+    # No password hashing: tests authenticate with force_authenticate or JWTs.
+    return User.objects.create(username=name, email=f"{name}@peerza.test")
+
+
+def access_token(user):
+    return str(RefreshToken.for_user(user).access_token)
+
+
+INLINE_OUTBOX = "users.outbox.InlineOutbox"
+
+
+def setUpModule():
+    # Flush notifications and refresh matches in the test's own thread, never from a background worker.
+    enterModuleContext(override_settings(PEERZA_NOTIFICATION_OUTBOX=INLINE_OUTBOX, PEERZA_MATCH_REFRESH="inline"))
+
+
+# =============================================================
+# Minimal in-process ASGI driver (no network, no extra deps)
+# =============================================================
+
+def _scope(path, query=""):
+    return {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": query.encode(), "root_path": "", "headers": [],
+        "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }
+
+
+async def asgi_request(app, path, token, query=""):
+    """Plain GET with a bearer token; returns (status, body)."""
+    scope = _scope(path, query)
+    scope["headers"] = [(b"authorization", f"Bearer {token}".encode()), (b"host", b"testserver")]
+    sent, done = [], asyncio.Event()
+    body = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if body:
+            return body.pop()
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+        if message["type"] == "http.response.body" and not message.get("more_body"):
+            done.set()
+
+    await app(scope, receive, send)
+    return sent[0]["status"], b"".join(m.get("body", b"") for m in sent[1:])
+
+
+async def asgi_get(app, path, token):
+    status, _ = await asgi_request(app, path, token)
+    return status
+
+
+class EventStream:
+    """Holds /api/events/ open and collects the SSE frames it receives."""
+
+    def __init__(self, app, token):
+        self.app, self.token = app, token
+        self.status, self.chunks = None, []
+        self.ready = asyncio.Event()
+        self._closed = asyncio.Event()
+
+    async def run(self):
+        async def receive():
+            await self._closed.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                self.status = message["status"]
+            else:
+                self.chunks.append(message.get("body", b""))
+                self.ready.set()
+
+        await self.app(_scope("/api/events/", f"token={self.token}"), receive, send)
+        self.ready.set()
+
+    def close(self):
+        self._closed.set()
+
+    def events(self):
+        return [c.split(b"\n", 1)[0][len(b"event: "):].decode()
+                for c in self.chunks if c.startswith(b"event: ")]
+
+
+class CountingApp:
+    def __init__(self, app):
+        self.app, self.requests = app, 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            self.requests += 1
+        await self.app(scope, receive, send)
+
+
+# =============================================================
+# PUSH CHANNEL
+# =============================================================
+
+@override_settings(PEERZA_EVENT_BROKER="users.events.RecordingBroker")
+class EventPublishTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob = make_user("alice"), make_user("bob")
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        self.enterContext(override_settings(PEERZA_NOTIFICATION_OUTBOX=INLINE_OUTBOX))  # fresh outbox
+
+        events.get_broker().published.clear()
+
+    def published_to(self, user):
+        return [e for uid, e, _ in events.get_broker().published if uid == user.id]
+
+    def test_handlers_publish_to_the_recipient(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/api/call/start/{self.bob.id}/")
+            self.client.post("/api/meetings/request/", {
+                "guest_id": self.bob.id, "start_datetime": "2030-01-01T10:00:00Z",
+            })
+            self.client.post(f"/api/chats/{self.bob.id}/send/", {"content": "hi"})
+            self.client.post(f"/api/friends/request/{self.bob.id}/")
+
+        self.assertEqual(
+            self.published_to(self.bob),
+            ["call", "notification", "meeting_request", "message", "notification"],
+        )
+        self.assertEqual(self.published_to(self.alice), [])
+
+    def test_nothing_is_published_before_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.client.post(f"/api/chats/{self.bob.id}/send/", {"content": "hi"})
+        self.assertEqual(events.get_broker().published, [])
+        for callback in callbacks:
+            callback()
+        self.assertEqual([e for _, e, _ in events.get_broker().published], ["message"])
+
+
+@override_settings(PEERZA_EVENT_BROKER="users.events.RecordingBroker", PEERZA_EVENT_HEARTBEAT=0.05)
+class EventStreamTests(TransactionTestCase):
+    def test_rejects_missing_or_bad_token(self):
+        async def scenario():
+            stream = EventStream(application, "not-a-jwt")
+            await stream.run()
+            return stream.status
+
+        self.assertEqual(async_to_sync(scenario)(), 401)
+
+    def test_stream_delivers_published_events_and_heartbeats(self):
+        alice = make_user("alice")
+        token = access_token(alice)
+
+        async def scenario():
+            stream = EventStream(application, token)
+            task = asyncio.ensure_future(stream.run())
+            await stream.ready.wait()
+            events.get_broker().publish(alice.id, "call", {"room": "r"})
+            await asyncio.sleep(0.2)
+            stream.close()
+            await task
+            return stream
+
+        stream = async_to_sync(scenario)()
+        self.assertEqual(stream.status, 200)
+        self.assertEqual(stream.events(), ["call"])
+        self.assertIn(b": ping\n\n", stream.chunks)
+        self.assertEqual(events.get_broker().subscriber_count(), 0)
+
+
+@tag("load")
+@override_settings(PEERZA_EVENT_BROKER="users.events.RecordingBroker")
+class IdleClientLoadTest(TransactionTestCase):
+    """
+    Idle dashboards, before and after push. Time is compressed by SPEEDUP so
+    one simulated minute takes a few seconds; intervals match the
+    frontend (Home.jsx: 3s calls + meetings, NotificationsBell.jsx: 8s).
+    """
+    USERS = 5
+    SPEEDUP = 30.0
+    SIMULATED_SECONDS = 60
+
+    def setUp(self):
+        self.tokens = [access_token(make_user(f"idle{i}")) for i in range(self.USERS)]
+
+    def per_user_per_minute(self, requests):
+        return requests / self.USERS / (self.SIMULATED_SECONDS / 60)
+
+    def test_push_drops_idle_request_rate_to_near_zero(self):
+        window = self.SIMULATED_SECONDS / self.SPEEDUP
+
+        async def poll(app, token, path, every):
+            # One request per timer tick, however long the server takes to answer.
+            for _ in range(int(self.SIMULATED_SECONDS // every)):
+                await asgi_get(app, path, token)
+                await asyncio.sleep(every / self.SPEEDUP)
+
+        async def polling_clients():
+            app = CountingApp(application)
+            jobs = []
+            for token in self.tokens:
+                jobs += [poll(app, token, "/api/call/check/", 3),
+                         poll(app, token, "/api/meetings/pending/", 3),
+                         poll(app, token, "/api/notifications/", 8)]
+            await asyncio.gather(*jobs)
+            return app.requests
+
+        async def push_clients():
+            app = CountingApp(application)
+            streams = [EventStream(app, token) for token in self.tokens]
+            tasks = [asyncio.ensure_future(s.run()) for s in streams]
+            await asyncio.sleep(window)
+            for s in streams:
+                s.close()
+            await asyncio.gather(*tasks)
+            return app.requests
+
+        polling_rate = self.per_user_per_minute(async_to_sync(polling_clients)())
+        push_rate = self.per_user_per_minute(async_to_sync(push_clients)())
+
+        self.assertGreater(polling_rate, 40, f"polling: {polling_rate:.1f} req/min/user")
+        self.assertLessEqual(push_rate, 1, f"push: {push_rate:.1f} req/min/user")
+
+
+# =============================================================
+# PRESENCE
+# =============================================================
+
+class PresenceTests(TestCase):
+    def setUp(self):
+        caches["presence"].clear()
+        self.t0 = timezone.now().replace(microsecond=0)
+        self.alice, self.bob = make_user("alice"), make_user("bob")
+        User.objects.update(last_active=self.t0 - timedelta(days=1))
+
+    def last_active(self, user):
+        return User.objects.get(id=user.id).last_active
+
+    def test_heartbeat_writes_last_active_once_per_interval(self):
+        self.assertTrue(presence.heartbeat(self.alice.id, now=self.t0))
+        self.assertFalse(presence.heartbeat(self.alice.id, now=self.t0 + timedelta(seconds=30)))
+        self.assertEqual(self.last_active(self.alice), self.t0)
+        # throttle is per user
+        self.assertTrue(presence.heartbeat(self.bob.id, now=self.t0))
+
+        caches["presence"].delete(presence._flush_key(self.alice.id))  # interval elapsed
+        later = self.t0 + timedelta(seconds=90)
+        self.assertTrue(presence.heartbeat(self.alice.id, now=later))
+        self.assertEqual(self.last_active(self.alice), later)
+
+    def test_online_threshold(self):
+        window = presence.ONLINE_WINDOW
+
+        def online(user, after):
+            return presence.statuses([user.id], now=self.t0 + timedelta(seconds=after))[user.id]["online"]
+
+        presence.heartbeat(self.alice.id, now=self.t0)
+        # from the cache
+        self.assertTrue(online(self.alice, window - 1))
+        self.assertFalse(online(self.alice, window))
+        # from last_active, for users the cache does not know
+        User.objects.filter(id=self.bob.id).update(last_active=self.t0 - timedelta(seconds=window - 1))
+        self.assertTrue(online(self.bob, 0))
+        caches["presence"].clear()
+        User.objects.filter(id=self.bob.id).update(last_active=self.t0 - timedelta(seconds=window))
+        self.assertFalse(online(self.bob, 0))
+
+    def test_statuses_reads_the_db_once_and_heartbeats_win(self):
+        ids = [self.alice.id, self.bob.id, 10 ** 6]
+        with self.assertNumQueries(1):
+            first = presence.statuses(ids, now=self.t0)
+        self.assertEqual(set(first), {self.alice.id, self.bob.id})  # unknown ids are left out
+        self.assertFalse(first[self.alice.id]["online"])
+
+        presence.heartbeat(self.alice.id, now=self.t0)
+        with self.assertNumQueries(0):
+            second = presence.statuses([self.alice.id, self.bob.id], now=self.t0)
+        self.assertEqual(second[self.alice.id], {"online": True, "last_active": self.t0})
+        self.assertFalse(second[self.bob.id]["online"])
+
+    def test_endpoints(self):
+        self.assertEqual(APIClient().post("/api/presence/heartbeat/").status_code, 401)
+
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        res = client.post("/api/presence/heartbeat/")
+        self.assertEqual(res.json(), {"ok": True, "online_window": presence.ONLINE_WINDOW})
+        self.assertGreater(self.last_active(self.alice), self.t0 - timedelta(seconds=1))
+
+        res = client.get(f"/api/presence/?ids={self.alice.id},{self.bob.id}")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual({k: v["online"] for k, v in res.json().items()},
+                         {str(self.alice.id): True, str(self.bob.id): False})
+
+        self.assertEqual(client.get("/api/presence/?ids=1,x").status_code, 400)
+        too_many = ",".join(str(i) for i in range(presence.MAX_LOOKUP + 1))
+        self.assertEqual(client.get(f"/api/presence/?ids={too_many}").status_code, 400)
+
+    def test_middleware_flushes_at_most_once_per_interval(self):
+        client = APIClient()
+        client.force_authenticate(self.bob)
+        with CaptureQueriesContext(connection) as ctx:
+            for _ in range(3):
+                client.get("/api/presence/?ids=1")
+        updates = [q for q in ctx.captured_queries if "last_active" in q["sql"] and q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+        self.assertTrue(presence.statuses([self.bob.id])[self.bob.id]["online"])
+
+
+# =============================================================
+# CHAT INBOX
+# =============================================================
+
+class ConversationTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob, self.carol = make_user("alice"), make_user("bob"), make_user("carol")
+
+    def send(self, sender, receiver, text):
+        client = APIClient()
+        client.force_authenticate(sender)
+        return client.post(f"/api/chats/{receiver.id}/send/", {"content": text}).data["id"]
+
+    def conv(self, owner, peer):
+        return Conversation.objects.values_list("last_message_id", "unread_count").get(owner=owner, peer=peer)
+
+    def inbox(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return [(c["peer"]["id"], c["unread_count"], c["last_message"]["id"] if c["last_message"] else None)
+                for c in client.get("/api/chats/").data]
+
+    def test_send_and_reply_update_both_sides(self):
+        first = self.send(self.alice, self.bob, "hi")
+        self.assertEqual(self.conv(self.alice, self.bob), (first, 0))
+        self.assertEqual(self.conv(self.bob, self.alice), (first, 1))
+
+        reply = self.send(self.bob, self.alice, "hey")
+        self.assertEqual(self.inbox(self.alice), [(self.bob.id, 1, reply)])
+        self.assertEqual(self.inbox(self.bob), [(self.alice.id, 1, reply)])
+
+        later = self.send(self.carol, self.bob, "me too")
+        self.assertEqual(self.inbox(self.bob), [(self.carol.id, 1, later), (self.alice.id, 1, reply)])
+
+    def test_accepting_a_friend_request_opens_an_empty_conversation(self):
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        client.post(f"/api/friends/request/{self.bob.id}/")
+        request_id = FriendRequest.objects.get(from_user=self.alice).id
+        client.force_authenticate(self.bob)
+        client.post(f"/api/friends/request/respond/{request_id}/", {"action": "ACCEPT"})
+        self.assertEqual(self.inbox(self.alice), [(self.bob.id, 0, None)])
+        self.assertEqual(self.inbox(self.bob), [(self.alice.id, 0, None)])
+
+
+class ConversationBackfillTest(TransactionTestCase):
+    """Migration 0010 against the per-friend query chat_conversations ran before it."""
+    before, after = [("users", "0009_availability_meeting_availability")], [("users", "0010_conversation")]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_backfill_matches_the_per_friend_query(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        old = executor.loader.project_state(self.before).apps
+        User, Message, Friendship = (old.get_model("users", name) for name in ("User", "Message", "Friendship"))
+        alice, bob, carol, dave = (User.objects.create(username=n, email=f"{n}@peerza.test")
+                                   for n in ("alice", "bob", "carol", "dave"))
+        for sender, receiver, is_read in ((alice, bob, True), (bob, alice, False), (carol, alice, False),
+                                          (carol, alice, False), (alice, carol, False), (bob, carol, True)):
+            Message.objects.create(sender=sender, receiver=receiver, content="x", is_read=is_read)
+        Friendship.objects.create(user=alice, friend=dave)
+
+        def per_friend(me):
+            # the pre-0010 view body, minus serialization
+            mine = Message.objects.filter(Q(sender=me) | Q(receiver=me))
+            peers = ({s for s, r in mine.values_list("sender", "receiver")}
+                     | {r for s, r in mine.values_list("sender", "receiver")}
+                     | set(Friendship.objects.filter(user=me).values_list("friend_id", flat=True))) - {me.id}
+            rows = []
+            for pid in peers:
+                unread = Message.objects.filter(sender=pid, receiver=me, is_read=False).count()
+                last = Message.objects.filter(Q(sender=me, receiver=pid) | Q(sender=pid, receiver=me)) \
+                    .order_by("-timestamp").first()
+                rows.append((pid, unread, last.id if last else None, last.timestamp if last else None))
+            with_messages = sorted((r for r in rows if r[3]), key=lambda r: r[3], reverse=True)
+            return [r[:3] for r in with_messages], {r[:3] for r in rows if not r[3]}
+
+        expected = {u.id: per_friend(u) for u in (alice, bob, carol, dave)}
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        Conversation = executor.loader.project_state(self.after).apps.get_model("users", "Conversation")
+        for user_id, (with_messages, friends_only) in expected.items():
+            rows = [(c.peer_id, c.unread_count, c.last_message_id)
+                    for c in Conversation.objects.filter(owner_id=user_id).order_by("-last_activity", "-id")]
+            # friends without messages are ranked by when the friendship started, like ensure_conversation
+            self.assertEqual([r for r in rows if r[2]], with_messages)
+            self.assertEqual({r for r in rows if not r[2]}, friends_only)
+        self.assertEqual(expected[alice.id][0][0][:2], (carol.id, 2))  # alice wrote to carol last
+        self.assertEqual(expected[alice.id][0][1][:2], (bob.id, 1))
+        self.assertEqual(expected[alice.id][1], {(dave.id, 0, None)})
+
+
+# =============================================================
+# CHAT READ STATE
+# =============================================================
+
+class ReadWatermarkTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob = make_user("alice"), make_user("bob")
+        self.alice_client, self.bob_client = APIClient(), APIClient()
+        self.alice_client.force_authenticate(self.alice)
+        self.bob_client.force_authenticate(self.bob)
+        self.sent = [self.alice_client.post(f"/api/chats/{self.bob.id}/send/", {"content": f"m{i}"}).data["id"]
+                     for i in range(4)]
+
+    def thread(self, client, peer):
+        return [m["is_read"] for m in client.get(f"/api/chats/{peer.id}/messages/").data]
+
+    def inbox_unread(self, client):
+        return client.get("/api/chats/").data[0]["unread_count"]
+
+    def test_partial_then_full_read(self):
+        res = self.bob_client.post(f"/api/chats/{self.alice.id}/read/", {"up_to": self.sent[1]})
+        self.assertEqual(res.data["last_read_id"], self.sent[1])
+        self.assertEqual(self.thread(self.alice_client, self.bob), [True, True, False, False])
+        self.assertEqual(self.inbox_unread(self.bob_client), 2)
+
+        # The watermark never moves backwards.
+        self.bob_client.post(f"/api/chats/{self.alice.id}/read/", {"up_to": self.sent[0]})
+        self.assertEqual(self.inbox_unread(self.bob_client), 2)
+
+        self.bob_client.post(f"/api/chats/{self.alice.id}/read/")
+        self.assertEqual(self.thread(self.bob_client, self.alice), [True] * 4)
+        self.assertEqual(self.inbox_unread(self.bob_client), 0)
+
+    def test_read_without_a_last_message_uses_the_thread(self):
+        conv = Conversation.objects.filter(owner=self.bob, peer=self.alice)
+        conv.update(last_message=None)  # e.g. the message it pointed at was deleted
+
+        res = self.bob_client.post(f"/api/chats/{self.alice.id}/read/", {"up_to": self.sent[1]})
+        self.assertEqual(res.data["last_read_id"], self.sent[1])
+        self.assertEqual(conv.get().unread_count, 2)
+
+        res = self.bob_client.post(f"/api/chats/{self.alice.id}/read/")
+        self.assertEqual(res.data["last_read_id"], self.sent[-1])
+        self.assertEqual(conv.values_list("last_read_id", "unread_count").get(), (self.sent[-1], 0))
+        self.assertEqual(self.thread(self.alice_client, self.bob), [True] * 4)
+
+    def test_mark_read_is_one_row_update(self):
+        self.inbox_unread(self.bob_client)  # settle bob's presence write
+        # the peer, UPDATE the conversation row, read back the watermark, log the change
+        with self.assertNumQueries(4):
+            self.bob_client.post(f"/api/chats/{self.alice.id}/read/")
+
+
+class ThreadPagingTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob, self.carol = make_user("alice"), make_user("bob"), make_user("carol")
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        self.ids = []
+        for i in range(7):
+            sender, receiver = (self.alice, self.bob) if i % 2 else (self.bob, self.alice)
+            self.ids.append(Message.objects.create(sender=sender, receiver=receiver, content=f"m{i}").id)
+            Message.objects.create(sender=self.carol, receiver=self.alice, content="other thread")
+
+    def page(self, **params):
+        res = self.client.get(f"/api/chats/{self.bob.id}/messages/", params)
+        self.assertEqual(res.status_code, 200)
+        return [m["id"] for m in res.data]
+
+    def test_newest_page_is_oldest_first(self):
+        self.assertEqual(self.page(), self.ids)
+        self.assertEqual(self.page(limit=3), self.ids[-3:])
+
+    def test_before_id_scrolls_back_to_the_first_message(self):
+        self.assertEqual(self.page(limit=3, before_id=self.ids[-3]), self.ids[1:4])
+        self.assertEqual(self.page(limit=3, before_id=self.ids[1]), self.ids[:1])
+        self.assertEqual(self.page(limit=3, before_id=self.ids[0]), [])
+
+    def test_after_id_fetches_only_newer_messages(self):
+        self.assertEqual(self.page(limit=3, after_id=self.ids[2]), self.ids[3:6])
+        self.assertEqual(self.page(limit=3, after_id=self.ids[5]), self.ids[6:])
+        self.assertEqual(self.page(limit=3, after_id=self.ids[-1]), [])
+        self.assertEqual(self.page(limit=50, after_id=0), self.ids)
+
+    def test_empty_thread_and_bad_cursor(self):
+        self.client.force_authenticate(self.bob)
+        self.assertEqual(self.client.get(f"/api/chats/{self.carol.id}/messages/", {"limit": 5}).data, [])
+        self.assertEqual(self.client.get(f"/api/chats/{self.alice.id}/messages/", {"after_id": "x"}).status_code,
+                         400)
+
+
+class MessageArchiveTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob = make_user("alice"), make_user("bob")
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        for i in range(25):
+            sender = self.alice if i % 3 else self.bob
+            receiver = self.bob if sender == self.alice else self.alice
+            self.send(sender, receiver, f"m{i} é")
+        Message.objects.update(timestamp=timezone.now() - timedelta(days=365))
+        self.send(self.alice, self.bob, "recent")
+
+    def send(self, sender, receiver, text):
+        client = APIClient()
+        client.force_authenticate(sender)
+        client.post(f"/api/chats/{receiver.id}/send/", {"content": text})
+
+    def page(self, **params):
+        query = "&".join(f"{k}={v}" for k, v in params.items())
+        return self.client.get(f"/api/chats/{self.bob.id}/messages/?{query}").data
+
+    def read_all(self):
+        for reader, peer in ((self.alice, self.bob), (self.bob, self.alice)):
+            client = APIClient()
+            client.force_authenticate(reader)
+            client.post(f"/api/chats/{peer.id}/read/")
+
+    def test_unread_messages_stay_hot(self):
+        self.assertEqual(message_archive.archive(older_than_days=30)["messages"], 0)
+        self.assertEqual(Message.objects.count(), 26)
+
+    def test_pages_read_across_hot_rows_and_segments(self):
+        self.read_all()
+        self.everything = self.page()
+        report = message_archive.archive(older_than_days=30, segment_size=10)
+        self.assertEqual((report["messages"], report["segments"]), (25, 3))
+        self.assertEqual(list(Message.objects.values_list("content", flat=True)), ["recent"])
+        self.assertEqual(self.page(), self.everything)
+
+        # scroll back from the newest page in steps of 7, then forward again
+        ids = [m["id"] for m in self.everything]
+        seen, before = [], None
+        while True:
+            chunk = self.page(limit=7, **({"before_id": before} if before else {}))
+            if not chunk:
+                break
+            seen = [m["id"] for m in chunk] + seen
+            before = chunk[0]["id"]
+        self.assertEqual(seen, ids)
+        self.assertEqual([m["id"] for m in self.page(after_id=ids[8], limit=5)], ids[9:14])
+        self.assertEqual([m["content"] for m in self.page(after_id=ids[-3], limit=5)], ["m24 é", "recent"])
+
+
+# =============================================================
+# SKILL SEARCH
+# =============================================================
+
+class SkillSearchTests(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice")
+        self.teachers = [make_user(f"t{i}") for i in range(3)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        for name, teachers in (("Python", 3), ("MongoDB", 2), ("Go", 1), ("Django", 1), ("Cooking", 0)):
+            skill = Skill.objects.create(name=name)
+            search.index_skill(skill)
+            for user in self.teachers[:teachers]:
+                UserSkill.objects.create(user=user, skill=skill, skill_type="TEACH")
+
+    def names(self, query, **params):
+        res = self.client.get("/api/search/", {"skill": query, **params})
+        self.assertEqual(res.status_code, 200)
+        return [row["skill"]["name"] for row in res.data]
+
+    def test_ranked_matches(self):
+        self.assertEqual(self.names("python"), ["Python"] * 3)
+        self.assertEqual(self.names("pyton"), ["Python"] * 3)  # typo
+        self.assertEqual(self.names("go"), ["Go", "MongoDB", "MongoDB", "Django"])  # exact, then substrings
+        self.assertEqual(self.names("ngo"), ["MongoDB", "MongoDB", "Django"])  # interior match
+        self.assertEqual(self.names("cooking"), [])  # nobody teaches it
+        self.assertEqual(self.names("go", limit=2, page=2), ["MongoDB", "Django"])
+
+    def test_substring_matches_are_not_capped(self):
+        for i in range(5):
+            skill = Skill.objects.create(name=f"Mongoose {i}")
+            search.index_skill(skill)
+            UserSkill.objects.create(user=self.teachers[0], skill=skill, skill_type="TEACH")
+        old, search.MAX_CANDIDATES = search.MAX_CANDIDATES, 2
+        self.addCleanup(setattr, search, "MAX_CANDIDATES", old)
+        self.assertEqual(len(search.rank_skills("ongo")), 6)  # 5 Mongoose + MongoDB
+
+    def test_teacher_count_follows_user_skills(self):
+        python = Skill.objects.get(name="Python")
+        count = lambda: Skill.objects.get(id=python.id).teacher_count  # noqa: E731
+        self.assertEqual(count(), 3)
+
+        row = UserSkill.objects.get(user=self.teachers[0], skill=python)
+        row.skill_type = "LEARN"  # an admin edit
+        row.save()
+        self.assertEqual(count(), 2)
+        row.skill = Skill.objects.get(name="Cooking")
+        row.skill_type = "TEACH"
+        row.save()
+        self.assertEqual((count(), Skill.objects.get(name="Cooking").teacher_count), (2, 1))
+
+        self.teachers[1].delete()  # cascades to the UserSkill
+        self.assertEqual(count(), 1)
+        self.client.force_authenticate(self.teachers[2])
+        own = UserSkill.objects.get(user=self.teachers[2], skill=python)
+        self.assertEqual(self.client.delete(f"/api/delete-skill/{own.id}/").status_code, 204)
+        self.assertEqual(count(), 0)
+
+        Skill.objects.update(teacher_count=42)  # drifted by a bulk write
+        search.recount_teachers()
+        self.assertEqual(dict(Skill.objects.values_list("name", "teacher_count")),
+                         {"Python": 0, "MongoDB": 1, "Go": 1, "Django": 1, "Cooking": 1})
+
+
+# =============================================================
+# SWAP MATCHES
+# =============================================================
+
+class MatchmakingTests(TestCase):
+    def setUp(self):
+        self.skills = {name: Skill.objects.create(name=name) for name in "ABCD"}
+        self.alice, self.bob, self.carol, self.dave, self.erin, self.frank = (
+            make_user(n) for n in ("alice", "bob", "carol", "dave", "erin", "frank"))
+        for user, teach, learn in ((self.alice, "A", "BD"), (self.bob, "B", "A"), (self.carol, "B", ""),
+                                   (self.dave, "", "AC"), (self.erin, "BD", "A")):
+            for name in teach:
+                UserSkill.objects.create(user=user, skill=self.skills[name], skill_type="TEACH")
+            for name in learn:
+                UserSkill.objects.create(user=user, skill=self.skills[name], skill_type="LEARN")
+
+    def matches(self, user):
+        return list(SwapMatch.objects.filter(user=user).order_by("-score", "partner_id")
+                    .values_list("partner__username", "gives", "takes", "score"))
+
+    def test_rebuild_ranks_two_way_swaps_first(self):
+        SwapMatch.objects.create(user=self.frank, partner=self.alice, score=9)  # frank has no skills now
+        matchmaking.rebuild_all(chunk=2)
+        # erin: takes 2 + gives 1 + mutual bonus; bob: one each way; carol and dave one way, by id
+        self.assertEqual(self.matches(self.alice), [
+            ("erin", 1, 2, 5.0), ("bob", 1, 1, 4.0), ("carol", 0, 1, 1.0), ("dave", 1, 0, 1.0),
+        ])
+        self.assertEqual(self.matches(self.erin)[0], ("alice", 2, 1, 5.0))  # same pair, sides swapped
+        self.assertEqual(self.matches(self.frank), [])
+        self.assertEqual(self.matches(self.bob), [("alice", 1, 1, 4.0)])
+
+        matchmaking.rebuild_all(k=2, chunk=4)
+        self.assertEqual([m[0] for m in self.matches(self.alice)], ["erin", "bob"])
+
+    def test_refresh_after_a_skill_change_matches_a_rebuild(self):
+        matchmaking.rebuild_all()
+        User.objects.filter(id=self.alice.id).update(is_pro=True)
+        client = APIClient()
+        client.force_authenticate(User.objects.get(id=self.alice.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(client.post("/api/my-skills/", {"skill_name": "C", "skill_type": "TEACH"}).status_code,
+                             201)
+        refreshed = self.matches(self.alice)
+        self.assertEqual(refreshed, [("erin", 1, 2, 5.0), ("bob", 1, 1, 4.0), ("dave", 2, 0, 2.0), ("carol", 0, 1, 1.0)])
+        self.assertIn(("alice", 0, 2, 2.0), self.matches(self.dave))  # patched into the partner's list
+
+        matchmaking.rebuild_all()
+        self.assertEqual(self.matches(self.alice), refreshed)
+
+    def test_endpoint_reads_the_top_matches(self):
+        matchmaking.rebuild_all()
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        res = client.get("/api/matches/", {"limit": 2})
+        self.assertEqual([(m["user"]["username"], m["you_teach"], m["they_teach"]) for m in res.data],
+                         [("erin", 1, 2), ("bob", 1, 1)])
+        self.assertEqual(client.get("/api/matches/", {"limit": "x"}).status_code, 400)
+
+
+# =============================================================
+# FAST SERIALIZERS (byte-identical to the DRF serializers)
+# =============================================================
+
+class FastSerializerParityTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob = make_user("alice"), make_user("bob")
+        User.objects.filter(id=self.bob.id).update(avatar="avatars/bob.png", bio="Teaches ünïcode", is_pro=True)
+        self.bob.refresh_from_db()
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+        for i in range(30):
+            sender, receiver = (self.alice, self.bob) if i % 3 else (self.bob, self.alice)
+            inbox.record_message(Message.objects.create(sender=sender, receiver=receiver, content=f"m{i} 🚀"))
+        inbox.mark_read(self.alice, self.bob, up_to=Message.objects.order_by("id")[10].id)
+        Notification.objects.create(user=self.alice, actor=self.bob, type="FRIEND_REQUEST", data={"request_id": 1})
+        Notification.objects.create(user=self.alice, actor=None, type="SYSTEM", data={"nested": [1, "x"]})
+        Meeting.objects.create(host=self.bob, guest=self.alice, start_datetime=timezone.now(), topic="Chess")
+        Meeting.objects.create(host=self.alice, guest=self.bob, start_datetime=timezone.now(),
+                               end_datetime=timezone.now() + timedelta(hours=1), status="ACCEPTED", jitsi_room="r1")
+        Friendship.objects.create(user=self.alice, friend=self.bob)
+        skill = Skill.objects.create(name="python")
+        search.index_skill(skill)
+        UserSkill.objects.create(user=self.bob, skill=skill, skill_type="TEACH", proficiency="Expert")
+
+    def assertSameJSON(self, url, data):
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.json())
+        self.assertEqual(res.content, JSONRenderer().render(data))
+
+    def test_chat_messages(self):
+        ids = list(Message.objects.order_by("id").values_list("id", flat=True))
+        Message.objects.filter(id__lte=ids[15]).update(timestamp=timezone.now() - timedelta(days=365))
+        inbox.mark_read(self.bob, self.alice)
+        inbox.mark_read(self.alice, self.bob, up_to=ids[20])
+        message_archive.archive(older_than_days=30, segment_size=4)  # the first 16 go cold
+        marks = inbox.read_marks([(self.alice.id, self.bob.id), (self.bob.id, self.alice.id)])
+
+        for params in ({}, {"limit": 7}, {"before_id": ids[20], "limit": 12}, {"after_id": ids[3], "limit": 5}):
+            msgs = inbox.thread_page(self.alice, self.bob, **params)
+            expected = MessageSerializer(msgs, many=True, context={"read_marks": dict(marks)}).data
+            query = "&".join(f"{k}={v}" for k, v in params.items())
+            self.assertSameJSON(f"/api/chats/{self.bob.id}/messages/?{query}", expected)
+
+    def test_normalized_shape(self):
+        marks = inbox.read_marks([(self.alice.id, self.bob.id), (self.bob.id, self.alice.id)])
+        msgs = inbox.thread_page(self.alice, self.bob, limit=20)
+        url = f"/api/chats/{self.bob.id}/messages/?limit=20"
+        self.assertSameJSON(f"{url}&shape=normalized", normalize(MessageSerializer, msgs, {"read_marks": marks}))
+        compact = self.client.get(f"{url}&shape=normalized")
+        self.assertEqual(compact.json()["items"][0]["sender"], msgs[0].sender_id)
+        self.assertLess(len(compact.content), len(self.client.get(url).content) / 2)
+
+        notes = Notification.objects.filter(user=self.alice, is_read=False).order_by("-created_at")[:50]
+        self.assertSameJSON("/api/notifications/?shape=normalized", normalize(NotificationSerializer, notes))
+        matches = search.search_teachers("python", exclude_user=self.alice, limit=50)
+        self.assertSameJSON("/api/search/?skill=python&shape=normalized", normalize(UserSkillSerializer, matches))
+        self.assertEqual(self.client.get("/api/notifications/?shape=flat").status_code, 400)
+
+    def test_notifications_list(self):
+        notes = Notification.objects.filter(user=self.alice, is_read=False).order_by("-created_at")[:50]
+        self.assertSameJSON("/api/notifications/", NotificationSerializer(notes, many=True).data)
+
+    def test_search_peers(self):
+        matches = search.search_teachers("python", exclude_user=self.alice, limit=50)
+        self.assertSameJSON("/api/search/?skill=python", UserSkillSerializer(matches, many=True).data)
+
+    def test_my_meetings(self):
+        qs = Meeting.objects.filter(Q(host=self.alice) | Q(guest=self.alice))
+        self.assertSameJSON("/api/meetings/my/", MeetingSerializer(qs, many=True).data)
+
+    def test_friends_list(self):
+        expected = [{"id": f.id, "friend": UserSerializer(f.friend).data}
+                    for f in Friendship.objects.filter(user=self.alice)]
+        self.assertSameJSON("/api/friends/", expected)
+
+
+class RenderingTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob = make_user("alice"), make_user("bob")
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        for i in range(60):
+            Message.objects.create(sender=self.bob, receiver=self.alice, content=f"message number {i}")
+        self.url = f"/api/chats/{self.bob.id}/messages/"
+
+    def test_orjson_matches_drf_json(self):
+        data = {
+            "when": timezone.now(), "day": timezone.now().date(), "price": Decimal("9.50"), 3: "int key",
+            "text": "line\u2028sep ünï 🚀", "nested": [None, True, 1.5, {"a": []}], "big": 2 ** 70,
+        }
+        self.assertEqual(renderers.ORJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(renderers.ORJSONRenderer().render(None), b"")
+
+    def test_json_parser(self):
+        res = self.client.post(f"/api/chats/{self.bob.id}/send/", {"content": "hi ü"}, format="json")
+        self.assertEqual(res.status_code, 201)
+        res = self.client.post(f"/api/chats/{self.bob.id}/send/", b"{not json", content_type="application/json")
+        self.assertEqual(res.status_code, 400)
+
+    @skipUnless(renderers.msgpack, "msgpack is not installed")
+    def test_msgpack_round_trip(self):
+        res = self.client.get(self.url, HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(res["Content-Type"], "application/msgpack")
+        self.assertEqual(renderers.msgpack.unpackb(res.content), self.client.get(self.url).json())
+        body = renderers.msgpack.packb({"content": "packed"})
+        res = self.client.post(f"/api/chats/{self.bob.id}/send/", body, content_type="application/msgpack")
+        self.assertEqual(res.status_code, 201)
+
+    @skipUnless(renderers.msgpack is None, "msgpack is installed")
+    def test_msgpack_not_offered_without_the_library(self):
+        res = self.client.get(self.url, HTTP_ACCEPT="application/msgpack, application/json;q=0.5")
+        self.assertEqual(res["Content-Type"], "application/json")
+        self.assertEqual(self.client.get(self.url, HTTP_ACCEPT="application/msgpack").status_code, 406)
+
+    def test_choose_encoding(self):
+        best = "br" if compression.brotli else "gzip"
+        self.assertEqual(compression.choose_encoding("gzip, deflate, br"), best)
+        self.assertEqual(compression.choose_encoding("br;q=0.5, gzip"), "gzip")
+        self.assertEqual(compression.choose_encoding("gzip;q=0, identity"), None)
+        self.assertEqual(compression.choose_encoding(""), None)
+
+    def test_compression(self):
+        plain = self.client.get(self.url)
+        self.assertFalse(plain.has_header("Content-Encoding"))
+        res = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(res["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", res["Vary"])
+        self.assertEqual(gzip.decompress(res.content), plain.content)
+        self.assertLess(len(res.content), len(plain.content) / 3)
+
+        with override_settings(PEERZA_COMPRESSION_MIN_BYTES=len(plain.content) + 1):
+            res = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertFalse(res.has_header("Content-Encoding"))
+
+
+# =============================================================
+# AUTH (cached JWT users)
+# =============================================================
+
+class AuthCacheTests(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice")
+        self.alice.set_password("old-secret")
+        self.alice.save()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access_token(self.alice)}")
+
+    def user_queries(self, url):
+        table = User._meta.db_table
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        return res, [q["sql"] for q in ctx.captured_queries if f'FROM "{table}"' in q["sql"]]
+
+    def test_warm_requests_skip_the_user_query(self):
+        _, cold = self.user_queries("/api/profile/")
+        self.assertEqual(len(cold), 1)
+        _, warm = self.user_queries("/api/profile/")
+        self.assertEqual(warm, [])
+
+    def test_profile_patch_invalidates(self):
+        self.user_queries("/api/profile/")
+        self.assertEqual(self.client.patch("/api/profile/", {"bio": "new bio"}).status_code, 200)
+        res, queries = self.user_queries("/api/profile/")
+        self.assertEqual(res.data["bio"], "new bio")
+        self.assertEqual(len(queries), 1)
+
+    def test_change_password_invalidates(self):
+        self.user_queries("/api/profile/")
+        res = self.client.post("/api/change-password/", {"old_password": "old-secret", "new_password": "n3w"})
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(authentication.get_user_cache().get(self.alice.id).check_password("n3w"))
+
+    @override_settings(STRIPE_WEBHOOK_SECRET=None)
+    def test_stripe_pro_flip_invalidates(self):
+        self.assertFalse(self.user_queries("/api/profile/")[0].data["is_pro"])
+        event = {"type": "checkout.session.completed",
+                 "data": {"object": {"metadata": {"user_id": str(self.alice.id)}}}}
+        res = APIClient().post("/api/payments/webhook/", json.dumps(event), content_type="application/json")
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(self.user_queries("/api/profile/")[0].data["is_pro"])
+
+    def test_other_processes_see_the_new_version(self):
+        other = authentication.UserCache()  # a second process: own rows, shared version cache
+        self.assertEqual(other.get(self.alice.id).bio, None)
+        self.alice.bio = "changed elsewhere"
+        self.alice.save()
+        self.assertEqual(other.get(self.alice.id).bio, "changed elsewhere")
+        self.assertEqual((other.hits, other.misses), (0, 2))
+        other.get(self.alice.id).bio = "local edit"
+        self.assertEqual(other.get(self.alice.id).bio, "changed elsewhere")
+
+    def test_per_process_version_cache_is_flagged_for_deploys(self):
+        warnings = authentication.check_shared_version_cache(None)
+        self.assertEqual([w.id for w in warnings], ["users.W001"])
+        shared = {**settings.CACHES, "auth": {"BACKEND": "django.core.cache.backends.redis.RedisCache"}}
+        with self.settings(CACHES=shared, PEERZA_AUTH_CACHE="auth"):
+            self.assertEqual(authentication.check_shared_version_cache(None), [])
+
+    def test_entries_expire_after_the_ttl(self):
+        cache = authentication.UserCache(ttl=0)
+        cache.get(self.alice.id)
+        User.objects.filter(id=self.alice.id).update(is_active=False)  # no signal, as in another process
+        self.assertFalse(cache.get(self.alice.id).is_active)
+
+
+# =============================================================
+# BATCH
+# =============================================================
+
+class BatchTests(TestCase):
+    PAGE_LOAD = ["/api/profile/", "/api/my-skills/", "/api/friends/", "/api/chats/", "/api/notifications/"]
+
+    def setUp(self):
+        self.alice, self.bob = make_user("alice"), make_user("bob")
+        Friendship.objects.create(user=self.alice, friend=self.bob)
+        Notification.objects.create(user=self.alice, actor=self.bob, type="FRIEND_REQUEST", data={"request_id": 1})
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access_token(self.alice)}")
+
+    def batch(self, *requests):
+        return self.client.post("/api/batch/", {"requests": list(requests)}, format="json")
+
+    def test_matches_separate_calls_and_authenticates_once(self):
+        separate = [self.client.get(path).json() for path in self.PAGE_LOAD]
+        cache = authentication.get_user_cache()
+        lookups = cache.hits + cache.misses
+        res = self.batch(*[{"path": path} for path in self.PAGE_LOAD])
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(cache.hits + cache.misses, lookups + 1)
+        self.assertEqual([r["status"] for r in res.json()["responses"]], [200] * 5)
+        self.assertEqual([r["body"] for r in res.json()["responses"]], separate)
+
+    def test_writes_run_in_order(self):
+        res = self.batch(
+            {"method": "POST", "path": f"/api/chats/{self.bob.id}/send/", "body": {"content": "batched"}},
+            {"path": f"/api/chats/{self.bob.id}/messages/"},
+            {"method": "PATCH", "path": "/api/profile/", "body": {"bio": "from a batch"}},
+            {"path": "/api/profile/"},
+        )
+        send, messages, _, profile = res.json()["responses"]
+        self.assertEqual(send["status"], 201)
+        self.assertEqual(messages["body"][-1]["content"], "batched")
+        self.assertEqual(profile["body"]["bio"], "from a batch")
+
+    def test_rejects_what_cannot_be_batched(self):
+        res = self.batch({"path": "/api/batch/"}, {"path": "/api/call/wait/"}, {"path": "/api/login/"},
+                         {"path": "/api/nope/"}, {"path": f"/api/users/{self.bob.id}/"})
+        self.assertEqual([r["status"] for r in res.json()["responses"]], [404, 404, 404, 404, 200])
+        self.assertEqual(self.batch(*[{"path": "/api/profile/"}] * 21).status_code, 400)
+        self.assertEqual(self.batch({"method": "TRACE", "path": "/api/profile/"}).status_code, 400)
+        self.assertEqual(self.client.post("/api/batch/", {}, format="json").status_code, 400)
+        self.assertEqual(APIClient().post("/api/batch/", {"requests": []}, format="json").status_code, 401)
+
+
+@override_settings(PEERZA_BATCH_WORKERS=4)
+class ConcurrentBatchTest(TransactionTestCase):
+    def test_reads_run_on_worker_threads(self):
+        alice, bob = make_user("alice"), make_user("bob")
+        Friendship.objects.create(user=alice, friend=bob)
+        client = APIClient()
+        client.force_authenticate(alice)
+        paths = BatchTests.PAGE_LOAD * 2
+        separate = [client.get(path).json() for path in paths]
+
+        res = client.post("/api/batch/", {"requests": [{"path": p} for p in paths]}, format="json")
+        self.assertEqual([r["body"] for r in res.json()["responses"]], separate)
+        self.assertIsNotNone(batch._pool)  # not inlined: no surrounding transaction here
+
+
+# =============================================================
+# VIEW CACHE
+# =============================================================
+
+class ViewCacheTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob = make_user("alice"), make_user("bob")
+        Friendship.objects.create(user=self.alice, friend=self.bob)
+        skill = Skill.objects.create(name="chess")
+        UserSkill.objects.create(user=self.bob, skill=skill, skill_type="TEACH", proficiency="Expert")
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        return res.json(), len(ctx.captured_queries)
+
+    def assertCached(self, url):
+        first, cold = self.get(url)
+        second, warm = self.get(url)
+        self.assertEqual(first, second)
+        self.assertLess(warm, cold)
+        return second
+
+    def test_reads_are_cached(self):
+        for url in (f"/api/users/{self.bob.id}/", "/api/my-skills/", "/api/friends/",
+                    f"/api/availability/{self.bob.id}/user/"):
+            self.assertCached(url)
+
+    def test_model_changes_invalidate(self):
+        profile = f"/api/users/{self.bob.id}/"
+        slots = f"/api/availability/{self.bob.id}/user/"
+        for url in (profile, "/api/friends/", slots):
+            self.assertCached(url)
+
+        self.bob.bio = "new bio"
+        self.bob.save()
+        self.assertEqual(self.get(profile)[0]["user"]["bio"], "new bio")
+        self.assertEqual(self.get("/api/friends/")[0][0]["friend"]["bio"], "new bio")
+
+        UserSkill.objects.filter(user=self.bob).delete()
+        self.assertEqual(self.get(profile)[0]["skills"], [])
+
+        day = (timezone.localdate() + timedelta(days=1)).strftime("%A").upper()
+        Availability.objects.create(user=self.bob, day_of_week=day, start_time=dt_time(9), end_time=dt_time(10))
+        slot = self.get(slots)[0][0]
+        self.assertFalse(slot["is_booked"])
+        Meeting.objects.create(host=self.bob, guest=self.alice, status="ACCEPTED", topic="Chess",
+                               start_datetime=slot["start_datetime"], end_datetime=slot["end_datetime"])
+        self.assertTrue(self.get(slots)[0][0]["is_booked"])
+
+        Friendship.objects.filter(user=self.alice).delete()
+        self.assertEqual(self.get("/api/friends/")[0], [])
+
+    def test_file_backend(self):
+        with tempfile.TemporaryDirectory() as path:
+            backend = {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": path}
+            with override_settings(CACHES={"default": backend, "presence": backend, "views": backend}):
+                self.assertCached(f"/api/users/{self.bob.id}/")
+                UserSkill.objects.filter(user=self.bob).delete()
+                self.assertEqual(self.get(f"/api/users/{self.bob.id}/")[0]["skills"], [])
+                self.assertIn("FileBasedCache", viewcache.stats()["backend"])
+
+    def test_concurrent_misses_rebuild_once(self):
+        builds = []
+
+        @viewcache.cached_view("stampede", tags=lambda request: ["stampede"])
+        def slow(request):
+            builds.append(1)
+            time.sleep(0.2)
+            return Response({"n": len(builds)})
+
+        request = Request(APIRequestFactory().get("/stampede/"))
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(slow(request).data)) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(builds), 1)
+        self.assertEqual(results, [{"n": 1}] * 8)
+        stats = viewcache.stats()["views"]["stampede"]
+        self.assertEqual((stats["rebuilds"], stats["waited"]), (1, 7))
+
+    def test_stats_are_staff_only(self):
+        self.get(f"/api/users/{self.bob.id}/")
+        self.assertEqual(self.client.get("/api/cache/stats/").status_code, 403)
+        staff = User.objects.create(username="staff", email="staff@peerza.test", is_staff=True)
+        self.client.force_authenticate(staff)
+        stats = self.client.get("/api/cache/stats/").json()
+        self.assertIn("hit_ratio", stats["views"]["public_profile"])
+
+
+# =============================================================
+# METRICS
+# =============================================================
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics.registry.reset()
+        self.alice, self.bob = make_user("alice"), make_user("bob")
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def scrape(self, **headers):
+        res = self.client.get("/metrics", **headers)
+        self.assertEqual(res.status_code, 200)
+        return res.content.decode()
+
+    @override_settings(PEERZA_METRICS_SAMPLE_RATE=1.0)
+    def test_sampled_requests(self):
+        for _ in range(3):
+            self.client.get("/api/profile/")
+        self.client.get("/api/nope/")
+        text = self.scrape()
+        self.assertIn('peerza_http_requests_total{view="profile",method="GET",status="200"} 3', text)
+        self.assertIn('peerza_http_requests_total{view="unresolved",method="GET",status="404"} 1', text)
+        self.assertIn('peerza_http_request_duration_seconds_bucket{view="profile",le="+Inf"} 3', text)
+        self.assertIn('peerza_sampled_requests_total{view="profile"} 3', text)
+        self.assertNotIn('view="metrics"', self.scrape())
+        stats = metrics.registry.views["profile"]
+        self.assertGreater(stats.render_seconds, 0)
+        self.assertEqual(stats.serialize_seconds, 0)  # ProfileSerializer, not a fast shape
+        self.assertGreater(stats.size.sum, 0)
+
+    @override_settings(PEERZA_METRICS_SAMPLE_RATE=1.0)
+    def test_fast_shapes_report_serialize_time(self):
+        Message.objects.create(sender=self.bob, receiver=self.alice, content="hi")
+        self.assertEqual(self.client.get(f"/api/chats/{self.bob.id}/messages/").status_code, 200)
+        self.assertGreater(metrics.registry.views["chat_messages"].serialize_seconds, 0)
+        self.assertIn('peerza_serialize_seconds_total{view="chat_messages"}', self.scrape())
+
+    @override_settings(PEERZA_METRICS_SAMPLE_RATE=1.0)
+    def test_asgi_requests_are_sampled(self):
+        res = async_to_sync(AsyncClient().get)(
+            "/api/profile/", headers={"Authorization": f"Bearer {access_token(self.alice)}"}
+        )
+        self.assertEqual(res.status_code, 200)
+
+        stats = metrics.registry.views["profile"]
+        self.assertEqual(stats.sampled, 1)
+        self.assertGreater(stats.db_queries, 0)
+        self.assertGreater(stats.render_seconds, 0)
+        self.assertIn(f'peerza_db_queries_total{{view="profile"}} {stats.db_queries}', self.scrape())
+
+    @override_settings(PEERZA_METRICS_SAMPLE_RATE=0.0)
+    def test_unsampled_requests_skip_db_timing(self):
+        self.client.get("/api/profile/")
+        stats = metrics.registry.views["profile"]
+        self.assertEqual((stats.latency.count, stats.sampled, stats.db_queries), (1, 0, 0))
+
+    def test_repeated_sql_shapes_are_flagged(self):
+        def run(sql, params, many, context):
+            return None
+
+        sample = metrics.Sample(threshold=3)
+        for i in range(5):
+            sample(run, 'SELECT * FROM "users_user" WHERE "id" = %s', (i,), False, {})
+        sample(run, 'SELECT * FROM "users_skill" WHERE "id" IN (%s, %s)', (1, 2), False, {})
+        sample(run, 'SELECT * FROM "users_skill" WHERE "id" IN (%s, %s, %s)', (1, 2, 3), False, {})
+        self.assertEqual(sample.repeated(), ('SELECT * FROM "users_user" WHERE "id" = %s', 5))
+        self.assertEqual(metrics.shape('"id" IN (%s, %s, %s)'), '"id" IN (...)')
+
+        with self.assertLogs("users.metrics", "WARNING"):
+            metrics.registry.record("chat_conversations", "GET", 200, 0.01, 100, sample)
+        self.assertIn('peerza_n_plus_one_total{view="chat_conversations"} 1', self.scrape())
+
+    @override_settings(PEERZA_METRICS_TOKEN="s3cret")
+    def test_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 401)
+        self.scrape(HTTP_AUTHORIZATION="Bearer s3cret")
+
+    def test_without_a_token_only_staff_and_local_requests(self):
+        client = Client(REMOTE_ADDR="203.0.113.7")
+        self.assertEqual(client.get("/metrics").status_code, 403)
+        client.force_login(self.alice)
+        self.assertEqual(client.get("/metrics").status_code, 403)
+        self.alice.is_staff = True
+        self.alice.save(update_fields=["is_staff"])
+        self.assertEqual(client.get("/metrics").status_code, 200)
+        self.assertEqual(Client(REMOTE_ADDR="::1").get("/metrics").status_code, 200)
+
+
+class SeedTests(TestCase):
+    def seed(self, **opts):
+        call_command("seed_peerza", users=40, messages=400, stdout=StringIO(), **opts)
+
+    def test_summaries_match_the_rows(self):
+        self.seed()
+        me = User.objects.get(username="seed0")
+        self.assertTrue(me.is_staff and me.check_password("peerza-seed"))
+        self.assertEqual(Message.objects.count(), 400)
+        self.assertEqual(Conversation.objects.count(), Friendship.objects.count())
+        self.assertTrue(Conversation.objects.filter(unread_count__gt=0).exists())
+        for conv in Conversation.objects.all():
+            thread = Message.objects.filter(Q(sender=conv.owner_id, receiver=conv.peer_id)
+                                            | Q(sender=conv.peer_id, receiver=conv.owner_id))
+            self.assertEqual(conv.last_message_id, thread.order_by("-id").values_list("id", flat=True).first())
+            self.assertEqual(conv.unread_count, inbox.unread_after(conv.owner_id, conv.peer_id, conv.last_read_id))
+        for skill in Skill.objects.all():
+            self.assertEqual(skill.teacher_count, UserSkill.objects.filter(skill=skill, skill_type="TEACH").count())
+        top = Skill.objects.order_by("-teacher_count").first()
+        self.assertEqual(search.rank_skills(top.name)[0], (top.id, top.teacher_count))  # trigram index built
+
+        message = Message.objects.create(sender=me, receiver=User.objects.get(username="seed1"), content="hi")
+        self.assertEqual(message.id, 401)  # the id sequence continues after the explicit ids
+        with self.assertRaises(CommandError):
+            self.seed()
+
+    def test_same_seed_same_rows(self):
+        def snapshot():
+            return (list(Message.objects.values_list("sender__username", "receiver__username", "content")),
+                    list(UserSkill.objects.values_list("user__username", "skill__name", "skill_type")))
+
+        self.seed(skip_matches=True)
+        first = snapshot()
+        for model in (Message, UserSkill, Skill, User):
+            model.objects.all().delete()
+        self.seed(skip_matches=True)
+        self.assertEqual(snapshot(), first)
+
+
+class QueryCountTests(TestCase):
+    """
+    Every users.urls route (bench_views' endpoint list) runs as seed0 against
+    a small and a larger seed_peerza dataset, where seed0 has more friends,
+    threads, meetings, skills, slots and notifications (about 3x each). A SQL
+    shape (metrics.shape) that runs more than two extra times on the larger
+    dataset is an N+1; a fixed second run, such as matchmaking's query per
+    direction once the user both teaches and learns, is not. The failure
+    lists the route and the repeated statement.
+    """
+    SCALES = (
+        dict(users=30, messages=300, friends_per_user=4, meetings_per_user=1, slots_per_user=1, skills_per_user=1),
+        dict(users=60, messages=1500, friends_per_user=12, meetings_per_user=6, slots_per_user=6,
+             skills_per_user=10),
+    )
+    LISTS = ("my_skills", "public_profile", "my_meetings", "pending_meetings", "meeting-list", "notifications_list",
+             "chat_conversations", "friends_list", "availability-list", "search_peers")
+
+    def queries_per_endpoint(self, scale):
+        """{label: (Counter of SQL shapes, response bytes)}"""
+        out = {}
+        with transaction.atomic():
+            call_command("seed_peerza", stdout=StringIO(), **scale)
+            me = User.objects.get(username="seed0")
+            client = Client(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(me).access_token}")
+            bench = bench_views.Command()
+            endpoints = bench.endpoints(me, client)
+            missing = bench_views.routes() - {(e[1], e[2]) for e in endpoints}
+            self.assertFalse(missing, "routes without an endpoint in bench_views.Command.endpoints")
+            for label, _name, method, path, body in endpoints:
+                if path is None:
+                    continue
+                caches["views"].clear()
+                authentication.get_user_cache().clear()
+                sample = metrics.Sample(threshold=1)
+                with connection.execute_wrapper(sample):
+                    _ms, response, _queries = bench.request(client, method, path, body)
+                shapes = Counter()
+                for sql, n in sample.shapes.items():
+                    shapes[metrics.shape(sql)] += n
+                out[label] = (shapes, len(response.content))
+            transaction.set_rollback(True)
+        return out
+
+    def test_query_count_does_not_grow_with_the_data(self):
+        logging.getLogger("django.request").setLevel(logging.ERROR)  # expected 4xx (free plan limit)
+        self.addCleanup(logging.getLogger("django.request").setLevel, logging.NOTSET)
+        small, large = (self.queries_per_endpoint(scale) for scale in self.SCALES)
+        self.assertGreater(len(small), 50)
+        for label in self.LISTS:  # the larger dataset does return more rows
+            self.assertGreater(large[label][1], small[label][1], label)
+
+        grown = []
+        for label in small.keys() & large.keys():
+            before = small[label][0]
+            for sql, n in large[label][0].items():
+                if n > before[sql] + 2:
+                    grown.append(f"{label}: {before[sql]} -> {n}× {sql}")
+        self.assertFalse(grown, "N+1 queries:\n" + "\n".join(sorted(grown)))
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class LoadTestCommandTest(LiveServerTestCase):
+    def test_virtual_users_run_against_a_live_server(self):
+        call_command("seed_peerza", users=20, messages=200, skip_matches=True, stdout=StringIO())
+        with tempfile.NamedTemporaryFile(suffix=".json") as out:
+            call_command("loadtest", url=self.live_server_url, users=3, duration=4, ramp=0.3, warmup=0,
+                         think=0.5, output=out.name, stdout=StringIO())
+            report = json.loads(out.read())
+
+        self.assertEqual(report["signed_in"], 3)
+        self.assertEqual(report["errors"], 0)
+        self.assertEqual(report["routes"]["POST login/"]["requests"], 3)
+        for name in ("GET profile/", "GET chats/", "GET sync/"):
+            self.assertGreater(report["routes"][name]["requests"], 0, name)
+        self.assertEqual(loadtest.route("GET", "chats/12/messages/?limit=50"), "GET chats/{id}/messages/")
+
+
+# =============================================================
+# SYNC (change feed)
+# =============================================================
+
+class SyncTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob = make_user("alice"), make_user("bob")
+        self.alice_client, self.bob_client = APIClient(), APIClient()
+        self.alice_client.force_authenticate(self.alice)
+        self.bob_client.credentials(HTTP_AUTHORIZATION=f"Bearer {access_token(self.bob)}")
+        self.enterContext(override_settings(PEERZA_NOTIFICATION_OUTBOX=INLINE_OUTBOX))
+        caches["default"].clear()  # cached heads/horizon outlive the rollback, ids are reused
+        self.cursor = self.bob_client.get("/api/sync/").data["cursor"]
+
+    def sync(self, **headers):
+        res = self.bob_client.get(f"/api/sync/?since={self.cursor}", **headers)
+        if res.status_code == 200:
+            self.cursor = res.data["cursor"]
+        return res
+
+    def test_returns_only_deltas_for_the_user(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.alice_client.post(f"/api/chats/{self.bob.id}/send/", {"content": "hi"})
+            self.alice_client.post(f"/api/friends/request/{self.bob.id}/")
+        data = self.sync().data
+        self.assertEqual(sorted(data["changes"]), ["conversation", "friend_request", "message", "notification"])
+        self.assertEqual(data["changes"]["message"][0]["content"], "hi")
+        self.assertEqual(data["changes"]["conversation"][0]["unread_count"], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bob_client.post("/api/notifications/mark-read-all/")
+            Notification.objects.filter(user=self.bob).delete()
+        data = self.sync().data
+        self.assertEqual(list(data["changes"]), ["notification"])
+        self.assertEqual(len(data["deleted"]["notification"]), 1)
+
+    def test_up_to_date_client_gets_304_without_queries(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.alice_client.post(f"/api/chats/{self.bob.id}/send/", {"content": "hi"})
+        etag = self.sync()["ETag"]
+        self.sync()  # caches the head
+        with self.assertNumQueries(0):
+            res = self.sync(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.content, b"")
+
+    def test_deactivated_user_is_refused(self):
+        self.bob.is_active = False
+        self.bob.save(update_fields=["is_active"])
+        self.assertEqual(self.sync().status_code, 401)
+        self.bob.delete()
+        self.assertEqual(self.sync().status_code, 401)
+
+    def test_weak_etag_from_compression_still_matches(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.alice_client.post(f"/api/chats/{self.bob.id}/send/", {"content": "hi"})
+        etag = self.sync()["ETag"]
+        for header in (f"W/{etag}", f'"0", W/{etag}', "*"):
+            self.assertEqual(self.sync(HTTP_IF_NONE_MATCH=header).status_code, 304, header)
+        self.assertEqual(self.sync(HTTP_IF_NONE_MATCH='W/"0"').status_code, 200)
+
+    def test_cursor_older_than_the_retained_log_gets_a_resync(self):
+        def send(content):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.alice_client.post(f"/api/chats/{self.bob.id}/send/", {"content": content})
+
+        send("one")
+        self.sync()
+        send("two")
+        purged = ChangeLog.objects.order_by("-id").values_list("id", flat=True).first()
+        send("three")
+        ChangeLog.objects.filter(id__lte=purged).update(created_at=timezone.now() - timedelta(days=30))
+
+        changelog = next(p for p in retention.policies() if p.name == "changelog")
+        self.assertGreater(retention.apply(changelog, pause=0)["removed"], 0)
+        self.assertEqual(changes.horizon(), purged)
+
+        # "two" is gone from the log: start over from the current head
+        res = self.sync()
+        self.assertEqual(res.data["changes"], {})
+        self.assertTrue(res.data["resync"])
+        self.assertEqual(self.cursor, changes.head(self.bob.id))
+        self.assertNotIn("resync", self.sync().data)
+
+        # a cursor at the horizon lost nothing and still gets its delta
+        self.cursor = purged
+        res = self.sync()
+        self.assertNotIn("resync", res.data)
+        self.assertEqual([m["content"] for m in res.data["changes"]["message"]], ["three"])
+
+
+# =============================================================
+# CALL SIGNALING
+# =============================================================
+
+@override_settings(PEERZA_EVENT_BROKER="users.events.RecordingBroker")
+class CallSignalingTests(TestCase):
+    def setUp(self):
+        self.enterContext(override_settings(PEERZA_CALL_REGISTRY=signaling.DEFAULT_REGISTRY))  # fresh registry
+        self.alice, self.bob = make_user("alice"), make_user("bob")
+        self.client, self.bob_client = APIClient(), APIClient()
+        self.client.force_authenticate(self.alice)
+        self.bob_client.force_authenticate(self.bob)
+        self.bob_client.get("/api/call/check/")  # settle bob's presence write
+
+    def test_ringing_stays_in_memory_until_the_call_ends(self):
+        self.client.post(f"/api/call/start/{self.bob.id}/")
+        with self.assertNumQueries(0):
+            res = self.bob_client.get("/api/call/check/")
+        self.assertEqual(res.data["caller"]["id"], self.alice.id)
+        self.assertFalse(Call.objects.exists())
+        self.assertFalse(Meeting.objects.exists())
+
+        self.bob_client.post(f"/api/call/end/{self.alice.id}/")
+        self.assertEqual(self.bob_client.get("/api/call/check/").data, {"active": False})
+        call = Call.objects.get()
+        self.assertEqual((call.caller, call.receiver, call.is_active), (self.alice, self.bob, False))
+        self.assertIsNotNone(call.ended_at)
+
+    def test_unanswered_ring_expires_into_history(self):
+        registry = signaling.get_registry()
+        registry.ttl = 0
+        self.client.post(f"/api/call/start/{self.bob.id}/")
+        self.assertEqual(self.bob_client.get("/api/call/check/").data, {"active": False})
+        signaling.persist_ended()
+        self.assertEqual(Call.objects.count(), 1)
+
+
+@override_settings(PEERZA_EVENT_BROKER="users.events.RecordingBroker")
+class CallLongPollTest(TransactionTestCase):
+    def setUp(self):
+        self.enterContext(override_settings(PEERZA_CALL_REGISTRY=signaling.DEFAULT_REGISTRY))
+        self.alice, self.bob = make_user("alice"), make_user("bob")
+        self.token = access_token(self.bob)
+
+    def test_wait_returns_as_soon_as_a_call_arrives(self):
+        async def wait(version, timeout=5):
+            status, body = await asgi_request(
+                application, "/api/call/wait/", self.token, f"version={version}&timeout={timeout}"
+            )
+            return status, json.loads(body)
+
+        async def scenario():
+            _, initial = await wait(-1)  # unknown version: answers immediately
+            parked = asyncio.ensure_future(wait(initial["version"]))
+            await asyncio.sleep(0.2)
+
+            # A parked long-poll must not block ordinary (sync) requests.
+            check_status = await asgi_get(application, "/api/call/check/", self.token)
+
+            started = time.perf_counter()
+            await sync_to_async(signaling.start)(self.alice, self.bob, {"id": self.alice.id}, "room-1")
+            status, state = await parked
+            return initial, check_status, status, state, time.perf_counter() - started
+
+        initial, check_status, status, state, latency = async_to_sync(scenario)()
+        self.assertEqual(initial["active"], False)
+        self.assertEqual(check_status, 200)
+        self.assertEqual(status, 200)
+        self.assertEqual((state["active"], state["room"]), (True, "room-1"))
+        self.assertLess(latency, 0.1, f"ring latency {latency * 1000:.1f} ms")
+
+    def test_wait_times_out_with_unchanged_state(self):
+        async def scenario():
+            started = time.perf_counter()
+            status, body = await asgi_request(application, "/api/call/wait/", self.token, "version=0&timeout=0.2")
+            return status, json.loads(body), time.perf_counter() - started
+
+        status, state, elapsed = async_to_sync(scenario)()
+        self.assertEqual((status, state), (200, {"version": 0, "active": False}))
+        self.assertGreaterEqual(elapsed, 0.2)
+
+
+# =============================================================
+# NOTIFICATION OUTBOX
+# =============================================================
+
+class OutboxCoalescingTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob = make_user("alice"), make_user("bob")
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        self.enterContext(override_settings(PEERZA_NOTIFICATION_OUTBOX=INLINE_OUTBOX))
+
+    def test_repeated_friend_requests_notify_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(5):
+                self.client.post(f"/api/friends/request/{self.bob.id}/")
+        self.assertEqual(Notification.objects.filter(user=self.bob, type="FRIEND_REQUEST").count(), 1)
+
+        stats = outbox.get_outbox().stats()
+        self.assertEqual((stats["enqueued"], stats["inserted"], stats["coalesced"]), (5, 1, 4))
+        self.assertEqual(stats["queue_depth"], 0)
+
+    def test_different_payloads_are_kept(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for day in (7, 8):
+                self.client.post("/api/meetings/request/", {
+                    "guest_id": self.bob.id, "start_datetime": f"2030-01-{day:02}T10:00:00Z",
+                })
+        self.assertEqual(Notification.objects.filter(user=self.bob, type="MEETING_REQUEST").count(), 2)
+
+    def test_stats_are_staff_only(self):
+        self.assertEqual(self.client.get("/api/notifications/outbox/").status_code, 403)
+        User.objects.filter(id=self.alice.id).update(is_staff=True)
+        self.alice.refresh_from_db()
+        self.client.force_authenticate(self.alice)
+        self.assertIn("flush_ms", self.client.get("/api/notifications/outbox/").data)
+
+
+class OutboxRetryTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob = make_user("alice"), make_user("bob")
+        self.enterContext(override_settings(PEERZA_NOTIFICATION_OUTBOX=INLINE_OUTBOX))
+        self.box = outbox.get_outbox()
+        self.deliver, self.calls = self.box._deliver, 0
+
+    def failing(self, times):
+        def deliver(batch):
+            self.calls += 1
+            if self.calls <= times:
+                raise RuntimeError("database is locked")
+            return self.deliver(batch)
+        self.box._deliver = deliver
+
+    def put(self):
+        self.box._put(outbox.Intent(self.bob.id, self.alice, "FRIEND_REQUEST", {"from": "alice"}))
+
+    def test_failed_batch_is_requeued_and_delivered_once(self):
+        self.failing(times=1)
+        with self.assertLogs("users.outbox", "ERROR"):
+            self.put()
+        self.assertEqual((self.box.depth(), Notification.objects.count()), (1, 0))
+
+        self.assertEqual(self.box.flush(), 1)
+        self.put()  # a duplicate again once the retry went through
+        self.assertEqual(Notification.objects.filter(user=self.bob).count(), 1)
+        stats = self.box.stats()
+        self.assertEqual((stats["failures"], stats["coalesced"], stats["dropped"], stats["queue_depth"]), (1, 1, 0, 0))
+
+    def test_failed_delivery_does_not_fail_the_committed_request(self):
+        self.failing(times=1)
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        with self.assertLogs("users.outbox", "ERROR"), self.captureOnCommitCallbacks(execute=True):
+            res = client.post(f"/api/friends/request/{self.bob.id}/")
+        self.assertEqual(res.status_code, 201)
+        self.assertTrue(FriendRequest.objects.filter(from_user=self.alice, to_user=self.bob).exists())
+        self.assertEqual(self.box.depth(), 1)  # picked up by the next flush
+
+    def test_intents_are_dropped_after_max_attempts(self):
+        self.failing(times=outbox.MAX_ATTEMPTS)
+        with self.assertLogs("users.outbox", "ERROR") as logs:
+            self.put()
+            for _ in range(outbox.MAX_ATTEMPTS - 1):
+                self.assertEqual(self.box.flush(), 0)
+        self.assertIn("dropped 1 intents", logs.output[-1])
+        self.assertEqual((self.box.depth(), self.box.stats()["dropped"]), (0, 1))
+
+        self.put()  # not suppressed as a duplicate of the dropped one
+        self.assertEqual(Notification.objects.count(), 1)
+
+
+@override_settings(PEERZA_EVENT_BROKER="users.events.RecordingBroker")
+class BackgroundOutboxTest(TransactionTestCase):
+    def setUp(self):
+        self.enterContext(override_settings(PEERZA_NOTIFICATION_OUTBOX="users.outbox.BackgroundOutbox"))
+        self.addCleanup(lambda: outbox.get_outbox().flush())
+
+    def test_requests_return_before_the_batch_is_written(self):
+        teacher = make_user("teacher")
+        students = [make_user(f"student{i}") for i in range(10)]
+        for student in students:
+            client = APIClient()
+            client.force_authenticate(student)
+            self.assertEqual(client.post(f"/api/friends/request/{teacher.id}/").status_code, 201)
+        # handlers only queued the intents
+        self.assertEqual(Notification.objects.count(), 0)
+
+        deadline = time.monotonic() + 5
+        while Notification.objects.count() < 10 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(Notification.objects.filter(user=teacher).count(), 10)
+
+        outbox.get_outbox().flush()  # waits for the worker's flush to finish publishing
+        stats = outbox.get_outbox().stats()
+        self.assertEqual(stats["inserted"], 10)
+        self.assertLess(stats["flushes"], 10)  # batched, not one insert per request
+        self.assertEqual(
+            [e for uid, e, _ in events.get_broker().published if uid == teacher.id], ["notification"] * 10
+        )
+
+
+# =============================================================
+# RETENTION
+# =============================================================
+
+class RetentionTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob = make_user("alice"), make_user("bob")
+        self.now = timezone.now()
+        self.old = self.now - timedelta(days=365)
+
+    def policy(self, name, **overrides):
+        with self.settings(PEERZA_RETENTION={name: overrides}):
+            return next(p for p in retention.policies() if p.name == name)
+
+    def test_notifications_keep_unread_recent_and_newest_per_user(self):
+        for i in range(5):
+            Notification.objects.create(user=self.alice, type="X", is_read=True, created_at=self.old)
+        unread = Notification.objects.create(user=self.alice, type="X", created_at=self.old)
+        recent = Notification.objects.create(user=self.alice, type="X", is_read=True)
+        Notification.objects.create(user=self.bob, type="X", is_read=True, created_at=self.old)
+
+        report = retention.apply(self.policy("notification", keep_last=3), batch_size=2, pause=0)
+
+        # alice: newest 3 read survive (recent + 2 old), bob's only one is within keep_last
+        self.assertEqual((report["expired"], report["removed"], report["batches"]), (3, 3, 2))
+        self.assertEqual((report["before"]["rows"], report["after"]["rows"]), (8, 5))
+        self.assertEqual(Notification.objects.filter(id__in=[unread.id, recent.id]).count(), 2)
+        self.assertTrue(Notification.objects.filter(user=self.bob).exists())
+
+    def test_dead_meetings_are_archived(self):
+        start = self.now - timedelta(days=60)
+        dead = Meeting.objects.create(host=self.alice, guest=self.bob, start_datetime=start,
+                                      status="DECLINED", created_at=self.old)
+        Meeting.objects.create(host=self.alice, guest=self.bob, start_datetime=start,
+                               status="ACCEPTED", created_at=self.old)
+
+        report = retention.apply(self.policy("meeting"), pause=0)
+
+        self.assertEqual((report["removed"], report["archived"]), (1, 1))
+        self.assertEqual(list(Meeting.objects.values_list("status", flat=True)), ["ACCEPTED"])
+        record = ArchivedRecord.objects.get()
+        self.assertEqual((record.kind, record.object_id, record.user_id), ("meeting", dead.id, self.alice.id))
+        self.assertEqual(record.data["status"], "DECLINED")
+
+    def test_dry_run_only_counts(self):
+        Call.objects.create(caller=self.alice, receiver=self.bob, is_active=False, created_at=self.old)
+        report = retention.apply(self.policy("call"), dry_run=True)
+        self.assertEqual((report["expired"], report["removed"]), (1, 0))
+        self.assertEqual(Call.objects.count(), 1)
+
+
+# =============================================================
+# AVAILABILITY
+# =============================================================
+
+def aware(day, hour, minute=0):
+    return timezone.make_aware(timezone.datetime(2026, 1, day, hour, minute))
+
+
+class AvailabilityWindowTests(TestCase):
+    # 2026-01-05 is a Monday
+    def setUp(self):
+        self.alice, self.bob = make_user("alice"), make_user("bob")
+        for day, start, end in (("MONDAY", 9, 12), ("WEDNESDAY", 14, 16), ("monday", 18, 19), ("FRIDAY", 10, 10)):
+            Availability.objects.create(user=self.bob, day_of_week=day, start_time=dt_time(start),
+                                        end_time=dt_time(end))
+
+    def meet(self, start, end, status="ACCEPTED", guest=None):
+        Meeting.objects.create(host=self.bob, guest=guest or self.alice, start_datetime=start, end_datetime=end,
+                               status=status)
+
+    def test_weekly_slots_expand_to_dated_occurrences(self):
+        slots = Availability.objects.filter(user=self.bob)
+        occurrences = [(s, e) for s, e, _ in scheduling.expand_weekly(slots, date(2026, 1, 5), date(2026, 1, 12))]
+        self.assertEqual(occurrences, [
+            (aware(5, 9), aware(5, 12)), (aware(5, 18), aware(5, 19)), (aware(7, 14), aware(7, 16)),
+            (aware(12, 9), aware(12, 12)), (aware(12, 18), aware(12, 19)),
+        ])  # lower-case day names count; the empty Friday slot does not
+
+    def test_booked_slots_are_marked_in_one_sweep(self):
+        self.meet(aware(5, 11), aware(5, 13))                      # overlaps Monday morning
+        self.meet(aware(7, 16), aware(7, 17))                      # touches Wednesday's end only
+        self.meet(aware(12, 18, 30), aware(12, 18, 45), "PENDING")  # not accepted
+        self.meet(aware(19, 9), aware(19, 12))                     # outside the window
+        booked = [(s.day, s.hour, flag) for s, _, _, flag in
+                  scheduling.dated_slots(self.bob.id, date(2026, 1, 5), date(2026, 1, 12))]
+        self.assertEqual(booked, [(5, 9, True), (5, 18, False), (7, 14, False), (12, 9, False), (12, 18, False)])
+
+    def test_user_endpoint(self):
+        self.meet(aware(7, 15), aware(7, 15, 30))
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        res = client.get(f"/api/availability/{self.bob.id}/user/", {"start": "2026-01-06", "end": "2026-01-08"})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([(str(r["date"]), r["day_of_week"], r["is_booked"]) for r in res.data],
+                         [("2026-01-07", "WEDNESDAY", True)])
+        bad = client.get(f"/api/availability/{self.bob.id}/user/", {"start": "2026-01-08", "end": "2026-01-06"})
+        self.assertEqual(bad.status_code, 400)
+
+
+class CommonFreeTimeTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob, self.carol = make_user("alice"), make_user("bob"), make_user("carol")
+        for user, start, end in ((self.alice, 9, 17), (self.bob, 8, 12), (self.bob, 14, 15), (self.carol, 9, 17)):
+            Availability.objects.create(user=user, day_of_week="MONDAY", start_time=dt_time(start),
+                                        end_time=dt_time(end))
+
+    def test_intersect_and_subtract(self):
+        a = [(1, 4), (6, 9), (10, 12)]
+        b = [(0, 2), (3, 7), (8, 11)]
+        self.assertEqual(scheduling.intersect(a, b), [(1, 2), (3, 4), (6, 7), (8, 9), (10, 11)])
+        self.assertEqual(scheduling.intersect(a, []), [])
+        self.assertEqual(scheduling.subtract([(0, 10)], [(2, 3), (5, 7), (9, 12)]), [(0, 2), (3, 5), (7, 9)])
+        self.assertEqual(scheduling.subtract([(0, 2), (4, 6)], [(1, 5)]), [(0, 1), (5, 6)])
+        self.assertEqual(scheduling.subtract([(0, 2)], [(0, 2)]), [])
+
+    def test_common_free_skips_held_time(self):
+        Meeting.objects.create(host=self.alice, guest=self.carol, start_datetime=aware(5, 10),
+                               end_datetime=aware(5, 11), status="PENDING")
+        Meeting.objects.create(host=self.bob, guest=self.carol, start_datetime=aware(5, 14, 45),
+                               end_datetime=aware(5, 16), status="DECLINED")
+        windows = scheduling.common_free(self.alice.id, self.bob.id, date(2026, 1, 5), date(2026, 1, 5))
+        self.assertEqual(windows, [(aware(5, 9), aware(5, 10)), (aware(5, 11), aware(5, 12)),
+                                   (aware(5, 14), aware(5, 15))])  # equal lengths: earliest first
+        self.assertEqual(scheduling.common_free(self.alice.id, self.bob.id, date(2026, 1, 5), date(2026, 1, 5),
+                                                min_length=timedelta(minutes=90)), [])
+
+    def test_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.alice)
+
+        def common(**params):
+            return client.get("/api/availability/common/", {"start": "2026-01-05", "end": "2026-01-11", **params})
+
+        res = common(user_b=self.bob.id)
+        self.assertEqual([(r["start"].hour, r["minutes"]) for r in res.data], [(9, 180), (14, 60)])
+        self.assertEqual(len(common(user_b=self.bob.id, limit=-3).data), 1)  # clamped, not sliced from the end
+        self.assertEqual(len(common(user_b=self.bob.id, limit=0).data), 1)
+        self.assertEqual(common(user_b=self.bob.id, user_a=self.alice.id).status_code, 200)
+        self.assertEqual(common(user_b=self.bob.id, user_a=self.carol.id).status_code, 403)
+        self.assertEqual(common().status_code, 400)
+
+
+# =============================================================
+# BOOKING
+# =============================================================
+
+class BookingConflictTests(TestCase):
+    def setUp(self):
+        self.host, self.guest, self.other = make_user("host"), make_user("guest"), make_user("other")
+        self.client = APIClient()
+        self.client.force_authenticate(self.host)
+
+    def request(self, guest, start, end):
+        return self.client.post("/api/meetings/request/", {
+            "guest_id": guest.id, "start_datetime": start, "end_datetime": end,
+        })
+
+    def test_overlap_with_either_calendar_is_409(self):
+        self.assertEqual(self.request(self.guest, "2030-01-07T10:00:00Z", "2030-01-07T11:00:00Z").status_code, 201)
+        # guest is busy
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.request(self.guest, "2030-01-07T10:30:00Z", "2030-01-07T11:30:00Z").status_code, 409)
+        # host is busy, via the viewset route too
+        self.client.force_authenticate(self.host)
+        res = self.client.post("/api/meetings/", {
+            "guest": self.other.id, "start_datetime": "2030-01-07T09:30:00Z",
+            "end_datetime": "2030-01-07T10:15:00Z",
+        })
+        self.assertEqual(res.status_code, 409)
+
+    def test_adjacent_and_declined_do_not_conflict(self):
+        self.request(self.guest, "2030-01-07T10:00:00Z", "2030-01-07T11:00:00Z")
+        self.assertEqual(self.request(self.guest, "2030-01-07T11:00:00Z", "2030-01-07T12:00:00Z").status_code, 201)
+        Meeting.objects.update(status="DECLINED")
+        self.assertEqual(self.request(self.guest, "2030-01-07T10:00:00Z", "2030-01-07T11:00:00Z").status_code, 201)
+
+
+class ConcurrentBookingTest(TransactionTestCase):
+    BOOKERS = 12
+
+    def fire(self, jobs):
+        """Run (user, guest, start, end) bookings in parallel threads; return status codes."""
+        barrier, codes = threading.Barrier(len(jobs)), []
+
+        def run(user, guest, start, end):
+            client = APIClient()
+            client.force_authenticate(user)
+            barrier.wait()
+            try:
+                codes.append(client.post("/api/meetings/request/", {
+                    "guest_id": guest.id, "start_datetime": start, "end_datetime": end,
+                }).status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=job) for job in jobs]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return codes
+
+    def test_exactly_one_booking_wins_a_contested_slot(self):
+        teacher = make_user("teacher")
+        students = [make_user(f"student{i}") for i in range(self.BOOKERS)]
+
+        codes = self.fire([(s, teacher, "2030-01-07T10:00:00Z", "2030-01-07T11:00:00Z") for s in students])
+
+        self.assertEqual(sorted(codes), [201] + [409] * (self.BOOKERS - 1))
+        self.assertEqual(Meeting.objects.filter(guest=teacher).count(), 1)
+
+    def test_unrelated_bookings_all_succeed(self):
+        pairs = [(make_user(f"a{i}"), make_user(f"b{i}")) for i in range(self.BOOKERS)]
+
+        codes = self.fire([(a, b, "2030-01-07T10:00:00Z", "2030-01-07T11:00:00Z") for a, b in pairs])
+
+        self.assertEqual(codes, [201] * self.BOOKERS)
+
+    @skipUnless(connection.vendor == "sqlite", "SQLite's database-wide write lock")
+    def test_sqlite_booking_blocks_writers_but_not_readers(self):
+        # SQLite has one write lock for the whole database: an open booking
+        # holds it, so even an unrelated write waits until the booking commits.
+        host, guest, bystander = make_user("host"), make_user("guest"), make_user("bystander")
+        held, release, done = threading.Event(), threading.Event(), []
+
+        def hold_booking():
+            try:
+                with booking.locked_calendars(host.id, guest.id):
+                    Meeting.objects.create(host=host, guest=guest, start_datetime=timezone.now(), status="PENDING")
+                    held.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        def write():
+            try:
+                bystander.bio = "still here"
+                bystander.save(update_fields=["bio"])
+                done.append(True)
+            finally:
+                connection.close()
+
+        holder = threading.Thread(target=hold_booking)
+        holder.start()
+        self.assertTrue(held.wait(10))
+        # Only the booking begins IMMEDIATE: an ordinary transaction starts
+        # and reads without queueing behind it...
+        started = time.monotonic()
+        with transaction.atomic():
+            self.assertTrue(User.objects.filter(id=bystander.id).exists())
+        self.assertLess(time.monotonic() - started, 1)
+        # ...but a write to an unrelated row queues behind the booking, and
+        # goes through (rather than failing) once it commits.
+        writer = threading.Thread(target=write)
+        writer.start()
+        writer.join(0.5)
+        self.assertEqual(done, [])
+        release.set()
+        holder.join()
+        writer.join()
+
+        self.assertEqual(done, [True])
+        self.assertEqual(User.objects.get(id=bystander.id).bio, "still here")
+        self.assertEqual(Meeting.objects.count(), 1)
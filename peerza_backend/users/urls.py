@@ -1,7 +1,7 @@
 from django.urls import path
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import signaling, views
 from .views_meeting import MeetingViewSet
 from .views_availability import AvailabilityViewSet
 from .views_payments import create_checkout_session, stripe_webhook  # ✅ Added
@@ -29,10 +29,16 @@ urlpatterns = [
 
     # SEARCH / PROFILE
     path('search/', views.search_peers, name='search_peers'),
+    path('matches/', views.swap_matches, name='swap_matches'),
     path('users/<int:pk>/', views.get_public_profile, name='public_profile'),
 
+    # PRESENCE
+    path('presence/', views.presence_lookup, name='presence_lookup'),
+    path('presence/heartbeat/', views.presence_heartbeat, name='presence_heartbeat'),
+
     # CALLS & MEETINGS
     path('call/check/', views.check_calls, name='check_calls'),
+    path('call/wait/', signaling.call_wait, name='call_wait'),
     path('call/start/<int:receiver_id>/', views.call_start, name='call_start'),
     path('call/end/<int:receiver_id>/', views.call_end, name='call_end'),
     path('meetings/request/', views.request_meeting, name='request_meeting'),
@@ -44,6 +50,7 @@ urlpatterns = [
     path('notifications/', views.notifications_list, name='notifications_list'),
     path('notifications/mark-read/<int:notification_id>/', views.mark_notification_read, name='mark_notification_read'),
     path('notifications/mark-read-all/', views.mark_notifications_read_all, name='mark_notifications_read_all'),
+    path('notifications/outbox/', views.notifications_outbox_stats, name='notifications_outbox_stats'),
 
     # CHAT
     path('chats/', views.chat_conversations, name='chat_conversations'),
@@ -51,6 +58,15 @@ urlpatterns = [
     path('chats/<int:user_id>/send/', views.chat_send, name='chat_send'),
     path('chats/<int:user_id>/read/', views.chat_mark_read, name='chat_mark_read'),
 
+    # SYNC
+    path('sync/', views.sync, name='sync'),
+
+    # BATCH
+    path('batch/', views.batch_requests, name='batch'),
+
+    # CACHE
+    path('cache/stats/', views.view_cache_stats, name='view_cache_stats'),
+
     # FRIENDS
     path('friends/', views.friends_list, name='friends_list'),
     path('friends/requests/', views.friend_requests_inbox, name='friend_requests_inbox'),
@@ -0,0 +1,232 @@
+"""
+Tag-invalidated cache for read-mostly GET views.
+
+    @api_view(['GET'])
+    @cached_view("public_profile", tags=lambda request, pk: [f"user:{pk}", f"skills:{pk}"])
+    def get_public_profile(request, pk): ...
+
+A 200 response's data is stored in the settings.PEERZA_VIEW_CACHE alias
+(`views`: local memory by default; any Django backend works, the tests
+also run it on the file backend). The key is the view name, the URL
+arguments, the sorted query string, the user (with per_user=True) and the
+current version of each of the view's tags. Rendering still happens per
+request, so Accept negotiation and compression are unaffected.
+
+Invalidation bumps tag versions: entries built under an older version are
+simply never read again and age out after the timeout
+(PEERZA_VIEW_CACHE_TIMEOUT). post_save/post_delete on User, UserSkill,
+Availability, Friendship and Meeting (booked slots) bump the tags below, at
+once and again on commit, so a read racing the write cannot keep the old
+data. A version that went missing (restart, eviction) is replaced by a new
+one, never reset.
+
+    user:<id>          the user's public fields
+    skills:<id>        their UserSkills
+    availability:<id>  their weekly slots and ACCEPTED meetings
+    friends:<id>       their Friendship rows and those friends' profiles
+
+A miss is rebuilt once: the first request takes a short lock in the cache
+(cache.add) and the others wait for its result for up to LOCK_WAIT seconds
+instead of all querying the database. Hit ratios, lookup and rebuild
+latency per view are kept per process and served at GET cache/stats/.
+"""
+import functools
+import hashlib
+import threading
+import time
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from rest_framework.response import Response
+
+from .metrics import summary
+from .models import Availability, Friendship, Meeting, User, UserSkill
+
+LOCK_TTL = 10       # seconds a rebuild lock is held at most
+LOCK_WAIT = 2.0     # seconds a waiter polls for the rebuilt value before building it itself
+POLL_INTERVAL = 0.005
+_MISSING = object()
+
+
+def _cache():
+    return caches[getattr(settings, "PEERZA_VIEW_CACHE", "views")]
+
+
+def _tag_key(tag):
+    return f"vc:tag:{tag}"
+
+
+# =============================================================
+# METRICS
+# =============================================================
+
+class ViewCacheMetrics:
+    def __init__(self, keep=256):
+        self.keep = keep
+        self.lock = threading.Lock()
+        self.invalidations = 0
+        self.views = defaultdict(lambda: {
+            "hits": 0, "misses": 0, "rebuilds": 0, "waited": 0, "fallbacks": 0,
+            "lookup_ms": deque(maxlen=self.keep), "rebuild_ms": deque(maxlen=self.keep),
+        })
+
+    def count(self, view, field):
+        with self.lock:
+            self.views[view][field] += 1
+
+    def sample(self, view, samples, ms):
+        with self.lock:
+            self.views[view][samples].append(ms)
+
+    def snapshot(self):
+        with self.lock:
+            views = {}
+            for name, s in sorted(self.views.items()):
+                lookups = s["hits"] + s["misses"]
+                views[name] = {
+                    "hits": s["hits"], "misses": s["misses"],
+                    "hit_ratio": round(s["hits"] / lookups, 4) if lookups else None,
+                    "rebuilds": s["rebuilds"], "waited": s["waited"], "fallbacks": s["fallbacks"],
+                    "lookup_ms": summary(s["lookup_ms"]), "rebuild_ms": summary(s["rebuild_ms"]),
+                }
+            return {"invalidations": self.invalidations, "views": views}
+
+
+metrics = ViewCacheMetrics()
+
+
+def stats():
+    cache = _cache()
+    return {"backend": f"{type(cache).__module__}.{type(cache).__name__}", **metrics.snapshot()}
+
+
+# =============================================================
+# TAGS
+# =============================================================
+
+def _versions(cache, tags):
+    keys = [_tag_key(t) for t in tags]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time_ns(), timeout=None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def _bump(tags):
+    cache = _cache()
+    for tag in tags:
+        try:
+            cache.incr(_tag_key(tag))
+        except ValueError:  # unknown (or evicted): a fresh version differs from every stored key
+            cache.set(_tag_key(tag), time.time_ns(), timeout=None)
+    with metrics.lock:
+        metrics.invalidations += len(tags)
+
+
+def invalidate(*tags):
+    """Drop every cached response carrying one of `tags`, now and once the transaction commits."""
+    if tags:
+        _bump(tags)
+        transaction.on_commit(lambda: _bump(tags))
+
+
+def _user_tags(user):
+    # every tag of the user (UserSkill rows embed the user; a new row may reuse
+    # the id of a deleted one) plus the friend lists showing their profile
+    own = [f"{kind}:{user.pk}" for kind in ("user", "skills", "availability", "friends")]
+    listed = Friendship.objects.filter(friend_id=user.pk).values_list("user_id", flat=True)
+    return own + [f"friends:{uid}" for uid in listed]
+
+
+# model -> tags to bump when a row is saved or deleted
+TAGS = {
+    User: _user_tags,
+    UserSkill: lambda o: [f"skills:{o.user_id}"],
+    Availability: lambda o: [f"availability:{o.user_id}"],
+    Friendship: lambda o: [f"friends:{o.user_id}"],
+    Meeting: lambda o: [f"availability:{o.host_id}", f"availability:{o.guest_id}"],
+}
+
+
+def _on_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate(*TAGS[sender](instance))
+
+
+def connect():
+    for model in TAGS:
+        post_save.connect(_on_change, sender=model, dispatch_uid=f"viewcache-save-{model.__name__}")
+        post_delete.connect(_on_change, sender=model, dispatch_uid=f"viewcache-delete-{model.__name__}")
+
+
+# =============================================================
+# DECORATOR
+# =============================================================
+
+def _key(name, request, kwargs, per_user, vary, versions):
+    parts = [
+        repr(sorted(kwargs.items())),
+        repr(sorted(request.query_params.lists())),
+        str(request.user.id) if per_user else "",
+        vary(request, **kwargs) if vary else "",
+        repr(versions),
+    ]
+    return f"vc:view:{name}:" + hashlib.md5("|".join(parts).encode()).hexdigest()
+
+
+def cached_view(name, tags, per_user=False, vary=None, timeout=None):
+    """
+    Cache GET responses of a DRF view (function or viewset action; put it
+    below @api_view / @action). `tags(request, **url_kwargs)` lists the tags
+    the response depends on; `vary(request, **url_kwargs)` adds anything
+    else the data depends on (e.g. today's date).
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            request = args[-1]  # (request,) for function views, (self, request) for actions
+            if request.method != "GET":
+                return view(*args, **kwargs)
+
+            cache = _cache()
+            started = time.perf_counter()
+            key = _key(name, request, kwargs, per_user, vary, _versions(cache, tags(request, **kwargs)))
+            data = cache.get(key, _MISSING)
+            metrics.sample(name, "lookup_ms", (time.perf_counter() - started) * 1000)
+            if data is not _MISSING:
+                metrics.count(name, "hits")
+                return Response(data)
+            metrics.count(name, "misses")
+
+            lock = f"{key}:lock"
+            if not cache.add(lock, 1, timeout=LOCK_TTL):
+                # someone else is rebuilding this key: wait for their result
+                deadline = time.monotonic() + LOCK_WAIT
+                while time.monotonic() < deadline:
+                    time.sleep(POLL_INTERVAL)
+                    data = cache.get(key, _MISSING)
+                    if data is not _MISSING:
+                        metrics.count(name, "waited")
+                        return Response(data)
+                    if cache.get(lock) is None:
+                        break  # the rebuild failed or was not cacheable
+                metrics.count(name, "fallbacks")  # build it ourselves, uncached
+                return view(*args, **kwargs)
+
+            try:
+                started = time.perf_counter()
+                response = view(*args, **kwargs)
+                if isinstance(response, Response) and response.status_code == 200:
+                    cache.set(key, response.data, timeout or getattr(settings, "PEERZA_VIEW_CACHE_TIMEOUT", 300))
+                metrics.count(name, "rebuilds")
+                metrics.sample(name, "rebuild_ms", (time.perf_counter() - started) * 1000)
+                return response
+            finally:
+                cache.delete(lock)
+        return wrapper
+    return decorator
@@ -1,18 +1,17 @@
 from django.db import IntegrityError
 from django.db.models import Q
 from django.shortcuts import get_object_or_404
-from django.utils import timezone
+from django.utils.http import parse_etags
 
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
 from rest_framework.response import Response
 
 from .models import (
     User,
     UserSkill,
     Skill,
-    Call,
     Meeting,
     Notification,
     Message,
@@ -26,10 +25,14 @@ from .serializers import (
     UserSkillSerializer,
     SkillSerializer,
     MeetingSerializer,
-    NotificationSerializer,
     MessageSerializer,
+    ConversationSerializer,
     FriendRequestSerializer,
 )
+from . import (
+    authentication, batch, booking, changes, events, fastserializers, inbox, matchmaking, outbox, params, presence,
+    search, signaling, viewcache,
+)
 
 # =============================================================
 # AUTHENTICATION
@@ -76,9 +79,10 @@ def get_my_profile(request):
 
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@viewcache.cached_view("my_skills", tags=lambda request: [f"skills:{request.user.id}"], per_user=True)
 def my_skills(request):
     if request.method == 'GET':
-        qs = UserSkill.objects.filter(user=request.user)
+        qs = UserSkill.objects.filter(user=request.user).select_related("user", "skill")
         return Response(UserSkillSerializer(qs, many=True).data)
 
     # POST
@@ -92,8 +96,11 @@ def my_skills(request):
 
     skill_name = request.data.get('skill_name')
     skill_type = request.data.get('skill_type')
-    skill_obj, _ = Skill.objects.get_or_create(name=skill_name)
+    skill_obj, created = Skill.objects.get_or_create(name=skill_name)
+    if created:
+        search.index_skill(skill_obj)
     UserSkill.objects.create(user=request.user, skill=skill_obj, skill_type=skill_type)
+    matchmaking.schedule_refresh(request.user.id)
     return Response({"message": "Skill added!"}, status=status.HTTP_201_CREATED)
 
 
@@ -105,6 +112,7 @@ def delete_skill(request, skill_id):
     except UserSkill.DoesNotExist:
         return Response({"error": "Skill not found"}, status=404)
     us.delete()
+    matchmaking.schedule_refresh(request.user.id)
     return Response(status=204)
 
 # =============================================================
@@ -118,11 +126,40 @@ def search_peers(request):
     if not query:
         return Response({"message": "Please provide a skill to search for."}, status=400)
 
-    matches = UserSkill.objects.filter(
-        skill__name__icontains=query, skill_type='TEACH'
-    ).exclude(user=request.user)
+    # Ranked (exact > prefix > substring > typo-tolerant), paged with ?page=&limit=
+    try:
+        limit = params.limit_param(request, default=50)
+        page = max(1, int(request.query_params.get('page') or 1))
+        normalized = params.normalized_param(request)
+    except ValueError:
+        return Response({"detail": "Invalid page, limit or shape"}, status=400)
+
+    shape = fastserializers.USER_SKILL
+    matches = search.search_teachers(
+        query, exclude_user=request.user, offset=(page - 1) * limit, limit=limit,
+        columns=shape.normalized_columns if normalized else shape.columns,
+    )
+    return Response(shape.normalized(matches) if normalized else shape.rows(matches))
+
+# =============================================================
+# SWAP PARTNERS (reciprocal TEACH/LEARN matches)
+# =============================================================
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def swap_matches(request):
+    """Precomputed top partners: they teach what you want and/or want what you teach."""
+    try:
+        limit = params.limit_param(request, default=20, maximum=matchmaking.TOP_K)
+    except ValueError:
+        return Response({"detail": "Invalid limit"}, status=400)
 
-    return Response(UserSkillSerializer(matches, many=True).data)
+    return Response([{
+        "user": UserSerializer(m.partner).data,
+        "score": m.score,
+        "you_teach": m.gives,
+        "they_teach": m.takes,
+    } for m in matchmaking.top_matches(request.user, limit=limit)])
 
 # =============================================================
 # PUBLIC PROFILE
@@ -130,18 +167,44 @@ def search_peers(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@viewcache.cached_view("public_profile", tags=lambda request, pk: [f"user:{pk}", f"skills:{pk}"])
 def get_public_profile(request, pk):
     try:
         user = User.objects.get(id=pk)
     except User.DoesNotExist:
         return Response({"error": "User not found"}, status=404)
 
-    skills = UserSkill.objects.filter(user=user)
+    skills = UserSkill.objects.filter(user=user).select_related("user", "skill")
     return Response({
         "user": UserSerializer(user).data,
         "skills": UserSkillSerializer(skills, many=True).data,
     })
 
+# =============================================================
+# PRESENCE
+# =============================================================
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def presence_heartbeat(request):
+    # PresenceMiddleware already recorded this request; the endpoint exists
+    # for idle clients that make no other API calls.
+    return Response({"ok": True, "online_window": presence.ONLINE_WINDOW})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def presence_lookup(request):
+    """Online status for ?ids=1,2,3 (at most presence.MAX_LOOKUP ids)."""
+    raw = request.query_params.get("ids", "")
+    try:
+        ids = [int(part) for part in raw.split(",") if part.strip()]
+    except ValueError:
+        return Response({"detail": "ids must be a comma-separated list of user ids"}, status=400)
+    if len(ids) > presence.MAX_LOOKUP:
+        return Response({"detail": f"At most {presence.MAX_LOOKUP} ids per request"}, status=400)
+
+    return Response({str(uid): state for uid, state in presence.statuses(ids).items()})
+
 # =============================================================
 # PASSWORD
 # =============================================================
@@ -162,6 +225,9 @@ def change_password(request):
 # CALL SIGNALING (LEGACY)
 # =============================================================
 
+# Ringing state lives in signaling's in-memory registry; nothing here reads
+# the Call table.
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def start_call(request, receiver_id):
@@ -170,26 +236,23 @@ def start_call(request, receiver_id):
     except User.DoesNotExist:
         return Response({"error": "User not found"}, status=404)
 
-    Call.objects.update_or_create(
-        caller=request.user, receiver=receiver, defaults={'is_active': True}
-    )
+    room_name = f"Peerza-Class-{request.user.id}-{receiver.id}"
+    signaling.start(request.user, receiver, UserSerializer(request.user).data, room_name)
     return Response({"message": "Call started"})
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def check_calls(request):
-    active_call = Call.objects.filter(receiver=request.user, is_active=True).last()
-    if active_call:
-        return Response({"active": True, "caller": UserSerializer(active_call.caller).data})
+    state = signaling.current(request.user)
+    if state["active"]:
+        return Response({"active": True, "caller": state["caller"]})
     return Response({"active": False})
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def end_call(request, receiver_id):
-    Call.objects.filter(
-        Q(caller=request.user) | Q(receiver=request.user),
-        is_active=True,
-    ).update(is_active=False)
+    receiver = get_object_or_404(User, id=receiver_id)
+    signaling.end(request.user, receiver)
     return Response({"message": "Call ended"})
 
 # =============================================================
@@ -203,7 +266,10 @@ def register_firebase_uid(request):
     if not uid:
         return Response({"detail": "firebase_uid required"}, status=400)
 
-    User.objects.filter(firebase_uid=uid).exclude(id=request.user.id).update(firebase_uid=None)
+    previous = User.objects.filter(firebase_uid=uid).exclude(id=request.user.id)
+    for user_id in previous.values_list("id", flat=True):
+        authentication.invalidate(user_id)  # update() sends no post_save
+    previous.update(firebase_uid=None)
     request.user.firebase_uid = uid
     request.user.save()
     return Response({"detail": "registered"})
@@ -225,23 +291,19 @@ def request_meeting(request):
     except User.DoesNotExist:
         return Response({"detail": "guest not found"}, status=404)
 
-    meeting = Meeting.objects.create(
-        host=request.user,
-        guest=guest,
-        topic=topic,
-        start_datetime=start,
-        end_datetime=end,
-        status='PENDING',
-    )
+    # Atomic overlap check against both calendars; 409 if the slot is taken
+    meeting = booking.book(request.user, guest, start, end, topic=topic)
 
-    Notification.objects.create(
+    outbox.notify(
         user=guest,
         actor=request.user,
         type="MEETING_REQUEST",
         data={"meeting_id": meeting.id},
     )
 
-    return Response(MeetingSerializer(meeting).data, status=201)
+    payload = MeetingSerializer(meeting).data
+    events.publish(guest.id, "meeting_request", payload)
+    return Response(payload, status=201)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -272,7 +334,7 @@ def respond_meeting(request, meeting_id):
 
     # Notify the other participant
     other_user = meeting.guest if request.user == meeting.host else meeting.host
-    Notification.objects.create(
+    outbox.notify(
         user=other_user,
         actor=request.user,
         type="MEETING_RESPONSE",
@@ -281,13 +343,15 @@ def respond_meeting(request, meeting_id):
 
     print(f"✅ Meeting {meeting.id} updated to {meeting.status} by {request.user.username}")
 
-    return Response(MeetingSerializer(meeting).data)
+    payload = MeetingSerializer(meeting).data
+    events.publish(other_user.id, "meeting_response", payload)
+    return Response(payload)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def my_meetings(request):
     qs = Meeting.objects.filter(Q(host=request.user) | Q(guest=request.user))
-    return Response(MeetingSerializer(qs, many=True).data)
+    return Response(fastserializers.MEETING.many(qs))
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -299,7 +363,7 @@ def pending_meetings(request):
     meetings = Meeting.objects.filter(
         Q(guest=request.user),
         status='PENDING'
-    ).order_by('-created_at')
+    ).select_related('host').order_by('-created_at')
     return Response(MeetingSerializer(meetings, many=True).data)
 
 # =============================================================
@@ -309,10 +373,14 @@ def pending_meetings(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def notifications_list(request):
+    try:
+        normalized = params.normalized_param(request)
+    except ValueError:
+        return Response({"detail": "Invalid shape"}, status=400)
     notes = Notification.objects.filter(
         user=request.user, is_read=False
-    ).order_by("-created_at")[:50]
-    return Response(NotificationSerializer(notes, many=True).data)
+    ).order_by("-created_at")
+    return Response(fastserializers.NOTIFICATION.many(notes, limit=50, normalized=normalized))
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -328,11 +396,44 @@ def mark_notification_read(request, notification_id):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def mark_notifications_read_all(request):
-    Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+    unread = Notification.objects.filter(user=request.user, is_read=False)
+    ids = list(unread.values_list("id", flat=True))
+    unread.update(is_read=True)
+    changes.record([request.user.id], "notification", ids)
     return Response({"ok": True})
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def notifications_outbox_stats(request):
+    """Queue depth, coalescing and flush latency of this process's notification outbox."""
+    return Response(outbox.get_outbox().stats())
+
+# =============================================================
+# VIEW CACHE
+# =============================================================
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def view_cache_stats(request):
+    """Hit ratio, lookup and rebuild latency of this process's view cache (users/viewcache.py)."""
+    return Response(viewcache.stats())
+
+# =============================================================
+# BATCH
+# =============================================================
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def batch_requests(request):
+    """Several API calls in one round trip; see users/batch.py for the format."""
+    try:
+        specs = batch.parse(request.data)
+    except batch.BatchError as e:
+        return Response({"error": str(e)}, status=400)
+    return Response({"responses": batch.run(request, specs)})
+
 # =============================================================
-# UPDATED CALL START / END (MEETING + NOTIFY)
+# CALL START / END
 # =============================================================
 
 @api_view(['POST'])
@@ -344,48 +445,16 @@ def call_start(request, receiver_id):
     if caller == receiver:
         return Response({"error": "You cannot call yourself."}, status=status.HTTP_400_BAD_REQUEST)
 
-    # ✅ Only reuse a PENDING meeting; ignore ACCEPTED/DECLINED/CANCELLED
-    meeting = Meeting.objects.filter(
-        host=caller,
-        guest=receiver,
-        status="PENDING",
-    ).order_by("-created_at").first()
-
-    if not meeting:
-        meeting = Meeting.objects.create(
-            host=caller,
-            guest=receiver,
-            status="PENDING",
-            start_datetime=timezone.now(),
-        )
-        # Notify receiver only when we actually create a new pending request
-        Notification.objects.create(
-            user=receiver,       # who should receive it
-            actor=caller,        # who initiated it
-            type="MEETING_REQUEST",
-            data={"meeting_id": meeting.id},
-        )
-
-    # room name is stable for this pair + this meeting
+    # room name is stable for this pair
     room_name = f"Peerza-Class-{caller.id}-{receiver.id}"
+    signaling.start(caller, receiver, UserSerializer(caller).data, room_name)
     return Response({"ok": True, "room": room_name}, status=status.HTTP_200_OK)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def call_end(request, receiver_id):
-    user = request.user
     receiver = get_object_or_404(User, id=receiver_id)
-    meeting = Meeting.objects.filter(
-        Q(host__in=[user, receiver]),
-        Q(guest__in=[user, receiver]),
-        status="PENDING",
-    ).first()
-
-    if meeting:
-        meeting.status = "CANCELLED"
-        meeting.end_datetime = timezone.now()
-        meeting.save()
-
+    signaling.end(request.user, receiver)
     return Response({"ok": True})
 
 # =============================================================
@@ -395,43 +464,53 @@ def call_end(request, receiver_id):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def chat_conversations(request):
-    me = request.user
+    """
+    Inbox built from the maintained Conversation summaries.
+    Without ?limit/?cursor the full list is returned (legacy shape);
+    with them the response is {"results": [...], "next_cursor": ...}.
+    """
+    cursor = request.query_params.get("cursor") or None
+    try:
+        limit = params.limit_param(request, default=50 if cursor else None)
+        rows, next_cursor = inbox.inbox_page(request.user, limit=limit, cursor=cursor)
+    except ValueError:
+        return Response({"detail": "Invalid limit or cursor"}, status=400)
 
-    msg_peers = set(
-        Message.objects.filter(Q(sender=me) | Q(receiver=me)).values_list("sender", flat=True)
-    ) | set(
-        Message.objects.filter(Q(sender=me) | Q(receiver=me)).values_list("receiver", flat=True)
-    )
-    msg_peers.discard(me.id)
-
-    friend_ids = set(Friendship.objects.filter(user=me).values_list("friend_id", flat=True))
-    peer_ids = msg_peers | friend_ids
-
-    data = []
-    for pid in peer_ids:
-        peer = User.objects.get(id=pid)
-        unread = Message.objects.filter(sender=peer, receiver=me, is_read=False).count()
-        last_msg = Message.objects.filter(
-            Q(sender=me, receiver=peer) | Q(sender=peer, receiver=me)
-        ).order_by('-timestamp').first()
-        data.append({
-            "peer": UserSerializer(peer).data,
-            "unread_count": unread,
-            "last_message": MessageSerializer(last_msg).data if last_msg else None,
-        })
-
-    data.sort(key=lambda x: x["last_message"]["timestamp"] if x["last_message"] else "", reverse=True)
-    return Response(data)
+    context = {"read_marks": inbox.inbox_read_marks(request.user.id, rows)}
+    data = ConversationSerializer(rows, many=True, context=context).data
+
+    if limit is None:
+        return Response(data)
+    return Response({"results": data, "next_cursor": next_cursor})
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def chat_messages(request, user_id):
+    """
+    Thread with `user_id`, oldest first. Supports keyset paging via
+    ?before_id= / ?after_id= and ?limit= (see inbox.thread_page), and
+    ?shape=normalized, which sends the two users once instead of per message.
+    """
     me = request.user
     peer = get_object_or_404(User, id=user_id)
-    qs = Message.objects.filter(
-        Q(sender=me, receiver=peer) | Q(sender=peer, receiver=me)
-    ).order_by('timestamp')
-    return Response(MessageSerializer(qs, many=True).data)
+    query = request.query_params
+    try:
+        before_id = int(query["before_id"]) if query.get("before_id") else None
+        after_id = int(query["after_id"]) if query.get("after_id") else None
+        paged = before_id is not None or after_id is not None
+        limit = params.limit_param(request, default=50 if paged else None, maximum=200)
+        normalized = params.normalized_param(request)
+    except ValueError:
+        return Response({"detail": "Invalid before_id, after_id, limit or shape"}, status=400)
+
+    rows = inbox.thread_page(me, peer, limit=limit, before_id=before_id, after_id=after_id, rows=True)
+    marks = inbox.read_marks([(me.id, peer.id), (peer.id, me.id)])
+    users = {me.id: fastserializers.user(me), peer.id: fastserializers.user(peer)}
+    if not normalized:
+        return Response(fastserializers.messages(rows, users, marks))
+    items = fastserializers.messages(rows, {me.id: me.id, peer.id: peer.id}, marks)
+    first = (rows[0][1], rows[0][2]) if rows else ()
+    return Response({"items": items, "users": {uid: users[uid] for uid in first}})
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -442,15 +521,72 @@ def chat_send(request, user_id):
     if not text:
         return Response({"detail": "Message content required"}, status=400)
     msg = Message.objects.create(sender=me, receiver=peer, content=text)
-    return Response(MessageSerializer(msg).data, status=201)
+    inbox.record_message(msg)
+    changes.conversation_changed(me.id, peer.id)
+    payload = MessageSerializer(msg, context={"read_marks": {(peer.id, me.id): 0}}).data  # just sent: unread
+    events.publish(peer.id, "message", payload)
+    return Response(payload, status=201)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def chat_mark_read(request, user_id):
+    """Mark the thread read, or only up to message ?up_to= / {"up_to": id}."""
     me = request.user
     peer = get_object_or_404(User, id=user_id)
-    Message.objects.filter(sender=peer, receiver=me, is_read=False).update(is_read=True)
-    return Response({"ok": True})
+    raw = request.data.get("up_to") or request.query_params.get("up_to")
+    try:
+        up_to = int(raw) if raw not in (None, "") else None
+    except (TypeError, ValueError):
+        return Response({"detail": "up_to must be a message id"}, status=400)
+    mark = inbox.mark_read(me, peer, up_to=up_to)
+    changes.conversation_changed(me.id, peer.id)
+    return Response({"ok": True, "last_read_id": mark})
+
+# =============================================================
+# SYNC (change feed)
+# =============================================================
+
+def _etag_matches(request, etag):
+    # If-None-Match compares weakly: CompressionMiddleware hands out W/"n"
+    # for the same cursor when it gzips the body.
+    tags = parse_etags(request.headers.get("If-None-Match", ""))
+    return "*" in tags or etag in {tag.removeprefix("W/") for tag in tags}
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sync(request):
+    """
+    Deltas since ?since=<cursor> (see users/changes.py). Without ?since the
+    response only carries the current cursor, to start from after loading
+    the full lists. An up-to-date client is answered from the cached head:
+    304 if it sent the ETag back, otherwise an empty delta. A cursor older
+    than the retained log gets "resync": true: reload, then continue from
+    the returned cursor. The default CachedJWTAuthentication resolves the
+    user without a query but still refuses deactivated or deleted users.
+    """
+    user_id = request.user.id
+    raw = request.query_params.get("since")
+    try:
+        since = int(raw) if raw not in (None, "") else None
+    except ValueError:
+        return Response({"detail": "since must be a cursor returned by sync/"}, status=400)
+
+    head, horizon = changes.head(user_id), changes.horizon()
+    etag = f'"{head}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    current = {"cursor": max(head, horizon), "has_more": False, "changes": {}, "deleted": {}}
+    if since is not None and since < horizon:
+        # Entries after the cursor may have been purged: start over.
+        return Response({**current, "resync": True}, headers=headers)
+    if since is None or since >= head:
+        if since is not None and _etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(current, headers=headers)
+
+    cursor, has_more, touched = changes.since(user_id, since)
+    data, deleted = changes.load(user_id, touched)
+    return Response({"cursor": cursor, "has_more": has_more, "changes": data, "deleted": deleted},
+                    headers=headers)
 
 # =============================================================
 # FRIENDS
@@ -458,11 +594,10 @@ def chat_mark_read(request, user_id):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@viewcache.cached_view("friends_list", tags=lambda request: [f"friends:{request.user.id}"], per_user=True)
 def friends_list(request):
     me = request.user
-    qs = Friendship.objects.filter(user=me).select_related("friend")
-    data = [{"id": f.id, "friend": UserSerializer(f.friend).data} for f in qs]
-    return Response(data)
+    return Response(fastserializers.FRIENDSHIP_ROW.many(Friendship.objects.filter(user=me)))
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -477,7 +612,7 @@ def friend_request_send(request, user_id):
         fr.status = FriendRequest.PENDING
         fr.save()
 
-    Notification.objects.create(
+    outbox.notify(
         user=to_user, actor=me, type="FRIEND_REQUEST", data={"request_id": fr.id}
     )
     return Response({"ok": True, "request_id": fr.id}, status=201)
@@ -494,11 +629,13 @@ def friend_request_respond(request, request_id):
         fr.save()
         Friendship.objects.get_or_create(user=me, friend=fr.from_user)
         Friendship.objects.get_or_create(user=fr.from_user, friend=me)
-        Notification.objects.create(user=fr.from_user, actor=me, type="FRIEND_ACCEPTED", data={})
+        inbox.ensure_conversation(me, fr.from_user)
+        changes.conversation_changed(me.id, fr.from_user.id)
+        outbox.notify(user=fr.from_user, actor=me, type="FRIEND_ACCEPTED", data={})
     elif action == "DECLINE":
         fr.status = FriendRequest.DECLINED
         fr.save()
-        Notification.objects.create(user=fr.from_user, actor=me, type="FRIEND_DECLINED", data={})
+        outbox.notify(user=fr.from_user, actor=me, type="FRIEND_DECLINED", data={})
     else:
         return Response({"detail": "Invalid action"}, status=400)
 
@@ -522,12 +659,6 @@ from rest_framework.response import Response
 from .models import Availability
 from .serializers import AvailabilitySerializer
 
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def get_user_availability(request, user_id):
-    slots = Availability.objects.filter(user_id=user_id)
-    return Response(AvailabilitySerializer(slots, many=True).data)
-
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def create_or_update_availability(request):
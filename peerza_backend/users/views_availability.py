@@ -1,9 +1,10 @@
 from rest_framework import viewsets, permissions
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from django.db.models import Q
-from datetime import time
-from .models import Availability, Meeting
+from datetime import timedelta
+from django.utils import timezone
+from . import params, scheduling, viewcache
+from .models import Availability
 from .serializers import AvailabilitySerializer
 
 
@@ -17,43 +18,62 @@ class AvailabilityViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-    # ✅ GET /api/availability/<peer_id>/user/
+    # ✅ GET /api/availability/<peer_id>/user/?start=YYYY-MM-DD&end=YYYY-MM-DD
     @action(detail=True, methods=['get'])
+    @viewcache.cached_view(
+        "user_availability",
+        tags=lambda request, pk=None: [f"availability:{pk}"],
+        vary=lambda request, pk=None: timezone.localdate().isoformat(),  # the default window starts today
+    )
     def user(self, request, pk=None):
-        slots = Availability.objects.filter(user__id=pk)
-        meetings = Meeting.objects.filter(
-            Q(host__id=pk) | Q(guest__id=pk),
-            status__iexact="Accepted"
-        )
+        """
+        The peer's weekly slots expanded to concrete dates in the window
+        (default: the next 7 days), each flagged booked/free against their
+        ACCEPTED meetings in that window only.
+        """
+        try:
+            start, end = scheduling.parse_window(
+                request.query_params.get("start"), request.query_params.get("end")
+            )
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=400)
 
         result = []
-        for slot in slots:
-            # Default slot state
-            is_booked = False
-
-            for meeting in meetings:
-                # ✅ Safe date handling
-                meeting_start = meeting.start_datetime.time() if meeting.start_datetime else None
-                meeting_end = meeting.end_datetime.time() if meeting.end_datetime else None
-
-                # Only process if both times exist
-                if meeting_start and meeting_end:
-                    meeting_day = meeting.start_datetime.strftime("%A").upper()
-
-                    # ✅ Check same weekday and overlapping time
-                    if (
-                        meeting_day == slot.day_of_week.upper()
-                        and not (meeting_end <= slot.start_time or meeting_start >= slot.end_time)
-                    ):
-                        is_booked = True
-                        break
-
+        for slot_start, slot_end, slot, is_booked in scheduling.dated_slots(pk, start, end):
             result.append({
                 "id": slot.id,
+                "date": slot_start.date(),
                 "day_of_week": slot.day_of_week,
                 "start_time": slot.start_time,
                 "end_time": slot.end_time,
+                "start_datetime": slot_start,
+                "end_datetime": slot_end,
                 "is_booked": is_booked,
             })
 
         return Response(result)
+
+    # ✅ GET /api/availability/common/?user_b=<id>&start=&end=&min_minutes=30&limit=20
+    @action(detail=False, methods=['get'])
+    def common(self, request):
+        """Ranked free windows you share with user_b."""
+        query = request.query_params
+        try:
+            user_a = int(query.get("user_a") or request.user.id)
+            user_b = int(query["user_b"])
+            min_minutes = max(1, int(query.get("min_minutes") or 30))
+            limit = params.limit_param(request, default=20)
+            start, end = scheduling.parse_window(query.get("start"), query.get("end"))
+        except (KeyError, ValueError) as exc:
+            return Response({"detail": f"Invalid parameters: {exc}"}, status=400)
+        if user_a != request.user.id:
+            # busy time comes from meetings: only your own calendar may be compared
+            return Response({"detail": "user_a must be you"}, status=403)
+
+        windows = scheduling.common_free(
+            user_a, user_b, start, end, min_length=timedelta(minutes=min_minutes)
+        )
+        return Response([
+            {"start": s, "end": e, "minutes": int((e - s).total_seconds() // 60)}
+            for s, e in windows[:limit]
+        ])
@@ -1,11 +1,17 @@
 from rest_framework import viewsets, permissions
+from . import booking
 from .models import Meeting
 from .serializers import MeetingSerializer
 
 class MeetingViewSet(viewsets.ModelViewSet):
-    queryset = Meeting.objects.all().order_by('-start_datetime')
+    queryset = Meeting.objects.select_related('host').order_by('-start_datetime')
     serializer_class = MeetingSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def perform_create(self, serializer):
-        serializer.save(host=self.request.user)
+        data = serializer.validated_data
+        host, guest = self.request.user, data['guest']
+        # Same atomic overlap check as request_meeting; 409 if the slot is taken
+        with booking.locked_calendars(host.id, guest.id):
+            booking.ensure_free([host.id, guest.id], data['start_datetime'], data.get('end_datetime'))
+            serializer.save(host=host)
@@ -62,7 +62,9 @@ def stripe_webhook(request):
 
     if event['type'] == 'checkout.session.completed':
         session = event['data']['object']
-        user_id = session.get('metadata', {}).get('user_id')  # reliable because we set it above
+        # StripeObject is not a dict (no .get() since stripe 8); indexing works for both
+        metadata = session['metadata'] if 'metadata' in session else {}
+        user_id = metadata['user_id'] if 'user_id' in metadata else None  # reliable because we set it above
         if user_id:
             try:
                 user = User.objects.get(id=user_id)
@@ -23,7 +23,11 @@ export default function BookSessionModal({ slot, peerId, onClose }) {
       onClose();
     } catch (err) {
       console.error(err);
-      alert("Failed to schedule meeting.");
+      if (err.response?.status === 409) {
+        alert("That time was just booked. Please pick another slot.");
+      } else {
+        alert("Failed to schedule meeting.");
+      }
     } finally {
       setLoading(false);
     }
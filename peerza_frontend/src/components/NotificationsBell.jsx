@@ -1,6 +1,7 @@
 import { useEffect, useState, useRef, useCallback } from "react";
 import api from "../api";
-import { emit } from "../eventBus"; // ✅ added for broadcasting
+import { emit, on } from "../eventBus"; // ✅ added for broadcasting
+import { connectEvents } from "../serverEvents";
 
 export default function NotificationsBell() {
   const [count, setCount] = useState(0);
@@ -29,19 +30,20 @@ export default function NotificationsBell() {
     }
   }, []);
 
-  // --- Safe polling loop ---
+  // --- Push updates (the sync/ feed stands in while the stream is down) ---
   useEffect(() => {
     let isMounted = true;
     const fetchData = async () => {
       if (isMounted) await load();
     };
 
+    connectEvents();
     fetchData();
-    const t = setInterval(fetchData, 8000);
+    const off = on("server:notification", fetchData);
 
     return () => {
       isMounted = false;
-      clearInterval(t);
+      off();
     };
   }, [load]);
 
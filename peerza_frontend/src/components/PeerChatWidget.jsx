@@ -1,5 +1,6 @@
-import { useEffect, useState } from "react";
+import { useEffect, useRef, useState } from "react";
 import api from "../api";
+import { on } from "../eventBus";
 
 export default function PeerChatWidget() {
   const [open, setOpen] = useState(false);
@@ -7,8 +8,32 @@ export default function PeerChatWidget() {
   const [activePeer, setActivePeer] = useState(null);
   const [messages, setMessages] = useState([]);
   const [draft, setDraft] = useState("");
+  // open thread and the newest message id we hold: refreshes ask only for what came after it
+  const thread = useRef({ peerId: null, lastId: 0 });
 
-  // Poll conversations every 5 seconds
+  const appendMessages = (items) => {
+    if (!items.length) return;
+    thread.current.lastId = Math.max(thread.current.lastId, items[items.length - 1].id);
+    setMessages((prev) => {
+      const seen = new Set(prev.map((m) => m.id));
+      return [...prev, ...items.filter((m) => !seen.has(m.id))];
+    });
+  };
+
+  const refreshThread = async () => {
+    const { peerId, lastId } = thread.current;
+    if (!peerId) return;
+    try {
+      const res = await api.get(`chats/${peerId}/messages/`, {
+        params: { after_id: lastId, limit: 50 },
+      });
+      if (thread.current.peerId === peerId) appendMessages(res.data || []);
+    } catch (err) {
+      console.error("Failed to refresh chat:", err);
+    }
+  };
+
+  // Poll conversations (and the open thread's new messages) every 5 seconds
   useEffect(() => {
     let timer;
 
@@ -16,6 +41,7 @@ export default function PeerChatWidget() {
       try {
         const res = await api.get("chats/");
         setConvos(res.data || []);
+        await refreshThread();
       } catch (err) {
         console.error("Failed to load conversations:", err);
       } finally {
@@ -24,15 +50,22 @@ export default function PeerChatWidget() {
     };
 
     load();
-    return () => clearTimeout(timer);
+    const off = on("server:message", refreshThread);
+    return () => {
+      clearTimeout(timer);
+      off();
+    };
   }, []);
 
   const openChat = async (peer) => {
     setActivePeer(peer);
     setOpen(true);
+    thread.current = { peerId: null, lastId: 0 };
     try {
-      const res = await api.get(`chats/${peer.id}/messages/`);
-      setMessages(res.data || []);
+      const res = await api.get(`chats/${peer.id}/messages/?limit=50`);
+      const loaded = res.data || [];
+      thread.current = { peerId: peer.id, lastId: loaded.length ? loaded[loaded.length - 1].id : 0 };
+      setMessages(loaded);
       await api.post(`chats/${peer.id}/read/`);
       const conv = await api.get("chats/");
       setConvos(conv.data || []);
@@ -49,7 +82,7 @@ export default function PeerChatWidget() {
       const res = await api.post(`chats/${activePeer.id}/send/`, {
         content: text,
       });
-      setMessages((prev) => [...prev, res.data]);
+      appendMessages([res.data]);
     } catch (e) {
       console.error("send failed", e);
     }
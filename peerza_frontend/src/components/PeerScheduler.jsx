@@ -46,14 +46,15 @@ export default function PeerScheduler({ peerId }) {
       // 🟢 Try main endpoint (includes booked info)
       const res = await api.get(`availability/${peerId}/user/`);
       const formatted = res.data.map((slot) => ({
-        id: slot.id,
+        id: `${slot.id}-${slot.date}`,
         title: slot.is_booked
           ? slot.topic
             ? `Booked (${slot.topic})`
             : "Booked"
           : "Available",
-        start: convertToDateTime(slot.day_of_week, slot.start_time),
-        end: convertToDateTime(slot.day_of_week, slot.end_time),
+        // Dated occurrences for the next 7 days come from the backend
+        start: new Date(slot.start_datetime),
+        end: new Date(slot.end_datetime),
         color: slot.is_booked ? "#ef4444" : "#22c55e",
         isBooked: slot.is_booked,
       }));
@@ -5,9 +5,12 @@ import { ref, onValue } from "firebase/database";
 import api from "../../api";
 import { X, User } from "lucide-react";
 
+const PRESENCE_POLL_MS = 30000;
+
 function ChatList() {
   const { toggleChat, openChatWith } = useChat();
   const [recentPeers, setRecentPeers] = useState([]);
+  const [presence, setPresence] = useState({});
 
   useEffect(() => {
     api.get("profile/").then((res) => {
@@ -26,6 +29,20 @@ function ChatList() {
     });
   }, []);
 
+  // Online dots: one bulk lookup for every listed peer
+  const peerIds = recentPeers.map((p) => p.id).join(",");
+  useEffect(() => {
+    if (!peerIds) return;
+    const load = () =>
+      api
+        .get("presence/", { params: { ids: peerIds } })
+        .then((res) => setPresence(res.data))
+        .catch(() => {});
+    load();
+    const timer = setInterval(load, PRESENCE_POLL_MS);
+    return () => clearInterval(timer);
+  }, [peerIds]);
+
   return (
     <div className="flex flex-col h-full">
       <div className="bg-indigo-600 p-4 flex justify-between items-center text-white shadow-md">
@@ -52,7 +69,7 @@ function ChatList() {
               {peer.username?.charAt(0).toUpperCase() || <User size={18} />}
               <span
                 className={`absolute bottom-0 right-0 w-3 h-3 rounded-full border-2 border-white ${
-                  peer.is_online ? "bg-green-500" : "bg-gray-400"
+                  presence[peer.id]?.online ? "bg-green-500" : "bg-gray-400"
                 }`}
               ></span>
             </div>
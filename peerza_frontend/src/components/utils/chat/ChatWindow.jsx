@@ -36,7 +36,6 @@ function ChatWindow() {
     if (!roomId || !activeChatPeer) return;
 
     const chatRef = ref(database, `chats/${roomId}/messages`);
-    const presenceRef = ref(database, `status/${activeChatPeer.id}`);
 
     const unsubMsg = onValue(chatRef, (snapshot) => {
       const data = snapshot.val() || {};
@@ -47,14 +46,17 @@ function ChatWindow() {
       setMessages(loaded);
     });
 
-    const unsubPresence = onValue(presenceRef, (snapshot) => {
-      const val = snapshot.val();
-      setIsPeerOnline(val?.online === true || val === "online");
-    });
+    const loadPresence = () =>
+      api
+        .get("presence/", { params: { ids: activeChatPeer.id } })
+        .then((res) => setIsPeerOnline(!!res.data[activeChatPeer.id]?.online))
+        .catch(() => {});
+    loadPresence();
+    const presenceTimer = setInterval(loadPresence, 30000);
 
     return () => {
       unsubMsg();
-      unsubPresence();
+      clearInterval(presenceTimer);
       setMessages([]);
     };
   }, [roomId, activeChatPeer]);
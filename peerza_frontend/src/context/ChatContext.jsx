@@ -1,30 +1,17 @@
 import { createContext, useState, useEffect, useCallback } from "react";
 
 import api from "../api";
-import { auth, db } from "../firebaseConfig";
-import { ref, set, onDisconnect } from "firebase/database";
+import { auth } from "../firebaseConfig";
 
 const ChatContext = createContext();
 export default ChatContext;
 
 // ======================================================
-//  PRESENCE HELPER
+//  PRESENCE HEARTBEAT
 // ======================================================
-function setPresence(firebaseUid, djangoUserId) {
-  const presenceRef = ref(db, `status/${djangoUserId}`);
-
-  set(presenceRef, {
-    firebase_uid: firebaseUid,
-    online: true,
-    last_active: Date.now(),
-  });
-
-  onDisconnect(presenceRef).set({
-    firebase_uid: firebaseUid,
-    online: false,
-    last_active: Date.now(),
-  });
-}
+// Any API call marks us online on the backend; this keeps an idle tab
+// online too (the server treats 5 minutes of silence as offline).
+const HEARTBEAT_MS = 60000;
 
 // ======================================================
 //  CHAT PROVIDER
@@ -50,10 +37,12 @@ export function ChatProvider({ children }) {
 
   // Activate presence
   useEffect(() => {
-    if (firebaseUid && djangoUser?.id) {
-      setPresence(firebaseUid, djangoUser.id);
-    }
-  }, [firebaseUid, djangoUser]);
+    if (!djangoUser?.id) return;
+    const beat = () => api.post("presence/heartbeat/").catch(() => {});
+    beat();
+    const timer = setInterval(beat, HEARTBEAT_MS);
+    return () => clearInterval(timer);
+  }, [djangoUser]);
 
   // Actions
   const openChatWith = useCallback((peer) => {
@@ -4,6 +4,7 @@ import api from "../api";
 import "../index.css";
 import { on } from "../eventBus";
 import { emit } from "../eventBus";
+import { connectEvents, isEventStreamLive } from "../serverEvents";
 import MyAvailabilityManager from "../components/MyAvailabilityManager";
 
 function Home() {
@@ -50,24 +51,42 @@ function Home() {
       .catch(() => setPendingMeeting(null));
   };
 
-  // --- 2. POLLING LOGIC ---
+  // --- 2. PUSH + POLLING FALLBACK ---
   useEffect(() => {
-    // Poll every 3s for calls + meetings
-    const poller = setInterval(() => {
-      api
-        .get("call/check/")
-        .then((res) => {
-          if (res.data.active) {
-            setIncomingCall(res.data.caller);
-          } else {
-            setIncomingCall(null);
-          }
-        })
-        .catch(() => {});
-      getPendingMeeting();
-    }, 3000);
-
-    return () => clearInterval(poller);
+    connectEvents();
+    const offs = [
+      on("server:call", (e) => setIncomingCall(e.detail.caller)),
+      on("server:call_ended", () => setIncomingCall(null)),
+      on("server:meeting_request", () => getPendingMeeting()),
+      on("server:meeting_response", () => getPendingMeeting()),
+    ];
+
+    // Calls: long-poll call/wait/ while the event stream is down. It answers
+    // the moment a call arrives or ends, otherwise after ~25s.
+    let stopped = false;
+    const waitForCalls = async () => {
+      let version = -1;
+      while (!stopped) {
+        if (isEventStreamLive()) {
+          await new Promise((r) => setTimeout(r, 3000));
+          continue;
+        }
+        try {
+          const res = await api.get("call/wait/", { params: { version } });
+          version = res.data.version;
+          setIncomingCall(res.data.active ? res.data.caller : null);
+        } catch {
+          await new Promise((r) => setTimeout(r, 3000));
+        }
+      }
+    };
+    waitForCalls();
+
+    // Meetings arrive as push events, or via the sync/ feed while the stream is down.
+    return () => {
+      stopped = true;
+      offs.forEach((off) => off());
+    };
   }, []);
 
   // --- 3. ACTION HANDLERS ---
@@ -83,8 +102,8 @@ function Home() {
   };
 
   const ignoreCall = () => {
-    if (incomingCall && incomingCall.caller) {
-      const targetId = incomingCall.caller.id;
+    if (incomingCall) {
+      const targetId = incomingCall.id;
       api
         .post(`call/end/${targetId}/`)
         .then(() => {
@@ -0,0 +1,84 @@
+// Server-push events (SSE) from /api/events/ — replaces the dashboard pollers.
+// Each server event is re-emitted on the eventBus as "server:<type>".
+// While the stream is down, a single sync/ poll (the change feed) stands in
+// for it and re-emits its deltas as the same "server:<type>" events.
+import api, { ACCESS_TOKEN } from "./api";
+import { emit } from "./eventBus";
+
+const BASE_URL =
+  import.meta.env.VITE_API_BASE_URL || "http://127.0.0.1:8000/api/";
+
+const EVENT_TYPES = [
+  "call",
+  "call_ended",
+  "meeting_request",
+  "meeting_response",
+  "notification",
+  "message",
+];
+
+let source = null;
+let live = false;
+let retryTimer = null;
+
+const SYNC_MS = 5000;
+let syncTimer = null;
+let syncCursor = null;
+
+export const isEventStreamLive = () => live;
+
+async function syncOnce() {
+  if (live || !localStorage.getItem(ACCESS_TOKEN)) return;
+  const get = (params) =>
+    api.get("sync/", { params, validateStatus: (s) => s === 200 || s === 304 });
+  try {
+    if (syncCursor === null) {
+      syncCursor = (await get({})).data.cursor;
+      return;
+    }
+    for (let more = true; more; ) {
+      const res = await get({ since: syncCursor });
+      if (res.status === 304) return; // nothing changed
+      const { cursor, has_more, resync, changes = {} } = res.data;
+      syncCursor = cursor;
+      more = has_more;
+      if (resync) {
+        // Our cursor fell off the retained log: have every view reload.
+        emit("server:notification", {});
+        emit("server:meeting_response", {});
+        emit("server:message", {});
+        return;
+      }
+      if (changes.notification || changes.friend_request) emit("server:notification", {});
+      if (changes.meeting) emit("server:meeting_response", {});
+      (changes.message || []).forEach((m) => emit("server:message", m));
+    }
+  } catch {
+    // try again on the next tick
+  }
+}
+
+export function connectEvents() {
+  if (!syncTimer) syncTimer = setInterval(syncOnce, SYNC_MS);
+  if (source || retryTimer) return;
+  const token = localStorage.getItem(ACCESS_TOKEN);
+  if (!token || typeof EventSource === "undefined") return;
+
+  source = new EventSource(`${BASE_URL}events/?token=${encodeURIComponent(token)}`);
+  source.onopen = () => {
+    live = true;
+  };
+  source.onerror = () => {
+    // Token expired or server without ASGI: fall back to polling, retry later
+    live = false;
+    source.close();
+    source = null;
+    retryTimer = setTimeout(() => {
+      retryTimer = null;
+      connectEvents();
+    }, 15000);
+  };
+  EVENT_TYPES.forEach((type) =>
+    source.addEventListener(type, (e) => emit(`server:${type}`, JSON.parse(e.data)))
+  );
+}